@@ -0,0 +1,46 @@
+"""
+Measures how the time to build an array one concatenation at a time grows
+with its length.
+
+The program appends to an accumulator with `acc + [i]` in a loop, so the cost
+of concatenation decides whether building the array is linear or quadratic.
+
+    python benchmarks/array_concat.py [--sizes 10000 20000 50000 100000] [--engine runner]
+"""
+import time
+import argparse
+
+from slang.runtime import make_default_environment, parse_string, run_program
+from slang.simplify import simplify
+
+PROGRAM = """
+let build = function(i, n, acc) if i < n then this(i + 1, n, acc + [i]) else acc;
+build(0, SIZE, [])
+"""
+
+
+def measure(size: int, engine: str) -> float:
+    env = make_default_environment()
+    program = simplify(parse_string(PROGRAM.replace("SIZE", str(size)), env))
+    start = time.perf_counter()
+    result = run_program(program, env, engine=engine)
+    elapsed = time.perf_counter() - start
+    assert len(result.value) == size
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 20000, 50000, 100000]
+    )
+    parser.add_argument("--engine", default="runner")
+    args = parser.parse_args()
+    print(f"{'size':>8} {'time':>9} {'per item':>10}")
+    for size in args.sizes:
+        elapsed = measure(size, args.engine)
+        print(f"{size:>8} {elapsed:8.3f}s {elapsed / size * 1e6:8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Times the cold start of a process running a program that imports the prelude,
+with the cache of simplified programs on disk empty and filled (see
+`astcache.py`).
+
+Each run is a new Python process calling `run_file(..., cache=True)`, so it pays for the imports,
+and with an empty cache for parsing the program and the prelude too.
+
+    python benchmarks/ast_cache.py [--repeat 3]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+PROGRAM = """
+import "prelude.slang";
+let square = function(x) x * x;
+let xs = range(0, 100, 1).each(square);
+[math::max(1, 2.5), xs[10], xs.map(function(x) x + 1)[99]]
+"""
+
+RUN = """
+import sys
+from slang.runtime import make_default_environment, run_file
+run_file(sys.argv[1], make_default_environment(), cache=True)
+"""
+
+
+def measure(path: str, cold: bool, repeat: int) -> float:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache = os.path.join(os.path.dirname(path), "__slangcache__")
+    best = None
+    for _ in range(repeat):
+        if cold:
+            shutil.rmtree(cache, ignore_errors=True)
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", RUN, path],
+            cwd=root,
+            env=dict(os.environ, PYTHONPATH=root),
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.slang")
+        with open(path, "w") as f:
+            f.write(PROGRAM)
+        cold = measure(path, True, args.repeat)
+        warm = measure(path, False, args.repeat)
+    print(f"empty cache {cold:7.3f}s filled cache {warm:7.3f}s ({cold / warm:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measures the memory the terms of a large generated program take, per node.
+
+The program defines COUNT functions, each with a few statements, arithmetic,
+arrays, a namespace and a call of the function before it.  It is parsed with
+and without positions (`parse_string(..., positions=False)`), and with equal
+terms shared (`parse_string(..., share=True)`, see `syntax/hashcons.py`).
+
+    python benchmarks/ast_memory.py [--count 50]
+"""
+import sys
+import argparse
+
+from slang.syntax import terms
+from slang.syntax.vector import Vector
+from slang.runtime import make_default_environment, parse_string
+
+FUNCTION = """
+let f{i} = function(x, y) {{
+    let a = x * {i} + y / 2 - 1;
+    let b = [a, x, y, {i}.5];
+    let ns = namespace {{ first = b[0]; rest = [b[1], b[2]]; }};
+    let rows = [[0, 1, "a"], [1, 2, "b"], [0, 1, "a"], [y / 2, y * 2]];
+    if a < {i} then ns::first else f{previous}(a - 1, -y)
+}};
+"""
+
+
+def generate(count: int) -> str:
+    lines = ["let f0 = function(x, y) x + y;"]
+    for i in range(1, count + 1):
+        lines.append(FUNCTION.format(i=i, previous=i - 1))
+    lines.append(f"f{count}(1, 2)")
+    return "\n".join(lines)
+
+
+def measure(program):
+    """
+    The number of nodes of `program` and the bytes of everything they hold on
+    to: positions, lists, names, numbers.  Functions (the operators) are shared
+    by all programs and not counted.
+    """
+    nodes = size = 0
+    stack = [program]
+    seen = set()
+    while stack:
+        item = stack.pop()
+        if (
+            id(item) in seen
+            or item is None
+            or callable(item)
+            and not isinstance(item, terms.Node)
+        ):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple, Vector)):
+            stack.extend(item)
+            continue
+        if isinstance(item, terms.Node):
+            nodes += 1
+        for cls in type(item).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                stack.append(getattr(item, name, None))
+        if hasattr(item, "__dict__"):
+            size += sys.getsizeof(item.__dict__)
+            stack.extend(item.__dict__.values())
+    return nodes, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=50)
+    args = parser.parse_args()
+    source = generate(args.count)
+    env = make_default_environment()
+    print(
+        f"{'positions':10} {'shared':>7} {'nodes':>8} {'bytes':>10} {'bytes/node':>11}"
+    )
+    written = None
+    for positions, share in ((True, False), (False, False), (False, True)):
+        program = parse_string(source, env, positions=positions, share=share)
+        nodes, size = measure(program)
+        # Per node of the program as written, which sharing does not change.
+        written = written or nodes
+        print(
+            f"{str(positions):10} {str(share):>7} {nodes:8} {size:10} {size / written:11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measures how much memory the function values returned by a program keep alive.
+
+Every function is created in a block that also binds a large array the
+function does not use, and refers to itself by name.
+
+    python benchmarks/closure_memory.py [--size 500] [--count 10] [--engine runner]
+"""
+import gc
+import argparse
+import tracemalloc
+
+from slang.runtime import make_default_environment, run_string
+
+PROGRAM = """
+import "prelude.slang";
+let make = function(i) {
+    let big = range(0, SIZE, 1).each(function(j) j * i);
+    let total = big[0] + big[SIZE - 1];
+    let count = function(n) if n == 0 then total else count(n - 1);
+    count
+};
+range(0, COUNT, 1).each(make)
+"""
+
+
+def measure(size: int, count: int, engine: str):
+    env = make_default_environment()
+    program = PROGRAM.replace("SIZE", str(size)).replace("COUNT", str(count))
+    gc.collect()
+    tracemalloc.start()
+    result = run_string(program, env, engine=engine)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    del result
+    # Whatever the result kept alive in reference cycles.
+    cycles = gc.collect()
+    released = retained - tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return released, cycles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--engine", default="runner")
+    args = parser.parse_args()
+    released, cycles = measure(args.size, args.count, args.engine)
+    print(f"retained by the {args.count} functions: {released / 1024:.1f} KiB")
+    print(f"objects collected in cycles: {cycles}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares passing arguments by value with passing them by need on prelude workloads.
+
+    "unused": maps over a range with a function that only needs one of the
+        two values it is given, the other is expensive to compute
+    "pipeline": maps, filters and zips arrays, where every argument is needed
+
+    python benchmarks/lazy_arguments.py [--size 200] [--repeat 3]
+"""
+import time
+import argparse
+
+from slang.runtime import make_default_environment, parse_string, run_string
+
+PROGRAMS = {
+    "unused": """
+import "prelude.slang";
+let fib = function(n) if n < 2 then n else fib(n - 1) + fib(n - 2);
+let pick = function(cheap, test, expensive) if test then cheap else expensive;
+range(0, SIZE, 1).each(function(i) pick(i, i % 10 > 0, fib(12)))
+""",
+    "pipeline": """
+import "prelude.slang";
+let xs = range(0, SIZE, 1).each(function(i) i * i);
+xs.map(function(x) x + 1).where(function(x) x % 2 == 1).zip(xs)
+""",
+}
+
+
+def measure(program: str, lazy: bool, repeat: int) -> float:
+    env = make_default_environment(lazy=lazy)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_string(program, env)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # Parses the prelude once, so the times below do not include it.
+    parse_string('import "prelude.slang"; 0', make_default_environment())
+    print(f"{'workload':10} {'by value':>10} {'by need':>10}")
+    for name, program in PROGRAMS.items():
+        program = program.replace("SIZE", str(args.size))
+        strict = measure(program, False, args.repeat)
+        lazy = measure(program, True, args.repeat)
+        print(f"{name:10} {strict:9.3f}s {lazy:9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
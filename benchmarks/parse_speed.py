@@ -0,0 +1,70 @@
+"""
+Times the tatsu parser and the hand written one (`pratt.py`) on the same programs.
+
+The program defines COUNT functions, each with a few statements, arithmetic,
+arrays, a namespace, chained calls and a call of the function before it.
+Prints the time of `parse_string(..., parser=...)` for both parsers, and then
+for the hand written one alone on programs 10 and 100 times as large, where
+the time per character stays about the same.
+
+    python benchmarks/parse_speed.py [--count 20] [--repeat 3]
+"""
+import time
+import argparse
+
+from slang.runtime import make_default_environment, parse_string
+
+FUNCTION = """
+let f{i} = function(x, y) {{
+    // arithmetic, arrays and lookups
+    let a = x * {i} + y / 2 - 1;
+    let b = [a, x, y, {i}.5, "s{i}"];
+    let ns = namespace {{ first = b[0]; rest = [b[1], b[2]]; }};
+    if a < {i} then ns::first else f{previous}(a - 1, -y).max(b[3])
+}};
+"""
+
+
+def generate(count: int) -> str:
+    lines = ["let f0 = function(x, y) x + y;"]
+    for i in range(1, count + 1):
+        lines.append(FUNCTION.format(i=i, previous=i - 1))
+    lines.append(f"f{count}(1, 2)")
+    return "\n".join(lines)
+
+
+def measure(source: str, parser: str, repeat: int) -> float:
+    env = make_default_environment()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_string(source, env, parser=parser)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    source = generate(args.count)
+    tatsu = measure(source, "tatsu", args.repeat)
+    pratt = measure(source, "pratt", args.repeat)
+    print(
+        f"{args.count:>6} functions {len(source):>8} chars "
+        f"tatsu {tatsu:8.3f}s pratt {pratt:8.3f}s ({tatsu / pratt:5.1f}x)"
+    )
+    for scale in (10, 100):
+        source = generate(args.count * scale)
+        pratt = measure(source, "pratt", args.repeat)
+        print(
+            f"{args.count * scale:>6} functions {len(source):>8} chars "
+            f"pratt {pratt:8.3f}s {pratt / len(source) * 1e6:6.2f}us per char"
+        )
+
+
+if __name__ == "__main__":
+    main()
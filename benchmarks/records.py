@@ -0,0 +1,72 @@
+"""
+Times programs that build many small namespaces and read their fields.
+
+    "points": builds two namespaces of three fields per step of a loop and reads them
+    "ranges": calls `range` of the prelude twice per step and reads the results
+
+Prints the time of each engine and the number of `terms.NamespaceDefinition`s
+created, which namespaces built from literals only make when asked for their
+definitions.
+
+    python benchmarks/records.py [--size 20000] [--repeat 3]
+"""
+import time
+import argparse
+from unittest import mock
+
+from slang.syntax import terms
+from slang.runtime import make_default_environment, parse_string, run_program
+
+PROGRAMS = {
+    "points": """
+import "prelude.slang";
+let point = function(x, y) namespace { x = x; y = y; z = x + y; };
+range(0, SIZE, 1).each(function(n) point(n, n % 7)::z % 5 + point(n, 3)::x % 3)
+""",
+    "ranges": """
+import "prelude.slang";
+range(0, SIZE, 1).each(function(n) range(n, 7, 2)::start % 7 - range(0, n, 1)::step)
+""",
+}
+
+
+def measure(program, engine: str, repeat: int):
+    env = make_default_environment()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_program(program, env, engine=engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    created = 0
+    init = terms.NamespaceDefinition.__init__
+
+    def counting(self, *args, **kwargs):
+        nonlocal created
+        created += 1
+        init(self, *args, **kwargs)
+
+    with mock.patch.object(terms.NamespaceDefinition, "__init__", counting):
+        run_program(program, env, engine=engine)
+    return best, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    env = make_default_environment()
+    for name, source in PROGRAMS.items():
+        program = parse_string(source.replace("SIZE", str(args.size)), env)
+        for engine in ("runner", "unboxed", "closure", "bytecode"):
+            elapsed, created = measure(program, engine, args.repeat)
+            print(
+                f"{name:<8} {engine:<9} {elapsed:8.3f}s "
+                f"{created:>8} namespace definitions"
+            )
+
+
+if __name__ == "__main__":
+    main()
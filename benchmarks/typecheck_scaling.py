@@ -0,0 +1,137 @@
+"""
+Times the type checker on programs of growing size.
+
+    "array": a function returning an array literal of SIZE items of mixed
+             types: arrays with their items in any order, and functions, each
+             of a type of its own
+    "nesting": DEPTH nested functions, each binding a local, called in a chain
+
+The programs are built from terms, parsing them takes far longer than checking.
+Prints the time of `typecheck.check` for a quarter, half and all of the size,
+and the time per term, which stays about the same if checking is linear.
+
+    python benchmarks/typecheck_scaling.py [--size 10000] [--depth 400] [--repeat 3]
+"""
+import sys
+import time
+import random
+import argparse
+
+from slang.syntax import terms
+from slang.runtime import make_default_environment
+from slang.typecheck import check
+
+ITEMS = [
+    lambda x, y: x(),
+    lambda x, y: terms.Value("a"),
+    lambda x, y: terms.Value(2.5),
+    lambda x, y: y(),
+    lambda x, y: terms.Array([x(), terms.Value("b")]),
+    lambda x, y: terms.Array([terms.Value("b"), x()]),
+    lambda x, y: terms.Array([terms.Value(2.5), x(), terms.Value("c")]),
+    lambda x, y: terms.Array([terms.Value("c"), terms.Value(1.5), x()]),
+    lambda x, y: terms.Array([y(), x(), terms.Value("d")]),
+    lambda x, y: terms.Array([x(), terms.Array([x()])]),
+    lambda x, y: terms.Array([terms.Array([x()]), x()]),
+    lambda x, y: terms.Array([terms.Value(True), terms.Array([x(), terms.Value(1.5)])]),
+    lambda x, y: _function(["z"], terms.BinaryOperation("+", terms.Variable("z"), x())),
+]
+
+
+def _function(names, body):
+    parameters = [terms.Parameter(name, None) for name in names]
+    return terms.FunctionDefinition(parameters, body, builtin=False)
+
+
+def array_program(size: int):
+    """
+    let f = function(x, y) [x, "a", ["b", x], function(z) z + x, ...]; f(1, true)
+    """
+    rng = random.Random(size)
+    x = lambda: terms.Variable("x")
+    y = lambda: terms.Variable("y")
+    items = [rng.choice(ITEMS)(x, y) for _ in range(size)]
+    f = _function(["x", "y"], terms.Array(items))
+    call = terms.Call(terms.Variable("f"), [terms.Value(1), terms.Value(True)])
+    return terms.Block([terms.Assignment("f", f)], call)
+
+
+def nesting_program(depth: int):
+    """
+    let f = function(x0) { let y0 = x0 * 2 + 1; function(x1) { ... x9 + y8 } }; f(0)(1)...(9)
+    """
+    body = terms.BinaryOperation(
+        "+", terms.Variable(f"x{depth - 1}"), terms.Variable(f"y{depth - 2}")
+    )
+    body = _function([f"x{depth - 1}"], body)
+    for k in reversed(range(depth - 1)):
+        local = terms.BinaryOperation(
+            "+",
+            terms.BinaryOperation("*", terms.Variable(f"x{k}"), terms.Value(2)),
+            terms.Value(1),
+        )
+        body = _function(
+            [f"x{k}"], terms.Block([terms.Assignment(f"y{k}", local)], body)
+        )
+    call = terms.Variable("f")
+    for k in range(depth):
+        call = terms.Call(call, [terms.Value(k)])
+    return terms.Block([terms.Assignment("f", body)], call)
+
+
+def count(term) -> int:
+    """
+    The number of terms in `term`.
+    """
+    if isinstance(term, terms.Array):
+        return 1 + sum(count(item) for item in term.value)
+    if isinstance(term, terms.Block):
+        return (
+            1
+            + sum(count(s.expression) for s in term.statements)
+            + count(term.expression)
+        )
+    if isinstance(term, terms.FunctionDefinition):
+        return 1 + count(term.body)
+    if isinstance(term, terms.Call):
+        return 1 + count(term.expression) + sum(count(a) for a in term.arguments)
+    if isinstance(term, terms.BinaryOperation):
+        return 1 + count(term.lhs) + count(term.rhs)
+    return 1
+
+
+def measure(make, size: int, repeat: int):
+    env = make_default_environment()
+    best = None
+    for _ in range(repeat):
+        program = make(size)
+        start = time.perf_counter()
+        check(program, env)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count(program)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--depth", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # The checker and the resolver recurse once per nested function.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.depth))
+
+    for name, make, size in (
+        ("array", array_program, args.size),
+        ("nesting", nesting_program, args.depth),
+    ):
+        for part in (size // 4, size // 2, size):
+            elapsed, total = measure(make, part, args.repeat)
+            print(
+                f"{name:<8} {part:>6} {elapsed:8.3f}s "
+                f"{elapsed / total * 1e6:6.2f}us per term"
+            )
+
+
+if __name__ == "__main__":
+    main()
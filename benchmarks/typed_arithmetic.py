@@ -0,0 +1,62 @@
+"""
+Times programs with and without the fast paths their inferred types allow.
+
+    "fib": the naive recursive fibonacci numbers, int arithmetic and comparisons
+    "trig": a tree of recursive calls that sums `math::sin` at the leaves
+
+Prints the time of each engine with `run_program(..., specialize=False)` and
+with the specialized program (see `typecheck.py`), checking is included.
+
+    python benchmarks/typed_arithmetic.py [--depth 20] [--repeat 3]
+"""
+import time
+import argparse
+
+from slang.runtime import make_default_environment, parse_string, run_program
+
+PROGRAMS = {
+    "fib": """
+let fib = function(n) if n < 2 then n else fib(n - 1) + fib(n - 2);
+fib(DEPTH)
+""",
+    "trig": """
+import "prelude.slang";
+let tree = function(n, depth)
+    if depth == 0 then math::sin(n * 0.5)
+    else tree(2 * n, depth - 1) + tree(2 * n + 1, depth - 1);
+tree(1, DEPTH - 6)
+""",
+}
+
+
+def measure(program, engine: str, specialize: bool, repeat: int) -> float:
+    env = make_default_environment()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_program(program, env, engine=engine, specialize=specialize)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    env = make_default_environment()
+    for name, source in PROGRAMS.items():
+        program = parse_string(source.replace("DEPTH", str(args.depth)), env)
+        for engine in ("runner", "unboxed", "closure", "bytecode"):
+            generic = measure(program, engine, False, args.repeat)
+            typed = measure(program, engine, True, args.repeat)
+            print(
+                f"{name:<6} {engine:<9} generic {generic:7.3f}s "
+                f"specialized {typed:7.3f}s ({generic / typed:4.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
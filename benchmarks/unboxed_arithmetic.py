@@ -0,0 +1,75 @@
+"""
+Compares the `Runner` with the unboxed one on arithmetic heavy programs.
+
+    "loop": sums a polynomial of the numbers below SIZE in a tail recursive loop
+    "fib": the naive recursive fibonacci numbers, mostly calls and comparisons
+    "floats": iterates the logistic map SIZE times
+
+Prints the time and the number of `terms.Value`s created by each engine.
+
+    python benchmarks/unboxed_arithmetic.py [--size 100000] [--repeat 3]
+"""
+import time
+import argparse
+from unittest import mock
+
+from slang.syntax import terms
+from slang.runtime import make_default_environment, parse_string, run_program
+
+PROGRAMS = {
+    "loop": """
+let loop = function(n, acc) if n == 0 then acc else loop(n - 1, acc + n * n % 7 - 3);
+loop(SIZE, 0)
+""",
+    "fib": """
+let fib = function(n) if n < 2 then n else fib(n - 1) + fib(n - 2);
+fib(18 + SIZE / 100000)
+""",
+    "floats": """
+let step = function(n, x) if n == 0 then x else step(n - 1, 3.7 * x * (1.0 - x));
+step(SIZE, 0.5)
+""",
+}
+
+
+def measure(program, engine: str, repeat: int):
+    env = make_default_environment()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_program(program, env, engine=engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    created = 0
+    init = terms.Value.__init__
+
+    def counting(self, *args, **kwargs):
+        nonlocal created
+        created += 1
+        init(self, *args, **kwargs)
+
+    with mock.patch.object(terms.Value, "__init__", counting):
+        run_program(program, env, engine=engine)
+    return best, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    env = make_default_environment()
+    print(
+        f"{'workload':10} {'runner':>10} {'values':>10} {'unboxed':>10} {'values':>10}"
+    )
+    for name, source in PROGRAMS.items():
+        program = parse_string(source.replace("SIZE", str(args.size)), env)
+        boxed, boxed_values = measure(program, "runner", args.repeat)
+        unboxed, unboxed_values = measure(program, "unboxed", args.repeat)
+        print(
+            f"{name:10} {boxed:9.3f}s {boxed_values:10} {unboxed:9.3f}s {unboxed_values:10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+A cache of parsed and simplified programs on disk, like `__pycache__`.
+
+`load_file("foo.slang", env)` keeps the simplified terms of `foo.slang` in
+`__slangcache__/foo.slang.<tag>.ast` next to it, where the tag stands for the
+slang version and the options the program was parsed with.  An entry is used
+as long as the sha256 of the source matches the one it was written for, and
+the files it imports (which calls of their functions may have been inlined
+from) still have the contents it was built from.  Loading a valid entry does
+not parse anything, the imported files included.  Entries hold the program
+before it is specialized (see `typecheck.py`): the specialized one refers to
+the Python functions of the builtins, which can not be pickled.
+
+Entries are written to a temporary file first and renamed over the old one,
+so processes sharing a cache directory only ever read whole entries.
+
+Entries are pickles, and loading a pickle can run any code it contains, so the
+cache directory is a trust boundary: whoever can write entries into it can run
+code as whoever runs the program.  Entries owned by another user, or that
+other users can write to, are not loaded, but keep the directory (by default
+next to the program) writable only by users you trust.
+"""
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+from . import __version__, inline
+from .syntax import terms
+from .syntax.terms import Environment
+
+FORMAT_VERSION = 1
+MAGIC = b"SLANGAST"
+DIRECTORY = "__slangcache__"
+
+
+def _schema() -> Tuple:
+    """
+    The slots of the terms, which entries written by another layout of them
+    can not be loaded into.
+    """
+    classes = [terms.Parameter]
+    for cls in vars(terms).values():
+        if isinstance(cls, type) and issubclass(cls, terms.Node):
+            classes.append(cls)
+    return tuple(
+        sorted(
+            (cls.__name__, tuple(getattr(c, "__slots__", ()) for c in cls.__mro__))
+            for cls in classes
+        )
+    )
+
+
+SCHEMA = hashlib.sha256(repr(_schema()).encode()).hexdigest()
+
+
+def digest(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _read(path: str) -> str:
+    # Like `parse_file`, in text mode.
+    with open(path, "r") as fd:
+        return fd.read()
+
+
+def _imports(program: terms.Expression) -> Iterator[terms.Import]:
+    """
+    The imports in `program` and in the programs it imports.
+    """
+    stack = [program]
+    seen = set()
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, (list, tuple, terms.Vector)):
+            stack.extend(item)
+            continue
+        if not isinstance(item, (terms.Node, terms.Parameter)):
+            continue
+        if isinstance(item, terms.Import):
+            yield item
+        for cls in type(item).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name != "position":
+                    stack.append(getattr(item, name, None))
+
+
+def dependencies(program: terms.Expression) -> Tuple[Tuple[str, str], ...]:
+    """
+    The paths `program` imports, directly or not, as written, with the sha256
+    of their sources.
+    """
+    paths = dict.fromkeys(i.path.value for i in _imports(program))
+    return tuple(
+        (path, digest(_read(os.path.join(os.getcwd(), path)))) for path in paths
+    )
+
+
+def cache_path(path: str, options: Tuple, cache_dir: Optional[str] = None) -> str:
+    """
+    Where the entry of the program at `path` parsed with `options` is kept.
+    cache_dir: the directory of the entries, by default `__slangcache__` next to `path`
+    """
+    path = os.path.abspath(path)
+    directory = cache_dir or os.path.join(os.path.dirname(path), DIRECTORY)
+    key = (FORMAT_VERSION, __version__, sys.implementation.cache_tag, SCHEMA, options)
+    tag = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{os.path.basename(path)}.{tag}.ast")
+
+
+def _header(options: Tuple, source_digest: str) -> Tuple:
+    return (
+        FORMAT_VERSION,
+        __version__,
+        sys.implementation.cache_tag,
+        SCHEMA,
+        options,
+        source_digest,
+    )
+
+
+def dump(program: terms.Expression, path: str, header: Tuple, dependencies=()) -> None:
+    """
+    Writes the entry at `path` atomically: other processes see the old entry
+    or the new one, never a part of it.
+    """
+    data = MAGIC + pickle.dumps(
+        (header, tuple(dependencies), program), protocol=pickle.HIGHEST_PROTOCOL
+    )
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".slangast-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def _check_owner(stat: os.stat_result) -> None:
+    """
+    Raises `ValueError` unless the entry with `stat` belongs to the current
+    user, and only they can write to it.
+    """
+    if not hasattr(os, "getuid"):
+        return
+    if stat.st_uid != os.getuid():
+        raise ValueError("The entry belongs to another user.")
+    if stat.st_mode & 0o022:
+        raise ValueError("Other users can write to the entry.")
+
+
+def load(path: str, header: Tuple) -> terms.Expression:
+    """
+    Returns the program of the entry at `path`.
+    Raises `ValueError` if it belongs to another user (see above), was written
+    for another header, or one of the files the program imports changed since.
+    """
+    with open(path, "rb") as f:
+        _check_owner(os.fstat(f.fileno()))
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a slang cache entry.")
+    written, imported, program = pickle.loads(data[len(MAGIC) :])
+    if written != header:
+        raise ValueError(f"Written for another version or source: {written}.")
+    for dependency, expected in imported:
+        if digest(_read(os.path.join(os.getcwd(), dependency))) != expected:
+            raise ValueError(f"'{dependency}' changed.")
+    return program
+
+
+def load_file(
+    path: str,
+    env: Environment,
+    positions: bool = True,
+    share: bool = False,
+    threshold: int = inline.DEFAULT_THRESHOLD,
+    cache_dir: Optional[str] = None,
+    parser: str = "tatsu",
+) -> terms.Expression:
+    """
+    Returns the simplified program at `path` (see `simplify.py`), from the
+    cache if it has an entry for its source, else parsed and simplified, and
+    written to the cache.
+    positions, share, parser: see `runtime.parse_string`
+    threshold: see `simplify.simplify`
+    cache_dir: the directory of the entries, by default `__slangcache__` next to `path`
+    """
+    path = os.path.join(os.getcwd(), path)
+    source = _read(path)
+    options = (positions, share, threshold, env.lazy)
+    header = _header(options, digest(source))
+    entry = cache_path(path, options, cache_dir)
+    try:
+        return load(entry, header)
+    except (
+        OSError,
+        ValueError,
+        EOFError,
+        TypeError,
+        AttributeError,
+        ImportError,
+        pickle.UnpicklingError,
+    ):
+        pass
+
+    from .runtime import parse_string
+    from .simplify import simplify
+
+    program = parse_string(source, env, positions=positions, share=share, parser=parser)
+    imported = dependencies(program)
+    program = simplify(program, threshold=threshold, lazy=env.lazy)
+    try:
+        dump(program, entry, header, imported)
+    except (OSError, TypeError, AttributeError, pickle.PicklingError):
+        pass
+    return program
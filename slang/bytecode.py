@@ -0,0 +1,663 @@
+"""
+A compiler from `terms` into a linear, stack based bytecode and the virtual
+machine that runs it.
+
+Compiled code only contains plain Python data (ints, strings, floats, bools
+and tuples), so it can be written to disk with `dump` and read back with
+`load` without going through the parser again.
+"""
+import os
+import sys
+import marshal
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import __version__
+from .syntax import terms, Position
+from .syntax.terms import Environment
+from .numeric import pack
+from .runtime import (
+    RuntimeError,
+    binary_operators,
+    evaluate_binary_expression,
+    evaluate_unary_expression,
+)
+
+FORMAT_VERSION = 5
+MAGIC = b"SLANGC"
+
+# Opcodes.  Every instruction is a pair `(opcode, argument)`.
+CONST = 0
+LOAD_NAME = 1
+LOAD_LOCAL = 2
+LOAD_OUTER = 3
+STORE_SLOT = 4
+DEFINE_SLOT = 5
+PUSH_FRAME = 6
+POP_FRAME = 7
+IMPORT = 8
+JUMP = 9
+POP_JUMP_IF_FALSE = 10
+BINARY = 11
+UNARY = 12
+CALL = 13
+TAIL_CALL = 14
+RETURN = 15
+MAKE_FUNCTION = 16
+BUILD_ARRAY = 17
+BUILD_NAMESPACE = 18
+INDEX = 19
+LOOKUP = 20
+BANG = 21
+
+opnames = [
+    "CONST",
+    "LOAD_NAME",
+    "LOAD_LOCAL",
+    "LOAD_OUTER",
+    "STORE_SLOT",
+    "DEFINE_SLOT",
+    "PUSH_FRAME",
+    "POP_FRAME",
+    "IMPORT",
+    "JUMP",
+    "POP_JUMP_IF_FALSE",
+    "BINARY",
+    "UNARY",
+    "CALL",
+    "TAIL_CALL",
+    "RETURN",
+    "MAKE_FUNCTION",
+    "BUILD_ARRAY",
+    "BUILD_NAMESPACE",
+    "INDEX",
+    "LOOKUP",
+    "BANG",
+]
+
+# `LOAD_OUTER` packs the depth of the frame and the slot into its argument.
+DEPTH_SHIFT = 16
+SLOT_MASK = (1 << DEPTH_SHIFT) - 1
+
+
+class Code:
+    """
+    parameters: the names of the parameters, empty for programs
+    instructions: a flat list of `opcode, argument` pairs
+    constants: `terms.Value`s, normalized `terms.Array`s, nested `Code` objects, the
+        `terms.Shape`s of namespaces, the `terms.Lookup`s (which cache the slot of their
+        name) and the `(name, slot)` pairs of imports
+    names: the global variable and namespace member names used by the code
+    positions: maps the offset of a call or load instruction to `(start_line, end_line)`
+    captures, linked: what function values keep of their environment, see `terms.capture`
+    """
+
+    def __init__(
+        self,
+        parameters: Tuple[str, ...],
+        instructions: List[int],
+        constants: List[Any],
+        names: List[str],
+        positions: Dict[int, Tuple[int, int]],
+        position: Optional[Tuple[int, int]] = None,
+        captures: Optional[Tuple[Tuple[int, int], ...]] = None,
+        linked: bool = False,
+    ):
+        self.parameters = parameters
+        self.instructions = instructions
+        self.constants = constants
+        self.names = names
+        self.positions = positions
+        self.position = position
+        self.captures = captures
+        self.linked = linked
+        self._definition = None
+
+    @property
+    def definition(self) -> terms.FunctionDefinition:
+        if self._definition is None:
+            self._definition = terms.FunctionDefinition(
+                [terms.Parameter(name, None) for name in self.parameters],
+                self,
+                builtin=False,
+                position=_make_position(self.position),
+                captures=self.captures,
+                linked=self.linked,
+            )
+        return self._definition
+
+    def disassemble(self) -> str:
+        lines = []
+        for pc in range(0, len(self.instructions), 2):
+            op, arg = self.instructions[pc], self.instructions[pc + 1]
+            lines.append(f"{pc:>6} {opnames[op]:<18} {arg}")
+        return "\n".join(lines)
+
+
+def _make_position(position: Optional[Tuple[int, int]]) -> Optional[Position]:
+    if position is None:
+        return None
+    return Position(None, position[0], position[1], None, None)
+
+
+def _lines(position: Optional[Position]) -> Optional[Tuple[int, int]]:
+    if position is None:
+        return None
+    return (position.start_line, position.end_line)
+
+
+class Compiler:
+    def __init__(
+        self,
+        parameters: Tuple[str, ...] = (),
+        position=None,
+        captures=None,
+        linked: bool = False,
+    ):
+        captures = tuple(captures) if captures is not None else None
+        self.code = Code(parameters, [], [], [], {}, _lines(position), captures, linked)
+        self.constant_indices: Dict[Any, int] = {}
+        self.name_indices: Dict[str, int] = {}
+        self.imports: List[str] = []
+
+    def compile_program(self, program: terms.Expression) -> Code:
+        self.compile(program, tail=True)
+        self.emit(RETURN)
+        return self.code
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        self.code.instructions.extend((op, arg))
+        return len(self.code.instructions) - 2
+
+    def patch(self, at: int) -> None:
+        self.code.instructions[at + 1] = len(self.code.instructions)
+
+    def constant(self, value) -> int:
+        if isinstance(value, terms.Value) and not isinstance(value, terms.Array):
+            kind = type(value.value)
+            # Keeps `0.0` and `-0.0` apart, which are equal as keys.
+            key = (kind, value.value.hex() if kind is float else value.value)
+        else:
+            key = ("id", id(value))
+        index = self.constant_indices.get(key)
+        if index is None:
+            index = len(self.code.constants)
+            self.code.constants.append(value)
+            self.constant_indices[key] = index
+        return index
+
+    def name(self, name: str) -> int:
+        index = self.name_indices.get(name)
+        if index is None:
+            index = len(self.code.names)
+            self.code.names.append(name)
+            self.name_indices[name] = index
+        return index
+
+    def compile(self, term, tail: bool = False) -> None:
+        getattr(self, f"compile_{type(term).__name__}")(term, tail)
+
+    def compile_Block(self, block, tail):
+        if not block.statements:
+            return self.compile(block.expression, tail)
+
+        self.emit(PUSH_FRAME, block.size)
+        for statement in block.statements:
+            self.compile(statement)
+            if isinstance(statement, terms.Import):
+                self.emit(IMPORT, self.constant(tuple(statement.slots)))
+        self.compile(block.expression, tail)
+        # The frames of a call are dropped when it returns anyway.
+        if not tail:
+            self.emit(POP_FRAME)
+
+    def compile_Bang(self, bang, tail):
+        self.emit(BANG)
+
+    def compile_Import(self, statement, tail):
+        # Imported programs never reach past their own frames,
+        # so they can run on top of the frame of the importer.
+        self.imports.append(statement.path.value)
+        self.compile(statement.program)
+
+    def compile_Assignment(self, statement, tail):
+        self.compile(statement.expression)
+        self.emit(STORE_SLOT, statement.index)
+
+    def compile_IfThenElse(self, expr, tail):
+        self.compile(expr.test)
+        jump_false = self.emit(POP_JUMP_IF_FALSE)
+        self.compile(expr.true, tail)
+        if tail:
+            self.emit(RETURN)
+            self.patch(jump_false)
+            self.compile(expr.false, tail)
+            return
+        jump_end = self.emit(JUMP)
+        self.patch(jump_false)
+        self.compile(expr.false, tail)
+        self.patch(jump_end)
+
+    def compile_FunctionDefinition(self, definition, tail):
+        if definition.is_builtin:
+            raise Exception("Builtin functions can not be compiled.")
+        parameters = tuple(p.name for p in definition.parameters)
+        compiler = Compiler(
+            parameters, definition.position, definition.captures, definition.linked
+        )
+        code = compiler.compile_program(definition.body)
+        self.imports.extend(compiler.imports)
+        self.emit(MAKE_FUNCTION, self.constant(code))
+
+    def compile_Call(self, call, tail):
+        self.compile(call.expression)
+        for argument in call.arguments:
+            self.compile(argument)
+        at = self.emit(TAIL_CALL if tail else CALL, len(call.arguments))
+        if call.position is not None:
+            self.code.positions[at] = _lines(call.position)
+
+    def compile_BinaryOperation(self, expr, tail):
+        self.compile(expr.lhs)
+        self.compile(expr.rhs)
+        self.emit(BINARY, self.name(expr.op))
+
+    # The machine has no instructions of its own for the terms the type checker
+    # specializes (see `typecheck.py`), they compile like the generic ones.
+    compile_NumericOperation = compile_BinaryOperation
+    compile_TypedIfThenElse = compile_IfThenElse
+    compile_UncheckedCall = compile_Call
+
+    def compile_UnaryOperation(self, expr, tail):
+        self.compile(expr.expression)
+        self.emit(UNARY, self.name(expr.op))
+
+    def compile_Index(self, index, tail):
+        self.compile(index.lhs)
+        self.compile(index.rhs)
+        self.emit(INDEX)
+
+    def compile_Lookup(self, lookup, tail):
+        self.compile(lookup.expression)
+        self.emit(LOOKUP, self.constant(lookup))
+
+    def compile_Variable(self, var, tail):
+        self.emit(LOAD_NAME, self.name(var.name))
+
+    def compile_Bound(self, bound, tail):
+        if bound.depth == 0:
+            at = self.emit(LOAD_LOCAL, bound.index)
+        else:
+            at = self.emit(LOAD_OUTER, bound.depth << DEPTH_SHIFT | bound.index)
+        # Kept to report variables used before they are defined.
+        if bound.position is not None:
+            self.code.positions[at] = _lines(bound.position)
+
+    def compile_Namespace(self, ns, tail):
+        self.emit(PUSH_FRAME, len(ns.definitions))
+        for index, definition in enumerate(ns.definitions):
+            self.compile(definition.value)
+            self.emit(DEFINE_SLOT, index)
+        self.emit(POP_FRAME)
+        self.emit(BUILD_NAMESPACE, self.constant(ns.shape))
+
+    def compile_Array(self, array, tail):
+        if array.normalized:
+            self.emit(CONST, self.constant(array))
+            return
+        for item in array.value:
+            self.compile(item)
+        self.emit(BUILD_ARRAY, len(array.value))
+
+    compile_NumericArray = compile_Array
+
+    def compile_Value(self, value, tail):
+        self.emit(CONST, self.constant(terms.Value(value.value)))
+
+
+def compile_program(program: terms.Expression) -> Code:
+    return Compiler().compile_program(program)
+
+
+class VirtualMachine:
+    """
+    Runs `Code`.  Calls to slang functions do not recurse in Python,
+    and calls in tail position reuse the frame of the caller.
+    """
+
+    def __init__(self):
+        # The code of the terms and definitions compiled so far, by id, next
+        # to them to keep them alive.
+        self.cache: Dict[int, Tuple[Any, Code]] = {}
+
+    def run(self, term, env: Environment):
+        # Builtins may hand back normalized values.
+        if isinstance(term, (terms.Value, terms.Namespace, terms.Function)):
+            if not isinstance(term, terms.Array) or term.normalized:
+                return term
+        entry = self.cache.get(id(term))
+        if entry is None:
+            entry = (term, compile_program(term))
+            self.cache[id(term)] = entry
+        return self.execute(entry[1], env)
+
+    def call(self, function: terms.Function, arguments, env: Environment):
+        definition = function.definition
+        if definition.is_builtin:
+            return self.run(definition.body(self, env, list(arguments)), env)
+        # The parameters, followed by `this`.
+        frame = terms.Frame(function.environment, list(arguments) + [function])
+        return self.execute(self._body(definition), frame)
+
+    def _force(self, value, env: Environment):
+        if value.is_value():
+            return value
+        if isinstance(value, terms.FunctionDefinition):
+            if value.is_builtin:
+                return terms.Function(value, env)
+            return terms.Function(self._body(value).definition, env)
+        return self.run(value, env)
+
+    def _body(self, definition: terms.FunctionDefinition) -> Code:
+        if isinstance(definition.body, Code):
+            return definition.body
+        entry = self.cache.get(id(definition))
+        if entry is None:
+            parameters = tuple(p.name for p in definition.parameters)
+            code = Compiler(
+                parameters, definition.position, definition.captures, definition.linked
+            ).compile_program(definition.body)
+            entry = (definition, code)
+            self.cache[id(definition)] = entry
+        return entry[1]
+
+    def _undefined(self, code: Code, pc: int):
+        raise RuntimeError(
+            "A variable is used before it is defined.",
+            _make_position(code.positions.get(pc - 2)),
+        )
+
+    def execute(self, code: Code, env: Environment):
+        Frame = terms.Frame
+        capture = terms.capture
+        stack: List[Any] = []
+        frames = []
+        instructions = code.instructions
+        constants = code.constants
+        names = code.names
+        pc = 0
+        force = self._force
+        while True:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+            if op == LOAD_LOCAL:
+                value = env.slots[arg]
+                if value is None:
+                    self._undefined(code, pc)
+                stack.append(value)
+            elif op == LOAD_OUTER:
+                frame = env
+                for _ in range(arg >> DEPTH_SHIFT):
+                    frame = frame.parent
+                value = frame.slots[arg & SLOT_MASK]
+                if value is None:
+                    self._undefined(code, pc)
+                stack.append(value)
+            elif op == LOAD_NAME:
+                stack.append(force(env.find_symbol(names[arg]), env))
+            elif op == CONST:
+                stack.append(constants[arg])
+            elif op == BINARY:
+                rhs = stack.pop()
+                function = binary_operators.get(names[arg])
+                if function is None:
+                    stack[-1] = evaluate_binary_expression(names[arg], stack[-1], rhs)
+                else:
+                    stack[-1] = function(stack[-1], rhs)
+            elif op == POP_JUMP_IF_FALSE:
+                test = stack.pop()
+                if test.value is False:
+                    pc = arg
+                elif test.value is not True:
+                    raise Exception(f"Expected a bool, not a '{type(test)}'.")
+            elif op == JUMP:
+                pc = arg
+            elif op == CALL or op == TAIL_CALL:
+                if arg:
+                    arguments = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    arguments = []
+                function = stack.pop()
+                if not isinstance(function, terms.Function):
+                    raise RuntimeError(
+                        f"Expected a function, not a '{type(function)}'.",
+                        _make_position(code.positions.get(pc - 2)),
+                    )
+                definition = function.definition
+                if arg != len(definition.parameters):
+                    position = _make_position(code.positions.get(pc - 2))
+                    raise Exception(
+                        f"The function defined at {definition.position} and called at {position} takes {len(definition.parameters)} arguments, not {arg}."
+                    )
+                if definition.is_builtin:
+                    stack.append(self.run(definition.body(self, env, arguments), env))
+                    if op == CALL:
+                        continue
+                    if not frames:
+                        return stack.pop()
+                    code, pc, env = frames.pop()
+                    instructions = code.instructions
+                    constants = code.constants
+                    names = code.names
+                    continue
+                body = self._body(definition)
+                # The parameters, followed by `this`.
+                arguments.append(function)
+                if op == CALL:
+                    frames.append((code, pc, env))
+                code = body
+                instructions = code.instructions
+                constants = code.constants
+                names = code.names
+                pc = 0
+                env = Frame(function.environment, arguments)
+            elif op == RETURN:
+                if not frames:
+                    return stack.pop()
+                code, pc, env = frames.pop()
+                instructions = code.instructions
+                constants = code.constants
+                names = code.names
+            elif op == INDEX:
+                rhs = stack.pop()
+                stack[-1] = force(stack[-1].value[rhs.value], env)
+            elif op == LOOKUP:
+                stack[-1] = force(stack[-1].lookup_at(constants[arg]), env)
+            elif op == MAKE_FUNCTION:
+                definition = constants[arg].definition
+                stack.append(terms.Function(definition, capture(definition, env)))
+            elif op == PUSH_FRAME:
+                env = Frame(env, [None] * arg)
+            elif op == POP_FRAME:
+                env = env.parent
+            elif op == STORE_SLOT:
+                env.slots[arg] = stack.pop()
+            elif op == DEFINE_SLOT:
+                env.slots[arg] = stack[-1]
+            elif op == BUILD_ARRAY:
+                if arg:
+                    items = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    items = []
+                stack.append(pack(items))
+            elif op == BUILD_NAMESPACE:
+                shape = constants[arg]
+                size = len(shape.names)
+                values = stack[-size:] if size else []
+                del stack[len(stack) - size :]
+                stack.append(terms.Namespace.record(shape, values))
+            elif op == IMPORT:
+                ns = stack.pop()
+                assert isinstance(ns, terms.Namespace)
+                for name, index in constants[arg]:
+                    env.slots[index] = ns.lookup(name)
+            elif op == UNARY:
+                stack[-1] = evaluate_unary_expression(names[arg], stack[-1])
+            elif op == BANG:
+                print("!")
+            else:
+                raise Exception(f"Unknown opcode '{op}'.")
+
+
+# Serialization.
+
+
+def _encode_value(value: terms.Value):
+    if isinstance(value, terms.Array):
+        return ("array", tuple(_encode_value(item) for item in value.value))
+    return ("value", value.value)
+
+
+def _decode_value(kind: str, value) -> terms.Value:
+    if kind == "array":
+        return pack([_decode_value(*item) for item in value])
+    return terms.Value(value)
+
+
+def _encode(code: Code):
+    constants = []
+    for constant in code.constants:
+        if isinstance(constant, Code):
+            constants.append(("code", _encode(constant)))
+        elif isinstance(constant, tuple):
+            constants.append(("names", constant))
+        elif isinstance(constant, terms.Shape):
+            constants.append(("shape", constant.names))
+        elif isinstance(constant, terms.Lookup):
+            constants.append(("lookup", constant.var.name))
+        else:
+            constants.append(_encode_value(constant))
+    return (
+        code.parameters,
+        tuple(code.instructions),
+        tuple(constants),
+        tuple(code.names),
+        tuple(code.positions.items()),
+        code.position,
+        code.captures,
+        code.linked,
+    )
+
+
+def _decode(data) -> Code:
+    (
+        parameters,
+        instructions,
+        encoded,
+        names,
+        positions,
+        position,
+        captures,
+        linked,
+    ) = data
+    constants = []
+    for kind, constant in encoded:
+        if kind == "code":
+            constants.append(_decode(constant))
+        elif kind == "names":
+            constants.append(constant)
+        elif kind == "shape":
+            constants.append(terms.Shape.of(constant))
+        elif kind == "lookup":
+            # Only the name is used, with a cache of its own.
+            constants.append(terms.Lookup(None, terms.Variable(constant)))
+        else:
+            constants.append(_decode_value(kind, constant))
+    return Code(
+        parameters,
+        list(instructions),
+        constants,
+        list(names),
+        dict(positions),
+        position,
+        captures,
+        linked,
+    )
+
+
+def dumps(code: Code, dependencies=()) -> bytes:
+    """
+    dependencies: `(path, mtime, size)` of the files the code was compiled from
+    """
+    header = (FORMAT_VERSION, __version__, sys.implementation.cache_tag)
+    return MAGIC + marshal.dumps((header, tuple(dependencies), _encode(code)))
+
+
+def loads(data: bytes):
+    """
+    Returns the code and the dependencies it was compiled from.
+    Raises `ValueError` if the data was written by another version.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not compiled slang code.")
+    header, dependencies, code = marshal.loads(data[len(MAGIC) :])
+    if header != (FORMAT_VERSION, __version__, sys.implementation.cache_tag):
+        raise ValueError(f"Compiled by an incompatible version: {header}.")
+    return _decode(code), dependencies
+
+
+def dump(code: Code, path: str, dependencies=()) -> None:
+    data = dumps(code, dependencies)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".slangc-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def load(path: str):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def _stat(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def load_file(path: str, env: Environment, cache_path: Optional[str] = None) -> Code:
+    """
+    Compiles the program at `path`, reusing the code cached at `cache_path`
+    (by default `path` with a trailing "c") as long as neither the program
+    nor the files it imports changed.  Whoever can write `cache_path` decides
+    what runs, see the README.
+    """
+    from .runtime import parse_file
+    from .resolve import resolve
+    from .simplify import simplify
+
+    path = os.path.join(os.getcwd(), path)
+    cache_path = cache_path or path + "c"
+    try:
+        code, dependencies = load(cache_path)
+        if all(_stat(d[0]) == tuple(d) for d in dependencies):
+            return code
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+
+    compiler = Compiler()
+    program = simplify(parse_file(path, env))
+    code = compiler.compile_program(resolve(program, env))
+    paths = [path] + [os.path.join(os.getcwd(), p) for p in compiler.imports]
+    try:
+        dump(code, cache_path, [_stat(p) for p in dict.fromkeys(paths)])
+    except OSError:
+        pass
+    return code
@@ -0,0 +1,338 @@
+"""
+An alternative to the tree walking `Runner`.
+
+Instead of dispatching on the type of every node each time it is evaluated,
+a program is compiled once into a tree of closures.  Each closure has the
+operator, the arity and the closures of its children bound in advance, so
+evaluation is a plain sequence of Python calls.
+"""
+from typing import Callable, Dict, List, Tuple
+
+from .syntax import terms
+from .syntax.terms import Environment
+from .numeric import pack
+from .runtime import (
+    RuntimeError,
+    binary_operators,
+    evaluate_binary_expression,
+    evaluate_unary_expression,
+)
+
+Code = Callable[[terms.Frame], terms.Expression]
+
+
+class CompiledFunction(terms.Function):
+    __slots__ = ("code",)
+
+    def __init__(self, definition: terms.FunctionDefinition, environment, code: Code):
+        super().__init__(definition, environment)
+        self.code = code
+
+
+class ClosureRunner:
+    """
+    Has the same interface as `Runner`, so builtins can be handed either.
+    """
+
+    def __init__(self):
+        self.cache: Dict[int, Tuple[terms.Expression, Code]] = {}
+
+    def run(self, term, env: Environment):
+        # Everything the closures produce is already normalized.
+        if isinstance(term, (terms.Value, terms.Namespace, terms.Function)):
+            if not isinstance(term, terms.Array) or term.normalized:
+                return term
+        return self.compile(term)(env)
+
+    def compile(self, term) -> Code:
+        """
+        Compiles `term`, reusing the result if `term` was compiled before.
+        """
+        entry = self.cache.get(id(term))
+        if entry is None:
+            entry = (term, self._compile(term))
+            self.cache[id(term)] = entry
+        return entry[1]
+
+    def invoke(self, function: terms.Function, arguments: List[terms.Expression]):
+        definition = function.definition
+        if isinstance(function, CompiledFunction):
+            code = function.code
+        else:
+            code = self.compile(definition.body)
+        # The parameters, followed by `this`.
+        return code(terms.Frame(function.environment, arguments + [function]))
+
+    def call(self, function: terms.Function, arguments, env: Environment):
+        if function.definition.is_builtin:
+            return self.run(function.definition.body(self, env, list(arguments)), env)
+        return self.invoke(function, list(arguments))
+
+    def _compile(self, term) -> Code:
+        return getattr(self, f"compile_{type(term).__name__}")(term)
+
+    def _force(self, value, env: Environment):
+        # Builtins are stored as definitions and still need to become functions.
+        if value.is_value():
+            return value
+        return self.compile(value)(env)
+
+    def _compile_statement(self, statement) -> Callable[[terms.Frame], None]:
+        if isinstance(statement, terms.Import):
+            program = self.compile_Import(statement)
+            slots = statement.slots
+
+            def _import(frame):
+                ns = program(frame)
+                assert isinstance(ns, terms.Namespace)
+                for name, index in slots:
+                    frame.slots[index] = ns.lookup(name)
+
+            return _import
+
+        if isinstance(statement, terms.Assignment):
+            index = statement.index
+            expression = self._compile(statement.expression)
+
+            def _assignment(frame):
+                frame.slots[index] = expression(frame)
+
+            return _assignment
+
+        return self._compile(statement)
+
+    def compile_Block(self, block) -> Code:
+        statements = [self._compile_statement(s) for s in block.statements]
+        expression = self._compile(block.expression)
+        if not statements:
+            return expression
+        size = block.size
+        Frame = terms.Frame
+
+        def _block(env):
+            new = Frame(env, [None] * size)
+            for statement in statements:
+                statement(new)
+            return expression(new)
+
+        return _block
+
+    def compile_Bang(self, bang) -> Code:
+        def _bang(env):
+            print("!")
+
+        return _bang
+
+    def compile_Import(self, expr) -> Code:
+        program = self.compile(expr.program)
+
+        # Imported programs only see the globals.
+        def _import(env):
+            if isinstance(env, terms.Frame):
+                env = env.get_environment()
+            return program(env)
+
+        return _import
+
+    def compile_Assignment(self, stmt) -> Code:
+        index = stmt.index
+        expression = self._compile(stmt.expression)
+
+        def _assignment(frame):
+            value = expression(frame)
+            frame.slots[index] = value
+            return value
+
+        return _assignment
+
+    def compile_IfThenElse(self, expr) -> Code:
+        test = self._compile(expr.test)
+        true = self._compile(expr.true)
+        false = self._compile(expr.false)
+
+        def _if_then_else(env):
+            result = test(env)
+            if result.value is True:
+                return true(env)
+            elif result.value is False:
+                return false(env)
+            raise Exception(f"Expected a bool, not a '{type(result)}'.")
+
+        return _if_then_else
+
+    def compile_TypedIfThenElse(self, expr) -> Code:
+        test = self._compile(expr.test)
+        true = self._compile(expr.true)
+        false = self._compile(expr.false)
+        return lambda env: true(env) if test(env).value else false(env)
+
+    def compile_Function(self, function) -> Code:
+        return lambda env: function
+
+    def compile_FunctionDefinition(self, definition) -> Code:
+        if definition.is_builtin:
+            return lambda env: terms.Function(definition, env)
+
+        body = self._compile(definition.body)
+        capture = terms.capture
+        return lambda env: CompiledFunction(definition, capture(definition, env), body)
+
+    def compile_Call(self, call) -> Code:
+        callee = self._compile(call.expression)
+        arguments = [self._compile(arg) for arg in call.arguments]
+        arity = len(arguments)
+        position = call.position
+        invoke = self.invoke
+
+        def _call(env):
+            function = callee(env)
+            if not isinstance(function, terms.Function):
+                raise RuntimeError(
+                    f"Expected a function, not a '{type(function)}'.", position
+                )
+
+            definition = function.definition
+            if arity != len(definition.parameters):
+                raise Exception(
+                    f"The function defined at {definition.position} and called at {position} takes {len(definition.parameters)} arguments, not {arity}."
+                )
+            values = [argument(env) for argument in arguments]
+            if definition.is_builtin:
+                return self.run(definition.body(self, env, values), env)
+            return invoke(function, values)
+
+        return _call
+
+    def compile_UncheckedCall(self, call) -> Code:
+        arguments = [self._compile(arg) for arg in call.arguments]
+        body = call.definition.unchecked.body
+        run = self.run
+
+        def _unchecked_call(env):
+            return run(body(self, env, [argument(env) for argument in arguments]), env)
+
+        return _unchecked_call
+
+    def compile_BinaryOperation(self, expr) -> Code:
+        lhs = self._compile(expr.lhs)
+        rhs = self._compile(expr.rhs)
+        op = expr.op
+        function = binary_operators.get(op)
+        if function is None:
+            return lambda env: evaluate_binary_expression(op, lhs(env), rhs(env))
+        return lambda env: function(lhs(env), rhs(env))
+
+    def compile_NumericOperation(self, expr) -> Code:
+        lhs = self._compile(expr.lhs)
+        rhs = self._compile(expr.rhs)
+        function = expr.function
+        box = terms.box
+        return lambda env: box(function(lhs(env).value, rhs(env).value))
+
+    def compile_UnaryOperation(self, expr) -> Code:
+        expression = self._compile(expr.expression)
+        op = expr.op
+        if op == "+":
+            return expression
+        if op == "-":
+            return lambda env: -expression(env)
+        return lambda env: evaluate_unary_expression(op, expression(env))
+
+    def compile_Index(self, index) -> Code:
+        lhs = self._compile(index.lhs)
+        rhs = self._compile(index.rhs)
+        force = self._force
+
+        def _index(env):
+            return force(lhs(env).value[rhs(env).value], env)
+
+        return _index
+
+    def compile_Lookup(self, lookup) -> Code:
+        expression = self._compile(lookup.expression)
+        force = self._force
+
+        def _lookup(env):
+            return force(expression(env).lookup_at(lookup), env)
+
+        return _lookup
+
+    def compile_Variable(self, var) -> Code:
+        name = var.name
+        force = self._force
+
+        def _variable(env):
+            return force(env.find_symbol(name), env)
+
+        return _variable
+
+    def compile_Bound(self, bound) -> Code:
+        depth = bound.depth
+        index = bound.index
+        name = bound.name
+        position = bound.position
+
+        def _undefined():
+            raise RuntimeError(f"'{name}' is used before it is defined.", position)
+
+        # The common depths get a closure without a loop.
+        if depth == 0:
+
+            def _bound(frame):
+                value = frame.slots[index]
+                return _undefined() if value is None else value
+
+        elif depth == 1:
+
+            def _bound(frame):
+                value = frame.parent.slots[index]
+                return _undefined() if value is None else value
+
+        elif depth == 2:
+
+            def _bound(frame):
+                value = frame.parent.parent.slots[index]
+                return _undefined() if value is None else value
+
+        else:
+
+            def _bound(frame):
+                for _ in range(depth):
+                    frame = frame.parent
+                value = frame.slots[index]
+                return _undefined() if value is None else value
+
+        return _bound
+
+    def compile_Namespace(self, ns) -> Code:
+        definitions = [self._compile(d.value) for d in ns.definitions]
+        shape = ns.shape
+        size = len(definitions)
+        Frame = terms.Frame
+        record = terms.Namespace.record
+
+        def _namespace(env):
+            new = Frame(env, [None] * size)
+            slots = new.slots
+            for index, value in enumerate(definitions):
+                slots[index] = value(new)
+            return record(shape, slots)
+
+        return _namespace
+
+    def compile_Array(self, array) -> Code:
+        if array.normalized:
+            return lambda env: array
+
+        items = [self._compile(item) for item in array.value]
+        position = array.position
+
+        def _array(env):
+            return pack([item(env) for item in items], position=position)
+
+        return _array
+
+    compile_NumericArray = compile_Array
+
+    def compile_Value(self, value) -> Code:
+        return lambda env: value
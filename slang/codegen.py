@@ -0,0 +1,542 @@
+"""
+Translates slang programs into Python modules.
+
+Slang functions become Python functions, blocks become sequences of Python
+assignments and imports are translated along with the program.  The
+generated module exposes `run()`, which returns what `run_file` would.
+
+The second half of this file is the support code the generated modules
+import at runtime.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from . import resolve
+from .syntax import terms, Position
+
+HEADER = '''"""
+Generated by slang from {path}.  Do not edit.
+"""
+from slang import codegen as _slang
+from slang.syntax import terms as _terms
+
+_builtins = _slang.builtins()
+'''
+
+FOOTER = """
+
+if __name__ == "__main__":
+    _slang.main(run)
+"""
+
+python_operators = {
+    "+": "+",
+    "-": "-",
+    "*": "*",
+    "/": "/",
+    "^": "**",
+    "%": "%",
+    "==": "==",
+    "<": "<",
+    ">": ">",
+    "<=": "<=",
+    ">=": ">=",
+}
+
+
+class CodegenError(Exception):
+    pass
+
+
+class Binding:
+    """
+    target: the Python name holding the value
+    function: `(name, arity)` of the Python function if the value is a known slang function
+    static: the value itself if it is known while compiling (only for builtins)
+    """
+
+    def __init__(self, target: str, function=None, static=None):
+        self.target = target
+        self.function = function
+        self.static = static
+
+
+class Scope:
+    """
+    Names of a block are declared up front, because function bodies see
+    every name of the blocks around them once they are called.  Everything
+    else only sees the names defined before it.
+    """
+
+    def __init__(self, parent: Optional["Scope"] = None):
+        self.parent = parent
+        self.declared: Dict[str, Binding] = {}
+        self.defined = set()
+
+    def declare(self, name: str, binding: Binding) -> None:
+        if name in self.declared:
+            raise CodegenError(f"This env already defines a value named '{name}'.")
+        self.declared[name] = binding
+
+    def find(self, name: str, deferred: bool) -> Optional[Binding]:
+        if name in self.defined or (deferred and name in self.declared):
+            return self.declared[name]
+        if self.parent:
+            return self.parent.find(name, deferred)
+        return None
+
+
+class FunctionScope(Scope):
+    """The scope of the parameters, it marks the boundary of a function body."""
+
+    def find(self, name: str, deferred: bool) -> Optional[Binding]:
+        if name in self.declared:
+            return self.declared[name]
+        if self.parent:
+            return self.parent.find(name, True)
+        return None
+
+
+class Generator:
+    def __init__(self, path: str):
+        self.path = path
+        self.counter = 0
+        self.module: List[str] = []
+        self.constants: Dict[Tuple[type, object], str] = {}
+        self.hoisted: Dict[Tuple[str, ...], str] = {}
+        self.imports: Dict[str, str] = {}
+        self.lines: List[str] = []
+
+    def generate(self, program: terms.Expression) -> str:
+        body = self.function_body(program, Scope())
+        lines = [HEADER.format(path=self.path)]
+        lines.extend(self.module)
+        lines.append("")
+        lines.append("")
+        lines.append("def run():")
+        lines.extend(_indent(body))
+        return "\n".join(lines) + "\n" + FOOTER
+
+    def fresh(self, name: str) -> str:
+        self.counter += 1
+        return f"{name}_{self.counter}"
+
+    def function_body(self, term, scope: Scope) -> List[str]:
+        lines, result = self.capture(term, scope)
+        return lines + [f"return {result}"]
+
+    def capture(self, term, scope: Scope) -> Tuple[List[str], str]:
+        saved = self.lines
+        self.lines = []
+        try:
+            result = self.expression(term, scope)
+            return self.lines, result
+        finally:
+            self.lines = saved
+
+    def emit(self, line: str) -> None:
+        self.lines.append(line)
+
+    def materialize(self, expression: str) -> str:
+        if expression.isidentifier():
+            return expression
+        target = self.fresh("_t")
+        self.emit(f"{target} = {expression}")
+        return target
+
+    def sequence(self, nodes, scope: Scope) -> List[str]:
+        """
+        Generates `nodes` from left to right.  If a node needs statements,
+        the nodes before it are evaluated into temporaries first.
+        """
+        results: List[str] = []
+        for node in nodes:
+            lines, result = self.capture(node, scope)
+            if lines:
+                results = [self.materialize(r) for r in results]
+                self.lines.extend(lines)
+            results.append(result)
+        return results
+
+    def constant(self, value) -> str:
+        key = (type(value), value)
+        name = self.constants.get(key)
+        if name is None:
+            name = self.fresh("_c")
+            self.module.append(f"{name} = _terms.Value({value!r})")
+            self.constants[key] = name
+        return name
+
+    def builtin(self, path: Tuple[str, ...]) -> str:
+        name = self.hoisted.get(path)
+        if name is None:
+            parent = self.builtin(path[:-1]) if len(path) > 1 else "_builtins"
+            name = self.fresh("_b_" + path[-1])
+            self.module.append(f"{name} = _slang.member({parent}, {path[-1]!r})")
+            self.hoisted[path] = name
+        return name
+
+    def position(self, position: Optional[Position]) -> str:
+        if position is None:
+            return "None"
+        return f"_slang.position({position.start_line}, {position.end_line})"
+
+    def static(self, term, scope: Scope):
+        """
+        Returns `(path, value)` if `term` refers to a builtin.
+        """
+        if isinstance(term, terms.Variable):
+            binding = scope.find(term.name, False)
+            if binding is None and term.name == "builtins":
+                return ((), builtins())
+            if binding is not None and binding.static is not None:
+                return binding.static
+        elif isinstance(term, terms.Lookup):
+            static = self.static(term.expression, scope)
+            if static and isinstance(static[1], terms.Namespace):
+                path, ns = static
+                if ns.has(term.var.name):
+                    return (path + (term.var.name,), ns.lookup(term.var.name))
+        return None
+
+    def expression(self, term, scope: Scope) -> str:
+        return getattr(self, f"generate_{type(term).__name__}")(term, scope)
+
+    def statement(self, statement, scope: Scope) -> None:
+        if isinstance(statement, terms.Assignment):
+            binding = scope.declared[statement.name]
+            if isinstance(statement.expression, terms.FunctionDefinition):
+                # Visible in its own body, which only runs once the function is called.
+                scope.defined.add(statement.name)
+                self.generate_FunctionDefinition(
+                    statement.expression, scope, binding.target, binding.function[0]
+                )
+                return
+            value = self.expression(statement.expression, scope)
+            self.emit(f"{binding.target} = {value}")
+            binding.static = self.static(statement.expression, scope)
+            scope.defined.add(statement.name)
+        elif isinstance(statement, terms.Import):
+            ns = self.materialize(self.generate_Import(statement, scope))
+            for name in exports(statement.program, statement.path.value):
+                binding = scope.declared[name]
+                self.emit(f"{binding.target} = _slang.member({ns}, {name!r})")
+                scope.defined.add(name)
+        elif isinstance(statement, terms.Bang):
+            self.emit('print("!")')
+        else:
+            raise CodegenError(f"Can not translate '{type(statement)}'.")
+
+    def declare(self, statements, scope: Scope) -> None:
+        for statement in statements:
+            if isinstance(statement, terms.Assignment):
+                function = None
+                if isinstance(statement.expression, terms.FunctionDefinition):
+                    arity = len(statement.expression.parameters)
+                    function = (self.fresh("_f"), arity)
+                binding = Binding(self.fresh(statement.name), function)
+                scope.declare(statement.name, binding)
+            elif isinstance(statement, terms.Import):
+                for name in exports(statement.program, statement.path.value):
+                    scope.declare(name, Binding(self.fresh(name)))
+
+    def generate_Block(self, block, scope: Scope) -> str:
+        if not block.statements:
+            return self.expression(block.expression, scope)
+        new = Scope(scope)
+        self.declare(block.statements, new)
+        for statement in block.statements:
+            self.statement(statement, new)
+        return self.expression(block.expression, new)
+
+    def generate_Import(self, expr, scope: Scope) -> str:
+        path = expr.path.value
+        name = self.imports.get(path)
+        if name is None:
+            name = self.fresh("_import")
+            self.imports[path] = name
+            saved = self.lines
+            self.lines = []
+            body = self.function_body(expr.program, Scope())
+            self.lines = saved
+            self.module.append("")
+            self.module.append("")
+            self.module.append(f"def {name}():")
+            self.module.append(f"    # {path}")
+            self.module.extend(_indent(body))
+            self.module.append("")
+        return f"{name}()"
+
+    def generate_IfThenElse(self, expr, scope: Scope) -> str:
+        test = self.expression(expr.test, scope)
+        true_lines, true = self.capture(expr.true, scope)
+        false_lines, false = self.capture(expr.false, scope)
+        if not true_lines and not false_lines:
+            return f"({true} if _slang.truth({test}) else {false})"
+        target = self.fresh("_t")
+        self.emit(f"if _slang.truth({test}):")
+        self.lines.extend(_indent(true_lines + [f"{target} = {true}"]))
+        self.emit("else:")
+        self.lines.extend(_indent(false_lines + [f"{target} = {false}"]))
+        return target
+
+    def generate_FunctionDefinition(
+        self, definition, scope: Scope, target=None, name=None
+    ) -> str:
+        if definition.is_builtin:
+            raise CodegenError("Builtin functions can not be translated.")
+        name = name or self.fresh("_f")
+        target = target or self.fresh("_function")
+        inner = FunctionScope(scope)
+        parameters = []
+        for p in definition.parameters:
+            binding = Binding(self.fresh(p.name))
+            inner.declare(p.name, binding)
+            parameters.append(binding.target)
+        arity = len(parameters)
+        inner.declared.setdefault("this", Binding(target, (name, arity)))
+
+        saved = self.lines
+        self.lines = []
+        body = self.function_body(definition.body, inner)
+        self.lines = saved
+
+        names = tuple(p.name for p in definition.parameters)
+        self.emit(f"def {name}({', '.join(parameters)}):")
+        self.lines.extend(_indent(body))
+        self.emit(
+            f"{target} = _slang.Function({name}, {names!r}, {self.position(definition.position)})"
+        )
+        return target
+
+    def generate_Call(self, call, scope: Scope) -> str:
+        arity = len(call.arguments)
+        callee = call.expression
+        static = self.static(callee, scope)
+        if static and isinstance(static[1], terms.FunctionDefinition):
+            definition = static[1]
+            if arity != len(definition.parameters):
+                raise CodegenError(_arity_message(definition, call.position, arity))
+            arguments = self.sequence(call.arguments, scope)
+            function = self.builtin(static[0])
+            return f"_slang.call_builtin({function}, [{', '.join(arguments)}])"
+
+        if isinstance(callee, terms.Variable):
+            binding = scope.find(callee.name, False)
+            if binding is not None and binding.function is not None:
+                name, expected = binding.function
+                if arity != expected:
+                    raise CodegenError(
+                        f"The function called at {call.position} takes {expected} arguments, not {arity}."
+                    )
+                arguments = self.sequence(call.arguments, scope)
+                return f"{name}({', '.join(arguments)})"
+
+        values = self.sequence([callee] + list(call.arguments), scope)
+        return f"_slang.call({values[0]}, [{', '.join(values[1:])}], {self.position(call.position)})"
+
+    def generate_BinaryOperation(self, expr, scope: Scope) -> str:
+        lhs, rhs = self.sequence([expr.lhs, expr.rhs], scope)
+        op = python_operators.get(expr.op)
+        if op is None:
+            return f"_slang.binary({expr.op!r}, {lhs}, {rhs})"
+        return f"({lhs} {op} {rhs})"
+
+    def generate_UnaryOperation(self, expr, scope: Scope) -> str:
+        value = self.expression(expr.expression, scope)
+        if expr.op == "+":
+            return value
+        if expr.op == "-":
+            return f"(-{value})"
+        return f"_slang.unary({expr.op!r}, {value})"
+
+    def generate_Index(self, index, scope: Scope) -> str:
+        lhs, rhs = self.sequence([index.lhs, index.rhs], scope)
+        return f"{lhs}.value[{rhs}.value]"
+
+    def generate_Lookup(self, lookup, scope: Scope) -> str:
+        static = self.static(lookup, scope)
+        if static:
+            return self.builtin(static[0])
+        ns = self.expression(lookup.expression, scope)
+        return f"_slang.member({ns}, {lookup.var.name!r})"
+
+    def generate_Variable(self, var, scope: Scope) -> str:
+        binding = scope.find(var.name, False)
+        if binding is not None:
+            return binding.target
+        if var.name == "builtins":
+            return "_builtins"
+        raise CodegenError(f"No symbol named '{var.name}'.")
+
+    def generate_Namespace(self, ns, scope: Scope) -> str:
+        new = Scope(scope)
+        for definition in ns.definitions:
+            function = None
+            if isinstance(definition.value, terms.FunctionDefinition):
+                function = (self.fresh("_f"), len(definition.value.parameters))
+            new.declare(definition.name, Binding(self.fresh(definition.name), function))
+        members = []
+        for definition in ns.definitions:
+            binding = new.declared[definition.name]
+            if binding.function is not None:
+                new.defined.add(definition.name)
+                self.generate_FunctionDefinition(
+                    definition.value, new, binding.target, binding.function[0]
+                )
+            else:
+                value = self.expression(definition.value, new)
+                self.emit(f"{binding.target} = {value}")
+                binding.static = self.static(definition.value, new)
+                new.defined.add(definition.name)
+            members.append(
+                f"_terms.NamespaceDefinition({definition.name!r}, {binding.target})"
+            )
+        return f"_terms.Namespace([{', '.join(members)}])"
+
+    def generate_Array(self, array, scope: Scope) -> str:
+        items = self.sequence(array.value, scope)
+        return f"_terms.Array([{', '.join(items)}], normalized=True)"
+
+    generate_NumericArray = generate_Array
+
+    def generate_Value(self, value, scope: Scope) -> str:
+        return self.constant(value.value)
+
+
+def _indent(lines: List[str]) -> List[str]:
+    return ["    " + line for line in lines]
+
+
+def _arity_message(definition, position, arity: int) -> str:
+    return f"The function defined at {definition.position} and called at {position} takes {len(definition.parameters)} arguments, not {arity}."
+
+
+def exports(program, path: str) -> List[str]:
+    """
+    The names an import of `program` defines, which have to be known while compiling.
+    """
+    definitions = resolve.exports(program, path)
+    if definitions is None:
+        raise CodegenError(f"Can not determine the names imported from '{path}'.")
+    return [d.name for d in definitions]
+
+
+def generate(program: terms.Expression, path: str = "<string>") -> str:
+    return Generator(path).generate(program)
+
+
+def compile_file(in_path: str, out_path: str) -> None:
+    from .runtime import parse_file, make_default_environment
+
+    program = parse_file(in_path, make_default_environment())
+    source = generate(program, in_path)
+    with open(out_path, "w") as f:
+        f.write(source)
+
+
+# Support for the generated modules.
+
+_environment = None
+_runner = None
+
+
+def environment():
+    global _environment, _runner
+    if _environment is None:
+        from .runtime import make_default_environment
+        from .closures import ClosureRunner
+
+        _environment = make_default_environment()
+        _runner = ClosureRunner()
+    return _environment
+
+
+def builtins() -> terms.Namespace:
+    return environment().find_symbol("builtins")
+
+
+def position(start_line: int, end_line: int) -> Position:
+    return Position(None, start_line, end_line, None, None)
+
+
+class Function(terms.Function):
+    """
+    A slang function translated into the Python function `code`.
+    To everything else it looks like a builtin.
+    """
+
+    def __init__(self, code, parameters: Tuple[str, ...], position=None):
+        terms.Node.__init__(self, position)
+        self.code = code
+        self.parameters = parameters
+        self.environment = None
+        self._definition = None
+
+    @property
+    def definition(self) -> terms.FunctionDefinition:
+        if self._definition is None:
+            code = self.code
+            self._definition = terms.FunctionDefinition(
+                [terms.Parameter(name, None) for name in self.parameters],
+                lambda runner, env, arguments: code(*arguments),
+                builtin=True,
+                position=self.position,
+            )
+        return self._definition
+
+
+def truth(value) -> bool:
+    if value.value is True:
+        return True
+    elif value.value is False:
+        return False
+    raise Exception(f"Expected a bool, not a '{type(value)}'.")
+
+
+def member(ns, name: str):
+    value = ns.lookup(name)
+    if value.is_value():
+        return value
+    return _runner.run(value, environment())
+
+
+def call(function, arguments: List[terms.Expression], position=None):
+    if type(function) is Function:
+        if len(arguments) != len(function.parameters):
+            raise Exception(_arity_message(function, position, len(arguments)))
+        return function.code(*arguments)
+    if not isinstance(function, terms.Function):
+        from .runtime import RuntimeError
+
+        raise RuntimeError(f"Expected a function, not a '{type(function)}'.", position)
+    definition = function.definition
+    if len(arguments) != len(definition.parameters):
+        raise Exception(_arity_message(definition, position, len(arguments)))
+    if definition.is_builtin:
+        return call_builtin(function, arguments)
+    return _runner.invoke(function, arguments)
+
+
+def call_builtin(function: terms.Function, arguments: List[terms.Expression]):
+    env = environment()
+    return _runner.run(function.definition.body(_runner, env, arguments), env)
+
+
+def binary(op: str, lhs, rhs):
+    from .runtime import evaluate_binary_expression
+
+    return evaluate_binary_expression(op, lhs, rhs)
+
+
+def unary(op: str, value):
+    from .runtime import evaluate_unary_expression
+
+    return evaluate_unary_expression(op, value)
+
+
+def main(run) -> None:
+    import sys
+    import simplejson
+
+    simplejson.dump(run(), sys.stdout, for_json=True)
+    sys.stdout.write("\n")
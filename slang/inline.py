@@ -0,0 +1,538 @@
+"""
+Inlines calls of small functions that are known before the program runs.
+
+A call `f(a, b)` of `let f = function(x, y) body` is replaced by
+`{ let x' = a; let y' = b; body' }`, where `body'` is `body` with its own
+bindings renamed to fresh names, so they can not capture the names used in
+the arguments.  Constant and variable arguments are substituted directly
+where that is safe.
+
+A function is only inlined if
+- it does not call itself, neither through `this` nor by its name,
+- its body is no larger than the threshold (counted in nodes),
+- every free variable of its body refers to the same binding at the call as
+  where the function is defined, and that binding is defined at the call.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import resolve
+from .syntax import terms, Position
+
+DEFAULT_THRESHOLD = 16
+
+
+class Binding:
+    def __init__(self, name: str, defined: bool = False):
+        self.name = name
+        self.defined = defined
+        self.known: Optional["Known"] = None
+
+
+class Known:
+    """
+    A function definition, or the members of a namespace literal, bound to a name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        definition: Optional[terms.FunctionDefinition] = None,
+        free: Optional[Dict[str, Optional[Binding]]] = None,
+        members: Optional[Dict[str, "Known"]] = None,
+    ):
+        self.name = name
+        self.definition = definition
+        # The bindings the free variables of the body refer to, `None` for globals.
+        self.free = free
+        self.members = members
+
+
+class Scope:
+    def __init__(self, parent: Optional["Scope"]):
+        self.parent = parent
+        self.bindings: Dict[str, Binding] = {}
+
+    def declare(self, name: str, defined: bool = False) -> Binding:
+        binding = Binding(name, defined)
+        self.bindings[name] = binding
+        return binding
+
+    def lookup(self, name: str) -> Optional[Binding]:
+        scope = self
+        while scope is not None:
+            binding = scope.bindings.get(name)
+            if binding is not None:
+                return binding
+            scope = scope.parent
+        return None
+
+
+class Inlined:
+    """
+    An entry of the report: the function `name` of `size` nodes was inlined at `position`.
+    """
+
+    def __init__(self, name: str, position: Optional[Position], size: int):
+        self.name = name
+        self.position = position
+        self.size = size
+
+    def __str__(self):
+        return f"Inlined '{self.name}' ({self.size} nodes) at {self.position}."
+
+    def __repr__(self):
+        return str(self)
+
+
+def _exported(program) -> Optional[terms.Namespace]:
+    if isinstance(program, terms.Block):
+        return _exported(program.expression)
+    if isinstance(program, terms.Import):
+        return _exported(program.program)
+    if isinstance(program, terms.Namespace):
+        return program
+    return None
+
+
+def _children(term) -> List[terms.Expression]:
+    if isinstance(term, terms.Block):
+        return list(term.statements) + [term.expression]
+    if isinstance(term, terms.Assignment):
+        return [term.expression]
+    if isinstance(term, terms.FunctionDefinition):
+        return [] if term.is_builtin else [term.body]
+    if isinstance(term, terms.Call):
+        return [term.expression] + list(term.arguments)
+    if isinstance(term, terms.IfThenElse):
+        return [term.test, term.true, term.false]
+    if isinstance(term, (terms.BinaryOperation, terms.Index)):
+        return [term.lhs, term.rhs]
+    if isinstance(term, terms.UnaryOperation):
+        return [term.expression]
+    if isinstance(term, terms.Lookup):
+        return [term.expression]
+    if isinstance(term, terms.Namespace):
+        return [d.value for d in term.definitions]
+    if isinstance(term, terms.Array) and not term.normalized:
+        return list(term.value)
+    return []
+
+
+def size(term) -> int:
+    """
+    The number of nodes of `term`.
+    """
+    return 1 + sum(size(child) for child in _children(term))
+
+
+def _contains(term, kind) -> bool:
+    return isinstance(term, kind) or any(
+        _contains(child, kind) for child in _children(term)
+    )
+
+
+def _field_names(term) -> Set[str]:
+    names = set()
+    if isinstance(term, terms.Namespace):
+        names.update(d.name for d in term.definitions)
+    for child in _children(term):
+        names |= _field_names(child)
+    return names
+
+
+def free_variables(term, bound: Set[str] = frozenset()) -> Set[str]:
+    """
+    The names `term` refers to that are not bound in `term`.  Names a block
+    defines later count as free, which may overestimate but never misses one.
+    """
+    if isinstance(term, terms.Variable):
+        return set() if term.name in bound else {term.name}
+    if isinstance(term, (terms.Block, terms.Namespace)):
+        bound = set(bound)
+        free = set()
+        if isinstance(term, terms.Block):
+            pairs = [(s, s) for s in term.statements] + [(term.expression, None)]
+        else:
+            pairs = [(d.value, d) for d in term.definitions]
+        for child, binder in pairs:
+            if isinstance(child, terms.Import):
+                definitions = resolve.exports(child.program, child.path.value) or []
+                bound.update(d.name for d in definitions)
+                continue
+            free |= free_variables(child, bound)
+            if isinstance(binder, (terms.Assignment, terms.NamespaceDefinition)):
+                bound.add(binder.name)
+        return free
+    if isinstance(term, terms.FunctionDefinition):
+        if term.is_builtin:
+            return set()
+        names = {p.name for p in term.parameters} | {"this"}
+        return free_variables(term.body, set(bound) | names)
+    free = set()
+    for child in _children(term):
+        free |= free_variables(child, bound)
+    return free
+
+
+class Inliner:
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.report: List[Inlined] = []
+        self.counter = 0
+        self.imports: Dict[int, Tuple[terms.Expression, Dict[str, Known]]] = {}
+        self.members: Dict[int, Dict[str, Known]] = {}
+
+    def fresh(self, name: str) -> str:
+        self.counter += 1
+        return f"{name}${self.counter}"
+
+    def visit(self, term, scope: Scope):
+        return getattr(self, f"visit_{type(term).__name__}")(term, scope)
+
+    def known(self, name: str, value, scope: Scope) -> Optional[Known]:
+        """
+        What is known about `value`, bound to `name` in `scope`.
+        """
+        if isinstance(value, terms.FunctionDefinition) and not value.is_builtin:
+            free = free_variables(value.body, {p.name for p in value.parameters})
+            if name in free or "this" in free or _contains(value.body, terms.Import):
+                return None
+            return Known(name, value, {n: scope.lookup(n) for n in free})
+        if isinstance(value, terms.Namespace):
+            return Known(name, members=self.members.get(id(value)))
+        if isinstance(value, (terms.Variable, terms.Lookup)):
+            return self.static(value, scope)
+        return None
+
+    def static(self, term, scope: Scope) -> Optional[Known]:
+        if isinstance(term, terms.Variable):
+            binding = scope.lookup(term.name)
+            if binding is not None and binding.defined:
+                return binding.known
+        elif isinstance(term, terms.Lookup):
+            known = self.static(term.expression, scope)
+            if known is not None and known.members is not None:
+                return known.members.get(term.var.name)
+        return None
+
+    def visit_Block(self, block, scope):
+        inner = Scope(scope)
+        bindings: Dict[str, Binding] = {}
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                bindings[statement.name] = inner.declare(statement.name)
+            elif isinstance(statement, terms.Import):
+                definitions = resolve.exports(statement.program, statement.path.value)
+                for d in definitions or []:
+                    bindings[d.name] = inner.declare(d.name)
+
+        statements = []
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                expression = self.visit(statement.expression, inner)
+                binding = bindings[statement.name]
+                binding.known = self.known(statement.name, expression, inner)
+                binding.defined = True
+                statements.append(
+                    terms.Assignment(
+                        statement.name, expression, position=statement.position
+                    )
+                )
+            elif isinstance(statement, terms.Import):
+                program, members = self.visit_import(statement.program)
+                for name, known in members.items():
+                    if name in bindings:
+                        bindings[name].known = known
+                definitions = resolve.exports(program, statement.path.value) or []
+                for d in definitions:
+                    bindings[d.name].defined = True
+                statements.append(
+                    terms.Import(statement.path, program, position=statement.position)
+                )
+            else:
+                statements.append(self.visit(statement, inner))
+        expression = self.visit(block.expression, inner)
+        return terms.Block(statements, expression, position=block.position)
+
+    def visit_import(self, program) -> Tuple[terms.Expression, Dict[str, Known]]:
+        # Imported programs only see the globals.
+        entry = self.imports.get(id(program))
+        if entry is None:
+            result = self.visit(program, Scope(None))
+            exported = _exported(result)
+            members = self.members.get(id(exported), {}) if exported else {}
+            entry = (result, members)
+            self.imports[id(program)] = entry
+        return entry
+
+    def visit_Import(self, expr, scope):
+        program, _ = self.visit_import(expr.program)
+        return terms.Import(expr.path, program, position=expr.position)
+
+    def visit_Bang(self, bang, scope):
+        return bang
+
+    def visit_Namespace(self, ns, scope):
+        inner = Scope(scope)
+        for d in ns.definitions:
+            inner.declare(d.name)
+        definitions = []
+        members: Dict[str, Known] = {}
+        for d in ns.definitions:
+            value = self.visit(d.value, inner)
+            binding = inner.bindings[d.name]
+            binding.known = self.known(d.name, value, inner)
+            binding.defined = True
+            if binding.known is not None:
+                members[d.name] = binding.known
+            else:
+                members.pop(d.name, None)
+            definitions.append(
+                terms.NamespaceDefinition(d.name, value, position=d.position)
+            )
+        result = terms.Namespace(definitions, position=ns.position)
+        self.members[id(result)] = members
+        return result
+
+    def visit_FunctionDefinition(self, definition, scope):
+        if definition.is_builtin:
+            return definition
+        inner = Scope(scope)
+        for p in definition.parameters:
+            inner.declare(p.name, defined=True)
+        inner.declare("this", defined=True)
+        return terms.FunctionDefinition(
+            definition.parameters,
+            self.visit(definition.body, inner),
+            builtin=False,
+            position=definition.position,
+        )
+
+    def visit_Call(self, call, scope):
+        expression = self.visit(call.expression, scope)
+        arguments = [self.visit(arg, scope) for arg in call.arguments]
+        known = self.static(expression, scope)
+        if known is not None and self.can_inline(known, len(arguments), scope):
+            return self.inline(known, arguments, call.position)
+        return terms.Call(expression, arguments, position=call.position)
+
+    def can_inline(self, known: Known, arity: int, scope: Scope) -> bool:
+        definition = known.definition
+        if definition is None or len(definition.parameters) != arity:
+            return False
+        if size(definition.body) > self.threshold:
+            return False
+        for name, binding in known.free.items():
+            if scope.lookup(name) is not binding:
+                return False
+            if binding is not None and not binding.defined:
+                return False
+        return True
+
+    def inline(self, known: Known, arguments, position) -> terms.Expression:
+        definition = known.definition
+        body = definition.body
+        # Arguments substituted into nested functions or namespaces could be captured.
+        nested = _contains(body, terms.FunctionDefinition)
+        fields = _field_names(body)
+
+        mapping: Dict[str, terms.Expression] = {}
+        statements = []
+        for parameter, argument in zip(definition.parameters, arguments):
+            if type(argument) is terms.Value or (
+                isinstance(argument, terms.Array) and argument.normalized
+            ):
+                mapping[parameter.name] = argument
+            elif (
+                isinstance(argument, terms.Variable)
+                and not nested
+                and argument.name not in fields
+                and argument.name != "this"
+            ):
+                mapping[parameter.name] = argument
+            else:
+                name = self.fresh(parameter.name)
+                statements.append(
+                    terms.Assignment(name, argument, position=argument.position)
+                )
+                mapping[parameter.name] = terms.Variable(
+                    name, position=parameter.position
+                )
+
+        self.report.append(Inlined(known.name, position, size(body)))
+        body = self.substitute(body, mapping, mapping)
+        if not statements:
+            return body
+        if isinstance(body, terms.Block):
+            return terms.Block(
+                statements + body.statements, body.expression, position=position
+            )
+        return terms.Block(statements, body, position=position)
+
+    def substitute(self, term, now: Dict, later: Dict):
+        """
+        Replaces the variables in `term` by `now`, or by `later` in nested
+        function bodies, and renames the bindings of blocks and functions.
+        """
+        if isinstance(term, terms.Variable):
+            return now.get(term.name, term)
+        if isinstance(term, terms.Block):
+            renamed = {}
+            for s in term.statements:
+                if isinstance(s, terms.Assignment):
+                    renamed[s.name] = terms.Variable(self.fresh(s.name))
+            later = {**later, **renamed}
+            now = dict(now)
+            statements = []
+            for s in term.statements:
+                if isinstance(s, terms.Assignment):
+                    expression = self.substitute(s.expression, now, later)
+                    now[s.name] = renamed[s.name]
+                    statements.append(
+                        terms.Assignment(
+                            renamed[s.name].name, expression, position=s.position
+                        )
+                    )
+                else:
+                    statements.append(self.substitute(s, now, later))
+            expression = self.substitute(term.expression, now, later)
+            return terms.Block(statements, expression, position=term.position)
+        if isinstance(term, terms.Namespace):
+            names = {d.name for d in term.definitions}
+            later = {k: v for k, v in later.items() if k not in names}
+            now = dict(now)
+            definitions = []
+            for d in term.definitions:
+                value = self.substitute(d.value, now, later)
+                now.pop(d.name, None)
+                definitions.append(
+                    terms.NamespaceDefinition(d.name, value, position=d.position)
+                )
+            return terms.Namespace(definitions, position=term.position)
+        if isinstance(term, terms.FunctionDefinition):
+            if term.is_builtin:
+                return term
+            inner = dict(later)
+            parameters = []
+            for p in term.parameters:
+                name = self.fresh(p.name)
+                inner[p.name] = terms.Variable(name, position=p.position)
+                parameters.append(terms.Parameter(name, p.typ, position=p.position))
+            inner.pop("this", None)
+            body = self.substitute(term.body, inner, inner)
+            return terms.FunctionDefinition(
+                parameters, body, builtin=False, position=term.position
+            )
+        if isinstance(term, terms.Assignment):
+            return terms.Assignment(
+                term.name,
+                self.substitute(term.expression, now, later),
+                position=term.position,
+            )
+        if isinstance(term, terms.Call):
+            return terms.Call(
+                self.substitute(term.expression, now, later),
+                [self.substitute(arg, now, later) for arg in term.arguments],
+                position=term.position,
+            )
+        if isinstance(term, terms.IfThenElse):
+            return terms.IfThenElse(
+                self.substitute(term.test, now, later),
+                self.substitute(term.true, now, later),
+                self.substitute(term.false, now, later),
+                position=term.position,
+            )
+        if isinstance(term, terms.BinaryOperation):
+            return terms.BinaryOperation(
+                term.op,
+                self.substitute(term.lhs, now, later),
+                self.substitute(term.rhs, now, later),
+                position=term.position,
+            )
+        if isinstance(term, terms.UnaryOperation):
+            return terms.UnaryOperation(
+                term.op,
+                self.substitute(term.expression, now, later),
+                position=term.position,
+            )
+        if isinstance(term, terms.Index):
+            return terms.Index(
+                self.substitute(term.lhs, now, later),
+                self.substitute(term.rhs, now, later),
+                position=term.position,
+            )
+        if isinstance(term, terms.Lookup):
+            return terms.Lookup(
+                self.substitute(term.expression, now, later),
+                term.var,
+                position=term.position,
+            )
+        if isinstance(term, terms.Array) and not term.normalized:
+            return terms.Array(
+                [self.substitute(item, now, later) for item in term.value],
+                position=term.position,
+            )
+        return term
+
+    def visit_IfThenElse(self, expr, scope):
+        return terms.IfThenElse(
+            self.visit(expr.test, scope),
+            self.visit(expr.true, scope),
+            self.visit(expr.false, scope),
+            position=expr.position,
+        )
+
+    def visit_BinaryOperation(self, expr, scope):
+        return terms.BinaryOperation(
+            expr.op,
+            self.visit(expr.lhs, scope),
+            self.visit(expr.rhs, scope),
+            position=expr.position,
+        )
+
+    def visit_UnaryOperation(self, expr, scope):
+        return terms.UnaryOperation(
+            expr.op, self.visit(expr.expression, scope), position=expr.position
+        )
+
+    def visit_Index(self, index, scope):
+        return terms.Index(
+            self.visit(index.lhs, scope),
+            self.visit(index.rhs, scope),
+            position=index.position,
+        )
+
+    def visit_Lookup(self, lookup, scope):
+        return terms.Lookup(
+            self.visit(lookup.expression, scope), lookup.var, position=lookup.position
+        )
+
+    def visit_Array(self, array, scope):
+        if array.normalized:
+            return array
+        return terms.Array(
+            [self.visit(item, scope) for item in array.value],
+            position=array.position,
+        )
+
+    visit_NumericArray = visit_Array
+
+    def visit_Variable(self, var, scope):
+        return var
+
+    def visit_Value(self, value, scope):
+        return value
+
+    def visit_Function(self, function, scope):
+        return function
+
+
+def inline(
+    program: terms.Expression, threshold: int = DEFAULT_THRESHOLD
+) -> Tuple[terms.Expression, List[Inlined]]:
+    """
+    Returns `program` with small known functions inlined, and a report of
+    what was inlined where.  `program` itself is not changed.
+    """
+    inliner = Inliner(threshold)
+    return inliner.visit(program, Scope(None)), inliner.report
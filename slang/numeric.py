@@ -0,0 +1,244 @@
+"""
+Arrays of numbers backed by `numpy`, if it is installed.
+
+An array whose items are all ints (or all floats) is kept as a
+`numpy.ndarray` instead of one `terms.Value` per item.  `NumericArray` is an
+`Array`: its `value` is a sequence that hands out `terms.Value`s, so code
+that does not know about it keeps working, while `floor`, `ceil` and the
+elementwise operators work on the whole `ndarray` at once.  Results are the
+same as for ordinary arrays, whatever the length of the array.
+
+Without numpy, `pack` returns ordinary arrays and nothing changes.
+"""
+import math
+import operator
+from typing import Any, Iterator, List, Optional, Sequence
+
+from .syntax import terms, Position
+from .syntax.vector import Vector
+
+try:
+    import numpy
+except ImportError:  # numpy is optional.
+    numpy = None
+
+# Smaller arrays are cheaper to keep as ordinary arrays.
+MIN_SIZE = 64
+
+# The range of ints numpy can hold without wrapping around.
+INT_MIN = -(2**63)
+INT_MAX = 2**63 - 1
+# The ints a float64 holds exactly.
+EXACT_MAX = 2**53
+
+
+class _Values(Sequence):
+    """
+    The items of a `NumericArray` as `terms.Value`s.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Vector(list(self)[index])
+        # `operator.index` keeps numpy from treating bools as masks.
+        return terms.Value(self.data[operator.index(index)].item())
+
+    def __iter__(self) -> Iterator[terms.Value]:
+        return (terms.Value(x) for x in self.data.tolist())
+
+    def __add__(self, other) -> Vector:
+        return Vector(self) + other
+
+    def __eq__(self, other):
+        if isinstance(other, (Sequence, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
+class NumericArray(terms.Array):
+    __slots__ = ("data",)
+
+    def __init__(self, data, position: Optional[Position] = None):
+        """
+        data: a one dimensional `numpy.ndarray` of int64 or float64
+        """
+        terms.Value.__init__(self, _Values(data), position=position)
+        self.data = data
+        self.normalized = True
+        self._hash = None
+
+    def __add__(self, other):
+        if isinstance(other, NumericArray) and other.data.dtype == self.data.dtype:
+            return NumericArray(numpy.concatenate((self.data, other.data)))
+        return super().__add__(other)
+
+    def for_json(self):
+        return self.data.tolist()
+
+
+def _dtype(items: Sequence[Any]):
+    """
+    The numpy type that holds all `items` exactly, if there is one.
+    """
+    kind = type(items[0].value) if type(items[0]) is terms.Value else None
+    if kind is int:
+        for item in items:
+            if (
+                type(item) is not terms.Value
+                or type(item.value) is not int
+                or not INT_MIN <= item.value <= INT_MAX
+            ):
+                return None
+        return numpy.int64
+    if kind is float:
+        for item in items:
+            if type(item) is not terms.Value or type(item.value) is not float:
+                return None
+        return numpy.float64
+    return None
+
+
+def pack(items: List[Any], position: Optional[Position] = None) -> terms.Array:
+    """
+    A normalized array of the values `items`, a `NumericArray` if they are all
+    ints or all floats and numpy is installed.
+    """
+    if numpy is not None and len(items) >= MIN_SIZE:
+        dtype = _dtype(items)
+        if dtype is not None:
+            data = numpy.fromiter((item.value for item in items), dtype, len(items))
+            return NumericArray(data, position=position)
+    return terms.Array(items, position=position, normalized=True)
+
+
+def unpack(array: terms.Array) -> terms.Array:
+    """
+    `array` as an ordinary array.
+    """
+    if isinstance(array, NumericArray):
+        return terms.Array(list(array.value), position=array.position, normalized=True)
+    return array
+
+
+# The numpy versions of the functions of `math` used by the builtins that give
+# the same results.  numpy's `sin`, `tanh`, `log`, ... differ from `math`'s in
+# the last bits for some inputs, so those are applied item by item.
+ufuncs = {}
+if numpy is not None:
+    ufuncs = {
+        math.ceil: numpy.ceil,
+        math.floor: numpy.floor,
+    }
+
+
+def apply(f, array: NumericArray) -> Optional[terms.Array]:
+    """
+    `f`, a function of `math`, applied to every item of `array`, at once if it
+    is one of the keys of `ufuncs`.  Fails where `f` would fail on one of the
+    items.  Returns `None` if the result does not fit into a `NumericArray`.
+    """
+    data = array.data
+    if f not in ufuncs:
+        return pack([terms.Value(f(x)) for x in data.tolist()])
+    # `math.ceil` and `math.floor` return ints.
+    if data.dtype == numpy.int64:
+        return array
+    if numpy.isnan(data).any():
+        raise ValueError("cannot convert float NaN to integer")
+    if numpy.isinf(data).any():
+        raise OverflowError("cannot convert float infinity to integer")
+    result = ufuncs[f](data)
+    if (result < INT_MIN).any() or (result > INT_MAX).any():
+        return None
+    return NumericArray(result.astype(numpy.int64), position=array.position)
+
+
+# The numpy versions of the binary operators, see `vectorized`.
+kernels = {}
+if numpy is not None:
+    kernels = {
+        "+": numpy.add,
+        "-": numpy.subtract,
+        "*": numpy.multiply,
+        "/": numpy.true_divide,
+        "%": numpy.remainder,
+        "==": numpy.equal,
+        "<": numpy.less,
+        ">": numpy.greater,
+        "<=": numpy.less_equal,
+        ">=": numpy.greater_equal,
+    }
+
+
+def _operand(term):
+    if isinstance(term, NumericArray):
+        return term.data
+    if type(term) is terms.Value:
+        if type(term.value) is float:
+            return term.value
+        if type(term.value) is int and INT_MIN <= term.value <= INT_MAX:
+            return term.value
+    return None
+
+
+def _is_int(operand) -> bool:
+    if isinstance(operand, (int, float)):
+        return isinstance(operand, int)
+    return operand.dtype == numpy.int64
+
+
+def _largest(operand) -> int:
+    if isinstance(operand, int):
+        return abs(operand)
+    return max(abs(int(operand.min())), abs(int(operand.max())))
+
+
+def vectorized(op: str, lhs, rhs) -> Optional[terms.Array]:
+    """
+    The elementwise operation `op` on a `NumericArray` and a number or another
+    `NumericArray` of the same length, in one numpy call.  Returns `None` where
+    numpy would not give the same result as Python (overflowing ints, division
+    by zero, ...), so the caller can fall back to computing item by item.
+    """
+    kernel = kernels.get(op)
+    if kernel is None:
+        return None
+    if not isinstance(lhs, NumericArray) and not isinstance(rhs, NumericArray):
+        return None
+    a = _operand(lhs)
+    b = _operand(rhs)
+    if a is None or b is None:
+        return None
+    if not isinstance(a, (int, float)) and not isinstance(b, (int, float)):
+        if len(a) != len(b):
+            return None
+    if op in ("/", "%") and numpy.any(numpy.asarray(b) == 0):
+        return None
+    ints = _is_int(a), _is_int(b)
+    if all(ints):
+        if op in ("+", "-") and _largest(a) + _largest(b) > INT_MAX:
+            return None
+        if op == "*" and _largest(a) * _largest(b) > INT_MAX:
+            return None
+        if op == "/" and max(_largest(a), _largest(b)) > EXACT_MAX:
+            return None
+    elif any(ints):
+        # Python compares ints and floats exactly, numpy converts the ints.
+        int_operand = a if ints[0] else b
+        if _largest(int_operand) > EXACT_MAX:
+            return None
+    with numpy.errstate(all="ignore"):
+        result = kernel(a, b)
+    if result.dtype == numpy.bool_:
+        return terms.Array([terms.Value(x) for x in result.tolist()], normalized=True)
+    return NumericArray(result)
@@ -21,18 +21,18 @@ from tatsu.util import re, generic_main  # noqa
 
 
 KEYWORDS = {
-    "in",
-    "type",
-    "then",
-    "let",
+    "namespace",
+    "if",
     "true",
     "this",
-    "namespace",
+    "else",
+    "then",
     "import",
-    "function",
-    "if",
+    "let",
+    "in",
     "false",
-    "else",
+    "function",
+    "type",
 }  # type: ignore
 
 
@@ -46,7 +46,7 @@ class SLANGBuffer(Buffer):
         eol_comments_re="\\/\\/.*?$",
         ignorecase=None,
         namechars="",
-        **kwargs
+        **kwargs,
     ):
         super().__init__(
             text,
@@ -56,7 +56,7 @@ class SLANGBuffer(Buffer):
             eol_comments_re=eol_comments_re,
             ignorecase=ignorecase,
             namechars=namechars,
-            **kwargs
+            **kwargs,
         )
 
 
@@ -73,7 +73,7 @@ class SLANGParser(Parser):
         keywords=None,
         namechars="",
         tokenizercls=SLANGBuffer,
-        **kwargs
+        **kwargs,
     ):
         if keywords is None:
             keywords = KEYWORDS
@@ -88,7 +88,7 @@ class SLANGParser(Parser):
             keywords=keywords,
             namechars=namechars,
             tokenizercls=tokenizercls,
-            **kwargs
+            **kwargs,
         )
 
     @tatsumasu()
@@ -321,6 +321,46 @@ class SLANGParser(Parser):
     @nomemo
     def _relational_binary_operation_(self):  # noqa
         with self._choice():
+            with self._option():
+                self._relational_expression_()
+                self.name_last_node("lhs")
+                self._token(".==")
+                self.name_last_node("op")
+                self._cut()
+                self._additive_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._relational_expression_()
+                self.name_last_node("lhs")
+                self._token(".<=")
+                self.name_last_node("op")
+                self._cut()
+                self._additive_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._relational_expression_()
+                self.name_last_node("lhs")
+                self._token(".>=")
+                self.name_last_node("op")
+                self._cut()
+                self._additive_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._relational_expression_()
+                self.name_last_node("lhs")
+                self._token(".<")
+                self.name_last_node("op")
+                self._cut()
+                self._additive_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._relational_expression_()
+                self.name_last_node("lhs")
+                self._token(".>")
+                self.name_last_node("op")
+                self._cut()
+                self._additive_expression_()
+                self.name_last_node("rhs")
             with self._option():
                 self._relational_expression_()
                 self.name_last_node("lhs")
@@ -392,6 +432,22 @@ class SLANGParser(Parser):
     @nomemo
     def _additive_binary_operation_(self):  # noqa
         with self._choice():
+            with self._option():
+                self._additive_expression_()
+                self.name_last_node("lhs")
+                self._token(".+")
+                self.name_last_node("op")
+                self._cut()
+                self._multiplicative_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._additive_expression_()
+                self.name_last_node("lhs")
+                self._token(".-")
+                self.name_last_node("op")
+                self._cut()
+                self._multiplicative_expression_()
+                self.name_last_node("rhs")
             with self._option():
                 self._additive_expression_()
                 self.name_last_node("lhs")
@@ -422,6 +478,38 @@ class SLANGParser(Parser):
     @nomemo
     def _multiplicative_binary_operation_(self):  # noqa
         with self._choice():
+            with self._option():
+                self._multiplicative_expression_()
+                self.name_last_node("lhs")
+                self._token("./")
+                self.name_last_node("op")
+                self._cut()
+                self._unary_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._multiplicative_expression_()
+                self.name_last_node("lhs")
+                self._token(".*")
+                self.name_last_node("op")
+                self._cut()
+                self._unary_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._multiplicative_expression_()
+                self.name_last_node("lhs")
+                self._token(".%")
+                self.name_last_node("op")
+                self._cut()
+                self._unary_expression_()
+                self.name_last_node("rhs")
+            with self._option():
+                self._multiplicative_expression_()
+                self.name_last_node("lhs")
+                self._token(".^")
+                self.name_last_node("op")
+                self._cut()
+                self._unary_expression_()
+                self.name_last_node("rhs")
             with self._option():
                 self._multiplicative_expression_()
                 self.name_last_node("lhs")
@@ -595,6 +683,8 @@ class SLANGParser(Parser):
     def _chain_with_call_(self):  # noqa
         self._postfix_expression_()
         self.name_last_node("first")
+        with self._ifnot():
+            self._elementwise_operator_()
         self._token(".")
         self._variable_()
         self.name_last_node("function")
@@ -614,12 +704,18 @@ class SLANGParser(Parser):
     def _chain_without_call_(self):  # noqa
         self._postfix_expression_()
         self.name_last_node("first")
+        with self._ifnot():
+            self._elementwise_operator_()
         self._token(".")
         self._cut()
         self._variable_()
         self.name_last_node("function")
         self._define(["first", "function"], [])
 
+    @tatsumasu()
+    def _elementwise_operator_(self):  # noqa
+        self._pattern("\\.[-+*\\/%^<>=]")
+
     @tatsumasu()
     @nomemo
     def _lookup_(self):  # noqa
@@ -875,6 +971,9 @@ class SLANGSemantics(object):
     def chain_without_call(self, ast):  # noqa
         return ast
 
+    def elementwise_operator(self, ast):  # noqa
+        return ast
+
     def lookup(self, ast):  # noqa
         return ast
 
@@ -0,0 +1,682 @@
+"""
+A hand written parser for the language of `slang.ebnf`, that builds the terms
+directly, without tatsu (see `parse_string(..., parser="pratt")`).
+
+Statements are parsed by recursive descent and the binary operators by
+precedence climbing.  The parser accepts the same programs as the one tatsu
+generates, and gives the terms the same positions: a term starts where its
+rule is entered, which is after the whitespace, unless the rule follows a
+token directly (the parameters of a function, the definitions of a namespace,
+the names after `.` and `::`, the path of an import and the inside of a
+block).  The missing semicolons and expressions are reported like tatsu does,
+the lookahead that finds them included.  Other syntax errors are reported as
+`ErrorId.InvalidSyntax`, where tatsu raises its own exceptions.
+
+Like in a PEG, a failure after a keyword or an opening token can not be
+backtracked from (the `~` of the grammar), except that the left recursive
+rules (the operators and the postfix expressions) stop growing there.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .syntax import terms, Lines, Position
+from .syntax.terms import Environment
+from .syntax.hashcons import HashCons
+from .runtime import ErrorId, ErrorMessage, ParseError, import_program
+
+# The `@@keyword`s of the grammar, which are not identifiers.
+KEYWORDS = frozenset(
+    [
+        "let",
+        "in",
+        "if",
+        "else",
+        "then",
+        "function",
+        "namespace",
+        "import",
+        "true",
+        "false",
+        "type",
+        "this",
+    ]
+)
+
+# The operators of each level of precedence, loosest first, the longest
+# operators before their prefixes.
+LEVELS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    (
+        "relational_binary_operation",
+        (".==", ".<=", ".>=", ".<", ".>", "==", "<=", ">=", "<", ">"),
+    ),
+    ("additive_binary_operation", (".+", ".-", "+", "-")),
+    (
+        "multiplicative_binary_operation",
+        ("./", ".*", ".%", ".^", "/", "*", "%", "^"),
+    ),
+)
+
+# Whitespace, line comments and the comments `parse_string` gives tatsu.
+_SKIP = re.compile(r"(?://.*?$|/\*.*?\*/|\s+)*", re.MULTILINE)
+_IDENTIFIER = re.compile(r"(?!\d)\w+")
+_FLOAT = re.compile(r"[0-9]+\.[0-9]*|\.[0-9]+")
+_HEX = re.compile(r"[0-9a-fA-F]+")
+_DEC = re.compile(r"[0-9]+")
+_STRING = re.compile(r'[^"]*')
+_ELEMENTWISE = re.compile(r"\.[-+*/%^<>=]")
+_ESCAPE = re.compile(r"\w|\S")
+
+
+class _Cut(Exception):
+    """
+    A failure after a cut, which alternatives do not backtrack from.
+    """
+
+    def __init__(self, message: str, offset: int):
+        self.message = message
+        self.offset = offset
+
+
+class _Abort(_Cut):
+    """
+    A program tatsu accepts, but `Semantics` fails on.
+    """
+
+
+class Parser:
+    def __init__(
+        self,
+        env: Environment,
+        source: str,
+        positions: bool = True,
+        sharing: Optional[HashCons] = None,
+    ):
+        """
+        source: the program to parse
+        positions: whether to give the terms positions, the errors always get them
+        sharing: the table to share equal literals, variables and operations through
+        """
+        self.env = env
+        self.text = source
+        self.end = len(source)
+        self.pos = 0
+        self.lines = Lines(source)
+        self.positions = positions
+        self.sharing = sharing
+        self.errors: List[ErrorMessage] = []
+        # What the rules tatsu memoizes parsed, by rule and where they start,
+        # with where they end.  Like tatsu, the parser forgets them at a cut
+        # after them, and reports the errors in them again if it parses them
+        # again.  `results` has the left recursive rules, kept for good.
+        self.memos: Dict[Tuple[str, int], Tuple[object, int]] = {}
+        self.results: Dict[Tuple[int, int], Tuple[Optional[terms.Expression], int]] = {}
+
+    def parse(self) -> terms.Expression:
+        try:
+            self.pos = self.skip(self.pos)
+            program = self.block_region()
+            self.cut()
+            if self.skip(self.pos) != self.end:
+                raise self.fail("Expected the end of the program.")
+        except _Cut as e:
+            if not self.errors:
+                position = Position.from_offsets(
+                    "syntax", e.offset, e.offset, self.lines
+                )
+                self.errors.append(
+                    ErrorMessage(ErrorId.InvalidSyntax, e.message, position)
+                )
+        if self.errors:
+            raise ParseError(self.errors)
+        return program
+
+    # Scanning.
+
+    def skip(self, offset: int) -> int:
+        return _SKIP.match(self.text, offset).end()
+
+    def cut(self) -> None:
+        """
+        Forgets the rules parsed before the position, like tatsu at a `~`.
+        """
+        if self.memos:
+            pos = self.pos
+            self.memos = {k: v for k, v in self.memos.items() if k[1] >= pos}
+
+    def memoized(self, rule: str, parse):
+        """
+        Parses `rule` with `parse`, unless it was parsed here since the last cut.
+        """
+        key = (rule, self.pos)
+        memo = self.memos.get(key)
+        if memo is not None:
+            result, self.pos = memo
+            if isinstance(result, _Cut):
+                raise result
+            return result
+        try:
+            result = parse()
+        except _Abort:
+            raise
+        except _Cut as e:
+            self.memos[key] = (e, key[1])
+            raise
+        self.memos[key] = (result, self.pos)
+        return result
+
+    def fail(self, message: str) -> _Cut:
+        return _Cut(message, self.skip(self.pos))
+
+    def position(self, rule: str, start: int) -> Optional[Position]:
+        if not self.positions:
+            return None
+        return Position.from_offsets(rule, start, self.pos, self.lines)
+
+    def token(self, token: str) -> bool:
+        offset = self.skip(self.pos)
+        if not self.text.startswith(token, offset):
+            return False
+        end = offset + len(token)
+        # A keyword is not the start of a longer name.
+        if token[0].isalpha() and end < self.end and self.text[end].isalnum():
+            return False
+        self.pos = end
+        return True
+
+    def expect(self, token: str) -> None:
+        if not self.token(token):
+            raise self.fail(f"Expected '{token}'.")
+
+    def identifier(self) -> Optional[str]:
+        match = _IDENTIFIER.match(self.text, self.skip(self.pos))
+        if match is None or match.group() in KEYWORDS:
+            return None
+        self.pos = match.end()
+        return match.group()
+
+    # Statements.
+
+    def block_region(self) -> terms.Block:
+        start = self.pos
+        self.pos = self.skip(start)
+        statements = []
+        while True:
+            statement = self.statement()
+            if statement is None:
+                break
+            statements.append(statement)
+        expression = self.expression()
+        if expression is None:
+            self.cut()
+            self.forgot(
+                ErrorId.MissingExpr,
+                "Missing expression.",
+                "forgot_expression",
+                self.at_close,
+            )
+        return terms.Block(
+            statements, expression, position=self.position("block_region", start)
+        )
+
+    def at_close(self) -> bool:
+        offset = self.skip(self.pos)
+        return offset == self.end or self.text.startswith("}", offset)
+
+    def at_next(self) -> bool:
+        return (
+            self.statement() is not None
+            or self.expression() is not None
+            or self.skip(self.pos) == self.end
+        )
+
+    def forgot(self, error_id: int, message: str, rule: str, lookahead) -> None:
+        """
+        Reports a missing semicolon or expression, if `lookahead` finds what
+        follows one.
+        """
+        start = self.pos
+        self.pos = self.skip(start)
+        found = lookahead()
+        end = self.skip(start)
+        if not found:
+            self.pos = start
+            raise self.fail(message)
+        self.pos = end
+        position = Position.from_offsets(rule, start, end, self.lines)
+        self.errors.append(ErrorMessage(error_id, message, position))
+
+    def statement(self) -> Optional[terms.Statement]:
+        return self.memoized("statement", self._statement)
+
+    def _statement(self) -> Optional[terms.Statement]:
+        start = self.pos
+        self.pos = begin = self.skip(start)
+        if self.token("!"):
+            statement = self.bang(begin)
+        elif self.token("import"):
+            statement = self.import_file(begin)
+        elif self.token("let"):
+            statement = self.assignment(begin)
+        else:
+            self.pos = start
+            return None
+        if not self.token(";"):
+            self.cut()
+            self.forgot(
+                ErrorId.MissingSemi,
+                "Missing semicolon.",
+                "forgot_semicolon",
+                self.at_next,
+            )
+        return statement
+
+    def bang(self, start: int) -> terms.Bang:
+        self.cut()
+        expression = self.expression()
+        if expression is None:
+            raise self.fail("Expected an expression after '!'.")
+        return terms.Bang(expression, position=self.position("bang", start))
+
+    def import_file(self, start: int) -> terms.Import:
+        self.cut()
+        path = self.string()
+        if path is None:
+            raise self.fail("Expected the path of the file to import.")
+        position = self.position("import_file", start)
+        program = import_program(
+            path.value,
+            self.env,
+            positions=self.positions,
+            share=self.sharing is not None,
+            parser="pratt",
+        )
+        return terms.Import(path, program, position=position)
+
+    def assignment(self, start: int) -> terms.Assignment:
+        self.cut()
+        name = self.identifier()
+        if name is None:
+            raise self.fail("Expected a name after 'let'.")
+        self.expect("=")
+        expression = self.expression()
+        if expression is None:
+            raise self.fail("Expected an expression after '='.")
+        return terms.Assignment(
+            name, expression, position=self.position("assignment", start)
+        )
+
+    # Expressions.
+
+    def expression(self) -> Optional[terms.Expression]:
+        start = self.pos
+        self.pos = self.skip(start)
+        expression = self.memoized("expression", self.compound)
+        if expression is None:
+            expression = self.binary(0)
+        if expression is None:
+            self.pos = start
+        return expression
+
+    def compound(self) -> Optional[terms.Expression]:
+        """
+        A block, an import, a function or a conditional.
+        """
+        if self.token("{"):
+            self.cut()
+            block = self.block_region()
+            self.expect("}")
+            return block
+        begin = self.pos
+        if self.token("import"):
+            return self.import_file(begin)
+        if self.token("function"):
+            return self.function(begin)
+        if self.token("if"):
+            return self.if_then_else(begin)
+        return None
+
+    def function(self, start: int) -> terms.FunctionDefinition:
+        self.cut()
+        self.expect("(")
+        # Like in `expression_list`, the commas may be left out.
+        parameters = []
+        while True:
+            parameter = self.parameter()
+            if parameter is None:
+                break
+            parameters.append(parameter)
+            while True:
+                before = self.pos
+                if not self.token(","):
+                    break
+                parameter = self.parameter()
+                if parameter is None:
+                    self.pos = before
+                    break
+                parameters.append(parameter)
+        self.expect(")")
+        body = self.expression()
+        if body is None:
+            raise self.fail("Expected the body of the function.")
+        return terms.FunctionDefinition(
+            parameters, body, builtin=False, position=self.position("function", start)
+        )
+
+    def parameter(self) -> Optional[terms.Parameter]:
+        # The parameters start right after the '(' or ','.
+        start = self.pos
+        name = self.identifier()
+        if name is None:
+            return None
+        return terms.Parameter(name, None, position=self.position("parameter", start))
+
+    def if_then_else(self, start: int) -> terms.IfThenElse:
+        self.cut()
+        test = self.expression()
+        if test is None:
+            raise self.fail("Expected a condition after 'if'.")
+        self.expect("then")
+        true = self.expression()
+        if true is None:
+            raise self.fail("Expected an expression after 'then'.")
+        self.expect("else")
+        false = self.expression()
+        if false is None:
+            raise self.fail("Expected an expression after 'else'.")
+        return terms.IfThenElse(
+            test, true, false, position=self.position("if_then_else", start)
+        )
+
+    def binary(self, level: int) -> Optional[terms.Expression]:
+        """
+        The operations of `LEVELS[level]` and tighter, left associative.
+        """
+        if level == len(LEVELS):
+            return self.unary()
+        start = self.pos = self.skip(self.pos)
+        result = self.results.get((level, start))
+        if result is not None:
+            self.pos = result[1]
+            return result[0]
+        lhs = self.grow(level, start)
+        self.results[level, start] = (lhs, self.pos)
+        return lhs
+
+    def grow(self, level: int, start: int) -> Optional[terms.Expression]:
+        rule, operators = LEVELS[level]
+        try:
+            lhs = self.binary(level + 1)
+        except _Abort:
+            raise
+        except _Cut:
+            # The rules of the operators are left recursive in the grammar,
+            # and tatsu backtracks over the cuts in their first alternative.
+            lhs = None
+        if lhs is None:
+            self.pos = start
+            return None
+        while True:
+            before = self.pos
+            offset = self.skip(before)
+            for op in operators:
+                if self.text.startswith(op, offset):
+                    break
+            else:
+                break
+            self.pos = offset + len(op)
+            try:
+                rhs = self.binary(level + 1)
+            except _Abort:
+                raise
+            except _Cut:
+                rhs = None
+            if rhs is None:
+                # Left recursion stops growing where it fails.
+                self.pos = before
+                break
+            position = self.position(rule, start)
+            if self.sharing is not None:
+                lhs = self.sharing.binary(op, lhs, rhs, position=position)
+            else:
+                lhs = terms.BinaryOperation(op, lhs, rhs, position=position)
+        return lhs
+
+    def unary(self) -> Optional[terms.Expression]:
+        start = self.pos = self.skip(self.pos)
+        op = self.text[start : start + 1]
+        if op not in ("+", "-"):
+            return self.postfix()
+        self.pos = start + 1
+        self.cut()
+        inner = self.unary()
+        if inner is None:
+            raise self.fail(f"Expected an expression after '{op}'.")
+        position = self.position("unary_operation", start)
+        if self.sharing is not None:
+            return self.sharing.unary(op, inner, position=position)
+        return terms.UnaryOperation(op, inner, position=position)
+
+    def postfix(self) -> Optional[terms.Expression]:
+        start = self.pos = self.skip(self.pos)
+        key = (len(LEVELS), start)
+        result = self.results.get(key)
+        if result is not None:
+            self.pos = result[1]
+            return result[0]
+        try:
+            term = self.memoized("primary", self.primary)
+        except _Abort:
+            raise
+        except _Cut:
+            term = None
+        if term is not None:
+            term = self.suffixes(term, start)
+        else:
+            self.pos = start
+        self.results[key] = (term, self.pos)
+        return term
+
+    def suffixes(self, term, start: int) -> terms.Expression:
+        while True:
+            before = self.pos
+            try:
+                longer = self.suffix(term, start)
+            except _Abort:
+                raise
+            except _Cut:
+                self.pos = before
+                return term
+            if longer is None:
+                # Where tatsu stops growing the expression, it parses the
+                # primary expression again, and again reports the errors in
+                # it if a cut made it forget it.
+                self.pos = start
+                self.memoized("primary", self.primary)
+                self.pos = before
+                return term
+            term = longer
+
+    def suffix(self, term, start: int) -> Optional[terms.Expression]:
+        """
+        A chained call, a lookup, an index or a call of `term`.
+        """
+        text = self.text
+        offset = self.skip(self.pos)
+        if text.startswith(".", offset) and not _ELEMENTWISE.match(text, offset):
+            self.pos = offset + 1
+            function = self.variable()
+            if function is not None and self.token("("):
+                self.cut()
+                arguments = [term] + self.expression_list()
+                self.expect(")")
+                position = self.position("chain_with_call", start)
+                return terms.Call(function, arguments, position=position)
+            self.pos = offset + 1
+            self.cut()
+            if self.variable() is None:
+                raise self.fail("Expected the name of a function after '.'.")
+            raise _Abort("Expected the arguments of the chained call.", self.pos)
+        if text.startswith("::", offset):
+            self.pos = offset + 2
+            self.cut()
+            var = self.variable()
+            if var is None:
+                raise self.fail("Expected a name after '::'.")
+            return terms.Lookup(term, var, position=self.position("lookup", start))
+        if text.startswith("[", offset):
+            self.pos = offset + 1
+            rhs = self.expression()
+            if rhs is None or not self.token("]"):
+                return None
+            return terms.Index(term, rhs, position=self.position("index", start))
+        if text.startswith("(", offset):
+            self.pos = offset + 1
+            self.cut()
+            arguments = self.expression_list()
+            self.expect(")")
+            position = self.position("function_call", start)
+            return terms.Call(term, arguments, position=position)
+        return None
+
+    def expression_list(self) -> List[terms.Expression]:
+        # The commas between the expressions may be left out.
+        expressions = []
+        while True:
+            expression = self.expression()
+            if expression is None:
+                return expressions
+            expressions.append(expression)
+            while True:
+                before = self.pos
+                if not self.token(","):
+                    break
+                expression = self.expression()
+                if expression is None:
+                    self.pos = before
+                    break
+                expressions.append(expression)
+
+    def primary(self) -> Optional[terms.Expression]:
+        start = self.pos
+        variable = self.variable()
+        if variable is not None:
+            return variable
+        literal = self.literal()
+        if literal is not None:
+            return literal
+        if self.token("("):
+            expression = self.expression()
+            if expression is not None and self.token(")"):
+                return expression
+        self.pos = start
+        return None
+
+    def variable(self) -> Optional[terms.Expression]:
+        start = self.pos
+        if self.token("this"):
+            name = "this"
+        else:
+            name = self.identifier()
+            if name is None:
+                return None
+        position = self.position("variable", start)
+        if self.sharing is not None:
+            return self.sharing.variable(name, position=position)
+        return terms.Variable(name, position=position)
+
+    def value(self, value, rule: str, start: int) -> terms.Value:
+        position = self.position(rule, start)
+        if self.sharing is not None:
+            return self.sharing.value(value, position=position)
+        return terms.Value(value, position=position)
+
+    def literal(self) -> Optional[terms.Expression]:
+        start = self.pos
+        text = self.text
+        if self.token("true"):
+            return self.value(True, "bool", start)
+        if self.token("false"):
+            return self.value(False, "bool", start)
+        match = _FLOAT.match(text, start)
+        if match is not None:
+            self.pos = match.end()
+            return self.value(float(match.group()), "float", start)
+        if text.startswith("0x", start):
+            match = _HEX.match(text, start + 2)
+            if match is not None:
+                self.pos = match.end()
+                return self.value(int(match.group(), 16), "hex", start)
+        match = _DEC.match(text, start)
+        if match is not None:
+            self.pos = match.end()
+            return self.value(int(match.group()), "dec", start)
+        if text.startswith('"', start):
+            return self.string()
+        if self.token("["):
+            items = self.expression_list()
+            if not self.token("]"):
+                self.pos = start
+                return None
+            position = self.position("array", start)
+            if self.sharing is not None:
+                return self.sharing.array(items, position=position)
+            return terms.Array(items, position=position)
+        if self.token("namespace"):
+            return self.namespace(start)
+        return None
+
+    def string(self) -> Optional[terms.Value]:
+        start = self.pos
+        if not self.token('"'):
+            return None
+        inside = self.pos
+        # tatsu tries an escape sequence first, after whitespace, which
+        # `Semantics` can not join.
+        escape = self.skip(inside)
+        if self.text.startswith("\\", escape) and _ESCAPE.match(self.text, escape + 1):
+            raise _Abort("Escape sequences are not supported.", escape)
+        match = _STRING.match(self.text, inside)
+        self.pos = match.end()
+        if not self.token('"'):
+            self.pos = start
+            return None
+        return self.value(match.group(), "string", start)
+
+    def namespace(self, start: int) -> terms.Namespace:
+        self.cut()
+        self.expect("{")
+        definitions = []
+        while True:
+            # The definitions start right after the '{' or ';'.
+            begin = self.pos
+            name = self.identifier()
+            if name is None or not self.token("="):
+                self.pos = begin
+                break
+            self.cut()
+            value = self.expression()
+            if value is None:
+                raise self.fail("Expected an expression after '='.")
+            self.expect(";")
+            definitions.append(
+                terms.NamespaceDefinition(
+                    name, value, position=self.position("definition", begin)
+                )
+            )
+        self.expect("}")
+        if not definitions:
+            raise _Abort("Expected a definition in the namespace.", self.pos)
+        return terms.Namespace(definitions, position=self.position("namespace", start))
+
+
+def parse(
+    source: str,
+    env: Environment,
+    positions: bool = True,
+    sharing: Optional[HashCons] = None,
+) -> terms.Expression:
+    """
+    Parses `source` like `runtime.Semantics` over the tatsu parser.
+    Raises a `ParseError` listing the errors.
+    """
+    return Parser(env, source, positions=positions, sharing=sharing).parse()
@@ -0,0 +1,381 @@
+"""
+Resolves variables to the frame slots that hold their values.
+
+Every block with statements, every namespace and every call gets a frame
+with one slot per name it defines.  The resolver replaces each reference to
+such a name by a `terms.Bound` holding the number of frames to go up and
+the slot to read, so the runners never look up local variables by name.
+Only the globals of the environment a program runs in are still looked up
+by name.
+
+While at it, the resolver reports names that are not bound anywhere and
+calls of known functions with the wrong number of arguments.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+from .syntax import terms
+from .syntax.terms import Environment
+from .runtime import ErrorId, ErrorMessage, ParseError
+
+# The depth, the slot, the known definition and whether the slot is filled.
+Found = Tuple[int, int, Optional[terms.Expression], bool]
+
+
+class Scope:
+    """
+    The names of a frame.  A name is visible from its definition on.  Function
+    bodies run later, so they see every name of the scopes around them.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.slots: Dict[str, int] = {}
+        self.defined: Set[str] = set()
+        # Statically known definitions, to check the arity of calls.
+        self.known: Dict[str, terms.Expression] = {}
+
+    def declare(self, name: str, known=None) -> Optional[int]:
+        if name in self.slots:
+            return None
+        self.slots[name] = len(self.slots)
+        if known is not None:
+            self.known[name] = known
+        return self.slots[name]
+
+    def find(self, name: str, deferred: bool = False) -> Optional[Found]:
+        """
+        Returns the depth and slot of `name`, its known definition and whether
+        its slot is filled at this point of the program, or `None` for globals.
+        """
+        if name in self.slots and (deferred or name in self.defined):
+            return 0, self.slots[name], self.known.get(name), name in self.defined
+        return _up(self.parent, name, deferred)
+
+
+class FunctionScope(Scope):
+    """
+    The frame of a call: the parameters, followed by `this`.  The function may
+    also refer to itself by the name it is defined under.
+    """
+
+    def __init__(self, parent: "CaptureScope", name: Optional[str]):
+        super().__init__(parent)
+        self.name = name
+
+    def find(self, name: str, deferred: bool = False) -> Optional[Found]:
+        if name in self.slots:
+            return 0, self.slots[name], self.known.get(name), True
+        if name == self.name:
+            return 0, self.slots["this"], self.known.get("this"), True
+        return _up(self.parent, name, True)
+
+
+class CaptureScope:
+    """
+    The frame a function value keeps: copies of the values of the enclosing
+    scopes the function refers to, so it does not keep the rest of them alive.
+
+    Names that are not defined yet when the function is created (mutually
+    recursive functions) can not be copied.  Such a function is `linked`: its
+    captured frame keeps the frame it was defined in as parent.
+    """
+
+    def __init__(self, parent: Optional[Scope]):
+        self.parent = parent
+        self.slots: Dict[str, int] = {}
+        self.known: Dict[str, terms.Expression] = {}
+        # Where the captured values come from, relative to the defining frame.
+        self.sources: List[Tuple[int, int]] = []
+        self.linked = False
+
+    def find(self, name: str, deferred: bool = True) -> Optional[Found]:
+        if name in self.slots:
+            return 0, self.slots[name], self.known.get(name), True
+        found = self.parent.find(name, deferred) if self.parent else None
+        if found is None:
+            return None
+        depth, index, known, ready = found
+        if not ready:
+            self.linked = True
+            return depth + 1, index, known, False
+        self.slots[name] = len(self.sources)
+        self.sources.append((depth, index))
+        if known is not None:
+            self.known[name] = known
+        return 0, self.slots[name], known, True
+
+
+def _up(scope, name: str, deferred: bool) -> Optional[Found]:
+    if scope is None:
+        return None
+    found = scope.find(name, deferred)
+    if found is None:
+        return None
+    depth, index, known, ready = found
+    return depth + 1, index, known, ready
+
+
+def exports(program, path: str) -> Optional[List[terms.NamespaceDefinition]]:
+    """
+    The definitions of the namespace `program` evaluates to, if it is a literal.
+    """
+    if isinstance(program, terms.Block):
+        return exports(program.expression, path)
+    if isinstance(program, terms.Import):
+        return exports(program.program, path)
+    if isinstance(program, terms.Namespace):
+        return program.definitions
+    return None
+
+
+def _known(term):
+    if isinstance(term, (terms.FunctionDefinition, terms.Namespace)):
+        return term
+    return None
+
+
+class Resolver:
+    def __init__(self, env: Environment):
+        self.env = env
+        self.errors = []
+        self.imports: Dict[int, terms.Expression] = {}
+
+    def error(self, error_id: int, message: str, position) -> None:
+        self.errors.append(ErrorMessage(error_id, message, position))
+
+    def resolve(self, term, scope: Optional[Scope]):
+        return getattr(self, f"resolve_{type(term).__name__}")(term, scope)
+
+    def static(self, term, scope: Optional[Scope]):
+        """
+        The definition `term` refers to if it is known before running the program.
+        """
+        if isinstance(term, terms.FunctionDefinition):
+            return term
+        if isinstance(term, terms.Variable):
+            found = scope.find(term.name) if scope else None
+            if found:
+                return found[2]
+            return _known(self.env.find_symbol(term.name, None))
+        if isinstance(term, terms.Lookup):
+            ns = self.static(term.expression, scope)
+            if isinstance(ns, terms.Namespace):
+                for d in reversed(ns.definitions):
+                    if d.name == term.var.name:
+                        return _known(d.value)
+        return None
+
+    def declare(self, scope: Scope, name: str, known, position) -> int:
+        index = scope.declare(name, _known(known))
+        if index is None:
+            self.error(
+                ErrorId.Redefinition,
+                f"This env already defines a value named '{name}'.",
+                position,
+            )
+            return scope.slots[name]
+        return index
+
+    def resolve_Block(self, block, scope):
+        if not block.statements:
+            expression = self.resolve(block.expression, scope)
+            return terms.Block([], expression, position=block.position)
+
+        new = Scope(scope)
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                self.declare(
+                    new, statement.name, statement.expression, statement.position
+                )
+            elif isinstance(statement, terms.Import):
+                for d in self.exports(statement):
+                    self.declare(new, d.name, d.value, statement.position)
+
+        statements = []
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                expression = self.resolve_named(
+                    statement.name, statement.expression, new
+                )
+                new.defined.add(statement.name)
+                statements.append(
+                    terms.Assignment(
+                        statement.name,
+                        expression,
+                        position=statement.position,
+                        index=new.slots[statement.name],
+                    )
+                )
+            elif isinstance(statement, terms.Import):
+                program = self.resolve_import(statement.program)
+                slots = []
+                for d in self.exports(statement):
+                    new.defined.add(d.name)
+                    slots.append((d.name, new.slots[d.name]))
+                statements.append(
+                    terms.Import(
+                        statement.path,
+                        program,
+                        position=statement.position,
+                        slots=slots,
+                    )
+                )
+            else:
+                statements.append(self.resolve(statement, new))
+
+        expression = self.resolve(block.expression, new)
+        return terms.Block(
+            statements, expression, position=block.position, size=len(new.slots)
+        )
+
+    def exports(self, statement) -> List[terms.NamespaceDefinition]:
+        definitions = exports(statement.program, statement.path.value)
+        if definitions is None:
+            self.error(
+                ErrorId.UnknownImport,
+                f"Can not determine the names imported from '{statement.path.value}'.",
+                statement.position,
+            )
+            return []
+        return definitions
+
+    def resolve_import(self, program):
+        # Imported programs run in the environment of the program, not in the scope of the import.
+        resolved = self.imports.get(id(program))
+        if resolved is None:
+            resolved = self.resolve(program, None)
+            self.imports[id(program)] = resolved
+        return resolved
+
+    def resolve_Import(self, expr, scope):
+        program = self.resolve_import(expr.program)
+        return terms.Import(expr.path, program, position=expr.position)
+
+    def resolve_Bang(self, bang, scope):
+        return terms.Bang(self.resolve(bang.expression, scope), position=bang.position)
+
+    def resolve_Namespace(self, ns, scope):
+        new = Scope(scope)
+        for d in ns.definitions:
+            self.declare(new, d.name, d.value, d.position)
+        definitions = []
+        for d in ns.definitions:
+            value = self.resolve_named(d.name, d.value, new)
+            new.defined.add(d.name)
+            definitions.append(
+                terms.NamespaceDefinition(d.name, value, position=d.position)
+            )
+        return terms.Namespace(definitions, position=ns.position)
+
+    def resolve_named(self, name: str, expression, scope):
+        if isinstance(expression, terms.FunctionDefinition):
+            return self.resolve_FunctionDefinition(expression, scope, name)
+        return self.resolve(expression, scope)
+
+    def resolve_FunctionDefinition(self, definition, scope, name=None):
+        if definition.is_builtin:
+            return definition
+        captured = CaptureScope(scope)
+        new = FunctionScope(captured, name)
+        for p in definition.parameters:
+            self.declare(new, p.name, None, p.position)
+        new.declare("this", definition)
+        body = self.resolve(definition.body, new)
+        return terms.FunctionDefinition(
+            definition.parameters,
+            body,
+            builtin=False,
+            position=definition.position,
+            captures=captured.sources,
+            linked=captured.linked,
+        )
+
+    def resolve_Call(self, call, scope):
+        definition = self.static(call.expression, scope)
+        if isinstance(definition, terms.FunctionDefinition) and len(
+            definition.parameters
+        ) != len(call.arguments):
+            self.error(
+                ErrorId.WrongArity,
+                f"The function defined at {definition.position} and called at {call.position} takes {len(definition.parameters)} arguments, not {len(call.arguments)}.",
+                call.position,
+            )
+        expression = self.resolve(call.expression, scope)
+        arguments = [self.resolve(arg, scope) for arg in call.arguments]
+        return terms.Call(expression, arguments, position=call.position)
+
+    def resolve_Variable(self, var, scope):
+        found = scope.find(var.name) if scope else None
+        if found:
+            depth, index, _, _ = found
+            return terms.Bound(var.name, depth, index, position=var.position)
+        if self.env.find_symbol(var.name, None) is None:
+            self.error(
+                ErrorId.UnboundName, f"No symbol named '{var.name}'.", var.position
+            )
+        return var
+
+    def resolve_Bound(self, bound, scope):
+        return bound
+
+    def resolve_IfThenElse(self, expr, scope):
+        return terms.IfThenElse(
+            self.resolve(expr.test, scope),
+            self.resolve(expr.true, scope),
+            self.resolve(expr.false, scope),
+            position=expr.position,
+        )
+
+    def resolve_BinaryOperation(self, expr, scope):
+        lhs = self.resolve(expr.lhs, scope)
+        rhs = self.resolve(expr.rhs, scope)
+        # Unchanged operations are kept, so terms shared by the parser stay shared.
+        if lhs is expr.lhs and rhs is expr.rhs:
+            return expr
+        return terms.BinaryOperation(expr.op, lhs, rhs, position=expr.position)
+
+    def resolve_UnaryOperation(self, expr, scope):
+        expression = self.resolve(expr.expression, scope)
+        if expression is expr.expression:
+            return expr
+        return terms.UnaryOperation(expr.op, expression, position=expr.position)
+
+    def resolve_Index(self, index, scope):
+        return terms.Index(
+            self.resolve(index.lhs, scope),
+            self.resolve(index.rhs, scope),
+            position=index.position,
+        )
+
+    def resolve_Lookup(self, lookup, scope):
+        return terms.Lookup(
+            self.resolve(lookup.expression, scope), lookup.var, position=lookup.position
+        )
+
+    def resolve_Array(self, array, scope):
+        if array.normalized:
+            return array
+        items = [self.resolve(item, scope) for item in array.value]
+        if all(new is old for new, old in zip(items, array.value)):
+            return array
+        return terms.Array(items, position=array.position)
+
+    resolve_NumericArray = resolve_Array
+
+    def resolve_Value(self, value, scope):
+        return value
+
+    def resolve_Function(self, function, scope):
+        return function
+
+
+def resolve(program: terms.Expression, env: Environment) -> terms.Expression:
+    """
+    Returns `program` with its variables resolved to frame slots.
+    Raises a `ParseError` listing the unbound names and wrong calls.
+    """
+    resolver = Resolver(env)
+    result = resolver.resolve(program, None)
+    if resolver.errors:
+        raise ParseError(resolver.errors)
+    return result
@@ -1,27 +1,38 @@
 import os
 import sys
 import math
+import operator
 import logging
-from typing import Union, Dict, List, Any
-
-import tatsu
-import tatsu.model
+from collections import OrderedDict
+from typing import Union, Callable, Dict, List, Any, FrozenSet, Optional, Set, Tuple
 
 # from . import ext
-from .syntax import types, terms, Position
-from .syntax.terms import Environment
-
-# generated by tatsu from slang.ebnf:
-from .parser import SLANGParser
+from .syntax import types, terms, Lines, Position
+from .syntax.terms import Environment, binary_operators, unary_operators
+from .syntax.hashcons import HashCons
+from . import numeric
 
 logging.basicConfig(level=logging.INFO)
 
-parser_cache: Dict[str, terms.Expression] = {}
+# The sources and programs of imported files, by path, whether they have
+# positions, whether their terms are shared and the parser.
+parser_cache: Dict[Tuple[str, bool, bool, str], Tuple[str, terms.Expression]] = {}
+
+# The last programs `run_program` resolved and specialized, by the ids of the
+# program and the environment and whether it specialized, next to them so the
+# ids are not reused while they are kept.
+PREPARED_SIZE = 32
+prepared_cache: "OrderedDict[Tuple[int, int, bool], Tuple[Any, ...]]" = OrderedDict()
 
-# WIP: Not used, part of the type system.
+# The types of the results of the operators on basic types, see `typecheck.py`.
 binary_operator_type_map = {
     ("+", types.Int, types.Int): types.Int,
+    ("+", types.Int, types.Float): types.Float,
+    ("+", types.Float, types.Float): types.Float,
+    ("+", types.String, types.String): types.String,
     ("-", types.Int, types.Int): types.Int,
+    ("-", types.Int, types.Float): types.Float,
+    ("-", types.Float, types.Float): types.Float,
     ("*", types.Int, types.Int): types.Int,
     ("*", types.Int, types.Float): types.Float,
     ("*", types.Float, types.Float): types.Float,
@@ -29,57 +40,95 @@ binary_operator_type_map = {
     ("^", types.Int, types.Float): types.Float,
     ("^", types.Float, types.Float): types.Float,
     ("%", types.Int, types.Int): types.Int,
+    ("%", types.Int, types.Float): types.Float,
+    ("%", types.Float, types.Float): types.Float,
     ("/", types.Int, types.Int): types.Float,
     ("/", types.Int, types.Float): types.Float,
     ("/", types.Float, types.Float): types.Float,
 }
 
+binary_operator_type_map.update(
+    {
+        (op, lhs, rhs): types.Bool
+        for op in ("==", "<", ">", "<=", ">=")
+        for lhs, rhs in (
+            (types.Int, types.Int),
+            (types.Int, types.Float),
+            (types.Float, types.Float),
+            (types.String, types.String),
+        )
+    }
+)
+binary_operator_type_map[("==", types.Bool, types.Bool)] = types.Bool
+
 binary_operator_type_map.update(
     {(k[0], k[2], k[1]): v for k, v in binary_operator_type_map.items()}
 )
 
 
 def evaluate_unary_expression(op: str, value: terms.Value):
-    if op == "+":
-        return value
-    elif op == "-":
-        return -value
+    function = unary_operators.get(op)
+    if function is not None:
+        return function(value)
     # elif op == "~":
     #   return ~value
-    elif op == "!":
+    if op == "!":
         return not value
     raise RuntimeError(f"Unknown unary operator `{op}`.", None)
 
 
+def evaluate_elementwise_expression(op: str, lhs: terms.Value, rhs: terms.Value):
+    """
+    `op` (without its leading '.') applied to the items of two arrays of the
+    same length pairwise.  An operand that is not an array is paired with every
+    item of the other one.  Items that are arrays themselves are combined
+    elementwise too.
+    """
+    result = numeric.vectorized(op, lhs, rhs)
+    if result is not None:
+        return result
+    lhs_is_array = isinstance(lhs, terms.Array)
+    rhs_is_array = isinstance(rhs, terms.Array)
+    if lhs_is_array and rhs_is_array:
+        if len(lhs.value) != len(rhs.value):
+            raise RuntimeError(
+                f"The operator '.{op}' needs arrays of the same length, not {len(lhs.value)} and {len(rhs.value)}.",
+                None,
+            )
+        pairs = zip(lhs.value, rhs.value)
+    elif lhs_is_array:
+        pairs = ((item, rhs) for item in lhs.value)
+    elif rhs_is_array:
+        pairs = ((lhs, item) for item in rhs.value)
+    else:
+        raise RuntimeError(f"The operator '.{op}' needs an array operand.", None)
+    items = []
+    for x, y in pairs:
+        if isinstance(x, terms.Array) or isinstance(y, terms.Array):
+            items.append(evaluate_elementwise_expression(op, x, y))
+        else:
+            items.append(evaluate_binary_expression(op, x, y))
+    return numeric.pack(items)
+
+
 def evaluate_binary_expression(op: str, lhs: terms.Value, rhs: terms.Value):
-    if op == "+":
-        return lhs + rhs
-    elif op == "-":
-        return lhs - rhs
-    elif op == "*":
-        return lhs * rhs
-    elif op == "/":
-        return lhs / rhs
-    elif op == "^":
-        return lhs ** rhs
-    elif op == "%":
-        return lhs % rhs
-    elif op == "==":
-        return lhs == rhs
-    elif op == "<":
-        return lhs < rhs
-    elif op == ">":
-        return lhs > rhs
-    elif op == "<=":
-        return lhs <= rhs
-    elif op == ">=":
-        return lhs >= rhs
+    function = binary_operators.get(op)
+    if function is not None:
+        return function(lhs, rhs)
+    if op[0] == ".":
+        return evaluate_elementwise_expression(op[1:], lhs, rhs)
     raise RuntimeError(f"Unknown binary operator `{op}`.", None)
 
 
 class ErrorId:
     MissingSemi = 1
     MissingExpr = 2
+    UnboundName = 3
+    WrongArity = 4
+    Redefinition = 5
+    UnknownImport = 6
+    TypeMismatch = 7
+    InvalidSyntax = 8
 
 
 class BinaryOperationNotDefined(Exception):
@@ -139,34 +188,183 @@ class ErrorMessage:
         print(message, file=sys.stderr)
 
 
-class Runner(tatsu.model.NodeWalker):
-    def run(self, program, env: Environment):
+class TailCall:
+    """
+    An expression in tail position, returned by `Runner.walk_*` instead of being
+    run recursively.  `Runner.run` evaluates it in its own loop, so tail calls
+    do not grow the Python stack.
+    """
+
+    __slots__ = ("expression", "env")
+
+    def __init__(self, expression, env: Environment):
+        self.expression = expression
+        self.env = env
+
+    def is_value(self) -> bool:
+        return False
+
+
+class Thunk:
+    """
+    An argument passed by need: it is evaluated in the environment of the call
+    when the callee first needs it, and the value is kept for later uses.
+    """
+
+    __slots__ = ("expression", "env", "value")
+
+    def __init__(self, expression, env: Environment):
+        self.expression = expression
+        self.env = env
+        self.value = None
+
+    def is_value(self) -> bool:
+        return False
+
+
+def _strict(term, depth: int, parameters: FrozenSet[int], this: int) -> Set[int]:
+    """
+    The parameters evaluating `term` always evaluates, given the ones `this`
+    evaluates.  `depth` is the number of frames between `term` and the call frame.
+    """
+    if isinstance(term, terms.Bound):
+        if term.depth == depth and term.index < this:
+            return {term.index}
+        return set()
+    if isinstance(term, terms.Block):
+        if term.statements:
+            depth += 1
+        result = _strict(term.expression, depth, parameters, this)
+        for statement in term.statements:
+            if isinstance(statement, terms.Assignment):
+                result |= _strict(statement.expression, depth, parameters, this)
+        return result
+    if isinstance(term, terms.Namespace):
+        result = set()
+        for d in term.definitions:
+            result |= _strict(d.value, depth + 1, parameters, this)
+        return result
+    if isinstance(term, terms.IfThenElse):
+        return _strict(term.test, depth, parameters, this) | (
+            _strict(term.true, depth, parameters, this)
+            & _strict(term.false, depth, parameters, this)
+        )
+    if isinstance(term, (terms.BinaryOperation, terms.Index)):
+        return _strict(term.lhs, depth, parameters, this) | _strict(
+            term.rhs, depth, parameters, this
+        )
+    if isinstance(term, (terms.UnaryOperation, terms.Lookup)):
+        return _strict(term.expression, depth, parameters, this)
+    if isinstance(term, terms.Array) and not term.normalized:
+        result = set()
+        for item in term.value:
+            result |= _strict(item, depth, parameters, this)
+        return result
+    if isinstance(term, terms.Call):
+        result = _strict(term.expression, depth, parameters, this)
+        callee = term.expression
+        if (
+            isinstance(callee, terms.Bound)
+            and callee.depth == depth
+            and callee.index == this
+        ):
+            # A recursive call evaluates the arguments of its strict parameters.
+            for index in parameters:
+                result |= _strict(term.arguments[index], depth, parameters, this)
+        return result
+    return set()
+
+
+def strict_parameters(definition: terms.FunctionDefinition) -> FrozenSet[int]:
+    """
+    The indices of the parameters `definition` evaluates on every call (a
+    conservative guess).  Passing their arguments by need would only delay
+    the work, so they are passed by value, which keeps accumulators of tail
+    recursive functions from growing into long chains of thunks.
+
+    Starts by assuming every parameter is strict and drops those some path
+    through the body does not evaluate, until the set does not change.
+    """
+    this = len(definition.parameters)
+    parameters = frozenset(range(this))
+    while True:
+        found = frozenset(_strict(definition.body, 0, parameters, this)) & parameters
+        if found == parameters:
+            return parameters
+        parameters = found
+
+
+class Runner:
+    """
+    lazy: whether to pass arguments by need (see `Thunk`) instead of by value
+    """
+
+    def __init__(self, lazy: bool = False):
+        self.lazy = lazy
+        # The strict parameters of the functions called so far, by definition.
+        self.strictness: Dict[int, FrozenSet[int]] = {}
+        # The `walk_*` method for each type of node, see `walk`.
+        self.walkers: Dict[type, Callable] = {}
+
+    def walk(self, node, env: Environment):
+        walker = self.walkers.get(type(node))
+        if walker is None:
+            walker = self._find_walker(type(node))
+        return walker(node, env)
+
+    def _find_walker(self, cls: type) -> Callable:
+        # Subclasses (e.g. `numeric.NumericArray`) use the walker of their base.
+        for base in cls.__mro__:
+            walker = getattr(self, f"walk_{base.__name__}", None)
+            if walker is not None:
+                self.walkers[cls] = walker
+                return walker
+        raise TypeError(f"Can not evaluate a '{cls.__name__}'.")
+
+    def evaluate(self, program, env: Environment):
         program = self.walk(program, env)
         while not program.is_value():
+            if isinstance(program, TailCall):
+                env = program.env
+                program = program.expression
             program = self.walk(program, env)
-        if isinstance(program, terms.Array):
+        # Arrays handed in by builtins may still hold expressions.
+        if isinstance(program, terms.Array) and not program.normalized:
             program = self.walk(program, env)
         return program
 
+    # What builtins and `run_program` call, `evaluate` is what the walkers call.
+    run = evaluate
+
     def walk_IfThenElse(self, expr, env: Environment):
-        test = self.run(expr.test, env)
+        test = self.evaluate(expr.test, env)
         if test.value is True:
-            return self.run(expr.true, env)
+            return TailCall(expr.true, env)
         elif test.value is False:
-            return self.run(expr.false, env)
+            return TailCall(expr.false, env)
         raise Exception(f"Expected a bool, not a '{type(test)}'.")
 
+    def walk_TypedIfThenElse(self, expr, env: Environment):
+        if self.evaluate(expr.test, env).value:
+            return TailCall(expr.true, env)
+        return TailCall(expr.false, env)
+
     def walk_Block(self, block, env: Environment):
-        new = env.push()
+        if not block.statements:
+            return TailCall(block.expression, env)
+        new = terms.Frame(env, [None] * block.size)
         for statement in block.statements:
             if isinstance(statement, terms.Import):
-                ns = self.run(statement, new)
+                ns = self.evaluate(statement, new)
                 assert isinstance(ns, terms.Namespace)
-                for d in ns.definitions:
-                    new.add_symbol(d.name, d.value)
+                self.bind_imports(statement, ns, new)
             else:
-                self.run(statement, new)
-        return self.run(block.expression, new)
+                self.evaluate(statement, new)
+        return TailCall(block.expression, new)
+
+    def bind_imports(self, statement, ns: terms.Namespace, frame: terms.Frame):
+        for name, index in statement.slots:
+            frame.slots[index] = ns.lookup(name)
 
     def walk_Bang(self, bang, env: Environment):
         # typ = str(self.checker.judge(bang.expression, env))
@@ -174,39 +372,40 @@ class Runner(tatsu.model.NodeWalker):
         print("!")  # expr, ":", typ, file=sys.stderr)
 
     def walk_Import(self, expr, env: Environment):
-        return expr.program
-
-    def walk_Assignment(self, stmt, env: Environment):
-        value = self.run(stmt.expression, env)
-        env.add_symbol(stmt.name, value)
+        # Imported programs only see the globals.
+        if isinstance(env, terms.Frame):
+            env = env.get_environment()
+        return TailCall(expr.program, env)
+
+    def walk_Assignment(self, stmt, env: terms.Frame):
+        value = self.evaluate(stmt.expression, env)
+        env.slots[stmt.index] = value
         return value
 
     def walk_Function(self, function, env: Environment):
         return function
 
     def walk_FunctionDefinition(self, definition, env: Environment):
-        return terms.Function(definition, env)
+        return terms.Function(definition, terms.capture(definition, env))
 
     def walk_Array(self, array, env: Environment):
-        return terms.Array(
-            [self.run(item, env) for item in array.value],
-            position=array.position,
-        )
+        if array.normalized:
+            return array
+        items = [self.evaluate(item, env) for item in array.value]
+        return numeric.pack(items, position=array.position)
 
     def walk_Namespace(self, ns, env: Environment):
-        new = env.push()
-        definitions = []
-        for definition in ns.definitions:
-            value = self.run(definition.value, new)
-            new.add_symbol(definition.name, value)
-            definitions.append(terms.NamespaceDefinition(definition.name, value))
-        return terms.Namespace(definitions)
+        new = terms.Frame(env, [None] * len(ns.definitions))
+        for index, definition in enumerate(ns.definitions):
+            new.slots[index] = self.evaluate(definition.value, new)
+        # The slots are not changed anymore, the record keeps them.
+        return terms.Namespace.record(ns.shape, new.slots)
 
     def walk_NamespaceDefinition(self, definition, env: Environment):
         return definition
 
     def walk_Call(self, call, env: Environment):
-        expression = self.run(call.expression, env)
+        expression = self.evaluate(call.expression, env)
         if not isinstance(expression, terms.Function):
             raise RuntimeError(
                 f"Expected a function, not a '{type(expression)}'.", call.position
@@ -216,123 +415,242 @@ class Runner(tatsu.model.NodeWalker):
             raise Exception(
                 f"The function defined at {expression.definition.position} and called at {call.position} takes {len(expression.definition.parameters)} arguments, not {len(call.arguments)}."
             )
-        arguments = [self.run(arg, env) for arg in call.arguments]
+        if self.lazy:
+            arguments = self.delay(expression.definition, call.arguments, env)
+        else:
+            arguments = [self.evaluate(arg, env) for arg in call.arguments]
         if expression.definition.is_builtin:
-            return self.run(expression.definition.body(self, env, arguments), env)
+            return self.apply_builtin(expression.definition, arguments, env)
 
-        pairs = zip([p.name for p in expression.definition.parameters], arguments)
-        symbols = {name: value for name, value in pairs}
-        symbols["this"] = expression
-        return self.run(
-            expression.definition.body, Environment(expression.environment, symbols)
+        # The parameters, followed by `this`.
+        arguments.append(expression)
+        return TailCall(
+            expression.definition.body, terms.Frame(expression.environment, arguments)
         )
 
+    def call(self, function: terms.Function, arguments: List[Any], env: Environment):
+        """
+        Calls `function` with `arguments`, for builtins that take functions.
+        """
+        definition = function.definition
+        if definition.is_builtin:
+            return self.apply_builtin(definition, list(arguments), env)
+        # The parameters, followed by `this`.
+        frame = terms.Frame(function.environment, list(arguments) + [function])
+        return self.evaluate(definition.body, frame)
+
+    def walk_UncheckedCall(self, call, env: Environment):
+        arguments = [self.evaluate(arg, env) for arg in call.arguments]
+        return self.apply_builtin(call.definition.unchecked, arguments, env)
+
+    def apply_builtin(self, definition, arguments: List[Any], env: Environment):
+        return self.evaluate(definition.body(self, env, arguments), env)
+
+    def delay(self, definition, arguments, env: Environment) -> List[Any]:
+        """
+        The arguments of a call by need: values for the strict parameters and
+        for arguments that are cheap to evaluate, thunks for the others.
+        Builtins get thunks and run only the arguments they need.
+        """
+        strict = frozenset()
+        if not definition.is_builtin:
+            strict = self.strictness.get(id(definition))
+            if strict is None:
+                strict = strict_parameters(definition)
+                self.strictness[id(definition)] = strict
+        result = []
+        for index, arg in enumerate(arguments):
+            if (
+                index in strict
+                or type(arg) is terms.Value
+                or isinstance(arg, terms.Variable)
+            ):
+                result.append(self.evaluate(arg, env))
+            elif isinstance(arg, terms.Array) and arg.normalized:
+                result.append(arg)
+            elif isinstance(arg, terms.Bound):
+                # Passes on the value or the thunk in the slot as is.
+                frame = env
+                for _ in range(arg.depth):
+                    frame = frame.parent
+                value = frame.slots[arg.index]
+                result.append(value if value is not None else Thunk(arg, env))
+            else:
+                result.append(Thunk(arg, env))
+        return result
+
+    def force(self, thunk: Thunk):
+        if thunk.value is None:
+            thunk.value = self.evaluate(thunk.expression, thunk.env)
+            # The environment is not needed anymore.
+            thunk.expression = thunk.env = None
+        return thunk.value
+
+    def walk_Thunk(self, thunk, env: Environment):
+        return self.force(thunk)
+
     def walk_BinaryOperation(self, expr, env: Environment):
-        lhs = self.run(expr.lhs, env)
-        rhs = self.run(expr.rhs, env)
-        return evaluate_binary_expression(expr.op, lhs, rhs)
+        lhs = self.evaluate(expr.lhs, env)
+        rhs = self.evaluate(expr.rhs, env)
+        if expr.function is None:
+            return evaluate_binary_expression(expr.op, lhs, rhs)
+        return expr.function(lhs, rhs)
+
+    def walk_NumericOperation(self, expr, env: Environment):
+        lhs = self.evaluate(expr.lhs, env)
+        rhs = self.evaluate(expr.rhs, env)
+        return terms.box(expr.function(lhs.value, rhs.value))
 
     def walk_UnaryOperation(self, expr, env: Environment):
-        new = self.run(expr.expression, env)
-        return evaluate_unary_expression(expr.op, new)
+        new = self.evaluate(expr.expression, env)
+        if expr.function is None:
+            return evaluate_unary_expression(expr.op, new)
+        return expr.function(new)
 
     def walk_Index(self, index, env: Environment):
-        lhs = self.run(index.lhs, env)
-        rhs = self.run(index.rhs, env)
+        lhs = self.evaluate(index.lhs, env)
+        rhs = self.evaluate(index.rhs, env)
         value = lhs.value[rhs.value]
-        return self.run(value, env)
+        if isinstance(lhs, terms.Array) and lhs.normalized:
+            return value
+        return self.evaluate(value, env)
 
     def walk_Lookup(self, lookup, env: Environment):
-        ns = self.run(lookup.expression, env)
-        result = ns.lookup(lookup.var.name)
-        return self.run(result, env)
+        ns = self.evaluate(lookup.expression, env)
+        return self.evaluate(ns.lookup_at(lookup), env)
 
     def walk_Variable(self, var, env: Environment):
-        return self.run(env.find_symbol(var.name), env)
+        # Only globals are left as variables by the resolver.
+        return self.evaluate(env.find_symbol(var.name), env)
+
+    def walk_Bound(self, bound, env: terms.Frame):
+        for _ in range(bound.depth):
+            env = env.parent
+        value = env.slots[bound.index]
+        if value is None:
+            raise RuntimeError(
+                f"'{bound.name}' is used before it is defined.", bound.position
+            )
+        if type(value) is Thunk:
+            value = self.force(value)
+            env.slots[bound.index] = value
+        return value
 
     def walk_Value(self, value, env: Environment):
         return value
 
 
+def _list(items):
+    # tatsu returns lists of its own, that would tie the terms to tatsu.
+    return None if items is None else list(items)
+
+
 class Semantics:
-    def __init__(self, env):
+    def __init__(
+        self,
+        env,
+        source: str = "",
+        positions: bool = True,
+        sharing: Optional[HashCons] = None,
+    ):
+        """
+        source: the program being parsed, to look up the lines of positions in
+        positions: whether to give the terms positions, the errors always get them
+        sharing: the table to share equal literals, variables and operations through
+        """
         self.env = env
         self.errors = []
         self.universe = types.Universe()
+        self.lines = Lines(source)
+        self.positions = positions
+        self.sharing = sharing
+
+    def position(self, ast) -> Optional[Position]:
+        if not self.positions:
+            return None
+        return self.error_position(ast)
+
+    def error_position(self, ast) -> Position:
+        info = ast.parseinfo
+        return Position.from_offsets(info.rule, info.pos, info.endpos, self.lines)
 
     def block_region(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Block(ast.statements, ast.expression, position=position)
+        position = self.position(ast)
+        return terms.Block(_list(ast.statements), ast.expression, position=position)
 
     def bang(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.Bang(ast.expression, position=position)
 
     def function(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.FunctionDefinition(
-            ast.parameters, ast.body, builtin=False, position=position
+            _list(ast.parameters), ast.body, builtin=False, position=position
         )
 
     def parameter(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.Parameter(ast.name, None, position=position)
 
     def namespace(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Namespace(ast.definitions, position=position)
+        position = self.position(ast)
+        return terms.Namespace(_list(ast.definitions), position=position)
 
     def import_file(self, ast):
-        global parser_cache
-        position = Position.from_parseinfo(ast.parseinfo)
-
-        if ast.path.value in parser_cache:
-            return terms.Import(
-                ast.path, parser_cache[ast.path.value], position=position
-            )
-        program = parse_file(ast.path.value, self.env)
-        parser_cache[ast.path.value] = program
+        position = self.position(ast)
+        program = import_program(
+            ast.path.value,
+            self.env,
+            positions=self.positions,
+            share=self.sharing is not None,
+        )
         return terms.Import(ast.path, program, position=position)
 
     def assignment(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.Assignment(ast.name, ast.expression, position=position)
 
     def definition(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.NamespaceDefinition(ast.name, ast.value, position=position)
 
     def function_call(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Call(ast.function, ast.arguments, position=position)
+        position = self.position(ast)
+        return terms.Call(ast.function, _list(ast.arguments), position=position)
 
-    def relational_binary_operation(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+    def binary_operation(self, ast):
+        position = self.position(ast)
+        if self.sharing is not None:
+            return self.sharing.binary(ast.op, ast.lhs, ast.rhs, position=position)
         return terms.BinaryOperation(ast.op, ast.lhs, ast.rhs, position=position)
 
+    def relational_binary_operation(self, ast):
+        return self.binary_operation(ast)
+
     def additive_binary_operation(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.BinaryOperation(ast.op, ast.lhs, ast.rhs, position=position)
+        return self.binary_operation(ast)
 
     def multiplicative_binary_operation(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.BinaryOperation(ast.op, ast.lhs, ast.rhs, position=position)
+        return self.binary_operation(ast)
 
     def unary_operation(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
+        if self.sharing is not None:
+            return self.sharing.unary(ast.op, ast.inner, position=position)
         return terms.UnaryOperation(ast.op, ast.inner, position=position)
 
     def lookup(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.Lookup(ast.lhs, ast.rhs, position=position)
 
     def chain_with_call(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Call(ast.function, [ast.first] + ast.arguments, position=position)
+        position = self.position(ast)
+        arguments = [ast.first] + list(ast.arguments)
+        return terms.Call(ast.function, arguments, position=position)
 
     def chain_without_call(self, ast):
         # return terms.Chain(ast.function, ast.first, position=position)
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         arguments = [ast.first] + [
             terms.Variable(p.name) for p in ast.function.parameters
         ]
@@ -344,116 +662,71 @@ class Semantics:
         )
 
     def if_then_else(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.IfThenElse(ast.test, ast.true, ast.false, position=position)
 
     def variable(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
+        if self.sharing is not None:
+            return self.sharing.variable(ast.name, position=position)
         return terms.Variable(ast.name, position=position)
 
+    def value(self, value, position: Optional[Position]) -> terms.Value:
+        if self.sharing is not None:
+            return self.sharing.value(value, position=position)
+        return terms.Value(value, position=position)
+
     def bool(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Value(ast.value == "true", position=position)
+        position = self.position(ast)
+        return self.value(ast.value == "true", position)
 
     def dec(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Value(int(ast.value), position=position)
+        position = self.position(ast)
+        return self.value(int(ast.value), position)
 
     def hex(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Value(int(ast.value, 16), position=position)
+        position = self.position(ast)
+        return self.value(int(ast.value, 16), position)
 
     def float(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Value(float(ast.value), position=position)
+        position = self.position(ast)
+        return self.value(float(ast.value), position)
 
     def string(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
-        return terms.Value("".join(ast.value), position=position)
+        position = self.position(ast)
+        return self.value("".join(ast.value), position)
 
     def array(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         value = list(ast.value)
+        if self.sharing is not None:
+            return self.sharing.array(value, position=position)
         return terms.Array(value, position=position)
 
     def index(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.position(ast)
         return terms.Index(ast.lhs, ast.rhs, position=position)
 
     def forgot_semicolon(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.error_position(ast)
         self.errors.append(
             ErrorMessage(ErrorId.MissingSemi, "Missing semicolon.", position)
         )
         return None
 
     def forgot_expression(self, ast):
-        position = Position.from_parseinfo(ast.parseinfo)
+        position = self.error_position(ast)
         self.errors.append(
             ErrorMessage(ErrorId.MissingExpr, "Missing expression.", position)
         )
         return None
 
 
-class TypeChecker:
-    def __init__(self, universe):
-        self.universe = universe
-
-    def judge(self, term, env):
-        if isinstance(term, terms.Function):
-            return self._judge_function(term, env)
-        if term.is_value():
-            if isinstance(term, terms.Array):
-                return self._judge_array_value(term, env)
-            else:
-                return self._judge_atomic_value(term)
-        if isinstance(term, terms.IfThenElse):
-            test = self.judge(term.test, env)
-            if not self.universe.is_subtype(test, types.Bool):
-                return None
-            true = self.judge(term.true, env)
-            false = self.judge(term.false, env)
-            return self.universe.make_union(true, false)
-        if isinstance(term, terms.BinaryOperation):
-            return self._judge_binary_operation(term, env)
-        return types.Any
-
-    def _judge_function(self, term, env):
-        body = self.judge(term.body, env)
-        parameters = [p.typ if p.typ else types.Any for p in term.parameters]
-        return types.Function(parameters, body)
-
-    def _judge_binary_operation(self, term, env):
-        lhs = self.judge(term.lhs, env)
-        rhs = self.judge(term.rhs, env)
-        return binary_operator_type_map.get((term.op, lhs, rhs))
-
-    def _judge_array_value(self, term, env):
-        general = types.Void
-        for e in term.value:
-            t = self.judge(e, env)
-            if not t:
-                return types.Any
-            if self.universe.is_subtype(t, general):
-                continue
-            if self.universe.is_subtype(general, t):
-                general = t
-            general = self.universe.make_union(t, general)
-        return types.Array(general)
-
-    def _judge_atomic_value(self, term):
-        if isinstance(term.value, bool):
-            return types.Bool
-        if isinstance(term.value, str):
-            return types.String
-        if isinstance(term.value, int):
-            return types.Int
-        if isinstance(term.value, float):
-            return types.Float
-        raise Exception(f"No atomic value for term '{term}'.")
-
-
 def make_parser():
+    # Generated by tatsu from slang.ebnf.  Imported here, so running programs
+    # that are already parsed does not need tatsu.
+    from .parser import SLANGParser
+
     parser = SLANGParser()
     # For development, you can uncomment this to use `caddy.ebnf` directly.
     # parser = None
@@ -462,40 +735,182 @@ def make_parser():
     return parser
 
 
-def run_file(path: str, env: Environment):
+def make_runner(engine: str = "runner", lazy: bool = False):
+    """
+    engine: the execution engine to evaluate programs with
+        "runner": the tree walking `Runner`
+        "unboxed": the `Runner` on plain Python ints, floats, bools and strings, see `unboxed.py`
+        "closure": compiles the program into nested closures first, see `closures.py`
+        "bytecode": compiles the program into bytecode for a stack machine, see `bytecode.py`
+    lazy: whether to pass arguments by need, only the "runner" and "unboxed" support it
+    """
+    if lazy and engine not in ("runner", "unboxed"):
+        raise ValueError(f"The engine '{engine}' passes arguments by value only.")
+    if engine == "runner":
+        return Runner(lazy=lazy)
+    if engine == "unboxed":
+        from .unboxed import UnboxedRunner
+
+        return UnboxedRunner(lazy=lazy)
+    if engine == "closure":
+        from .closures import ClosureRunner
+
+        return ClosureRunner()
+    if engine == "bytecode":
+        from .bytecode import VirtualMachine
+
+        return VirtualMachine()
+    raise ValueError(f"Unknown engine '{engine}'.")
+
+
+def run_file(
+    path: str,
+    env: Environment,
+    engine: str = "runner",
+    simplify: bool = True,
+    cache: bool = False,
+):
+    """
+    simplify: whether to simplify the program before running it, see `simplify.py`
+    cache: whether to keep the simplified program in `__slangcache__` next to
+        the file, and load it from there while the file does not change, see
+        `astcache.py`; off by default, as it writes next to the file
+    """
     path = os.path.join(os.getcwd(), path)
-    program = parse_file(path, env)
-    return run_program(program, env)
+    if simplify and cache:
+        from .astcache import load_file
+
+        program = load_file(path, env)
+    else:
+        program = parse_file(path, env)
+        if simplify:
+            from .simplify import simplify as simplify_program
+
+            program = simplify_program(program, lazy=env.lazy)
+    return run_program(program, env, engine=engine)
 
 
-def run_string(string: str, env: Environment):
+def run_string(
+    string: str, env: Environment, engine: str = "runner", simplify: bool = True
+):
+    """
+    simplify: whether to simplify the program before running it, see `simplify.py`
+    """
     program = parse_string(string, env)
-    return run_program(program, env)
+    if simplify:
+        from .simplify import simplify as simplify_program
+
+        program = simplify_program(program, lazy=env.lazy)
+    return run_program(program, env, engine=engine)
 
 
-def run_program(program: terms.Expression, env: Environment) -> terms.Value:
+def run_program(
+    program: terms.Expression,
+    env: Environment,
+    engine: str = "runner",
+    specialize: bool = True,
+) -> terms.Value:
+    """
+    specialize: whether to use the fast paths the types of the program allow, see `typecheck.py`
+
+    The resolved and specialized program is kept for the last `PREPARED_SIZE`
+    programs, so running the same program again does not infer its types again.
+    """
+    key = (id(program), id(env), specialize)
+    entry = prepared_cache.get(key)
+    if entry is None:
+        from .resolve import resolve
+
+        prepared = resolve(program, env)
+        if specialize:
+            from .typecheck import specialize as specialize_program
+
+            prepared = specialize_program(prepared, env)
+        entry = (program, env, prepared)
+        prepared_cache[key] = entry
+        if len(prepared_cache) > PREPARED_SIZE:
+            prepared_cache.popitem(last=False)
+    else:
+        prepared_cache.move_to_end(key)
+    program = entry[2]
+    runner = make_runner(engine, lazy=env.lazy)
     try:
-        return Runner().run(program, env)
+        return runner.run(program, env)
     except RuntimeError as e:
         e.print()
         raise
 
 
-def parse_file(path, env: Environment):
+def parse_file(
+    path,
+    env: Environment,
+    positions: bool = True,
+    share: bool = False,
+    parser: str = "tatsu",
+):
     path = os.path.join(os.getcwd(), path)
     with open(path, "r") as fd:
         string = fd.read()
-        return parse_string(string, env)
+        return parse_string(
+            string, env, positions=positions, share=share, parser=parser
+        )
 
 
-def parse_string(string: str, env: Environment) -> terms.Expression:
+def import_program(
+    path: str,
+    env: Environment,
+    positions: bool = True,
+    share: bool = False,
+    parser: str = "tatsu",
+) -> terms.Expression:
+    """
+    The program at `path`, parsed again only if the file changed since it was
+    last imported.
+    """
+    global parser_cache
+    with open(os.path.join(os.getcwd(), path), "r") as fd:
+        string = fd.read()
+    key = (path, positions, share, parser)
+    cached = parser_cache.get(key)
+    if cached is not None and cached[0] == string:
+        return cached[1]
+    program = parse_string(
+        string, env, positions=positions, share=share, parser=parser
+    )
+    parser_cache[key] = (string, program)
+    return program
+
+
+def parse_string(
+    string: str,
+    env: Environment,
+    positions: bool = True,
+    share: bool = False,
+    parser: str = "tatsu",
+) -> terms.Expression:
     """
     string: the program to parse
+    positions: whether to keep where in `string` the terms are, for error
+        messages.  Programs without positions take less memory.
+    share: whether to build equal literals, constant arrays, variables and
+        operations only once, see `syntax/hashcons.py`; only without
+        `positions`, as a shared term can not say where each of its
+        occurrences is
+    parser: "tatsu", the parser generated from `slang.ebnf`, or "pratt", the
+        faster hand written one in `pratt.py`, which gives the same terms;
+        its other syntax errors are `ErrorId.InvalidSyntax` errors
     kwargs:
         use_defaults=True: whether to include the extensions in `ext.py`
     """
+    sharing = HashCons() if share and not positions else None
+    if parser == "pratt":
+        from . import pratt
+
+        return pratt.parse(string, env, positions=positions, sharing=sharing)
+    if parser != "tatsu":
+        raise ValueError(f"unknown parser: {parser}")
     parser = make_parser()
-    semantics = Semantics(env)
+    semantics = Semantics(env, string, positions=positions, sharing=sharing)
     try:
         result = parser.parse(
             string,
@@ -514,15 +929,52 @@ def parse_string(string: str, env: Environment) -> terms.Expression:
         raise
 
 
+class Memo:
+    """
+    The body of a function made by `builtins::memo`.  Calls `function` and keeps
+    the results for the last `size` different arguments, compared by structure
+    (see `terms.structural_key`); the least recently used result is evicted first.
+    """
+
+    def __init__(self, function: terms.Function, size: int):
+        self.function = function
+        self.size = size
+        self.cache: "OrderedDict[Any, terms.Expression]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, runner, env: Environment, arguments: List[terms.Expression]):
+        values = [runner.run(argument, env) for argument in arguments]
+        key = tuple(terms.structural_key(value) for value in values)
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return result
+        self.misses += 1
+        result = runner.call(self.function, values, env)
+        self.cache[key] = result
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+        return result
+
+
 def make_empty_env():
     return Environment(None)
 
 
-def make_default_environment(update=None):
+def make_default_environment(update=None, lazy: bool = False):
+    """
+    lazy: whether programs run in the environment pass arguments by need
+    """
+
     def _echo(runner: Runner, env: Environment, arguments: List[terms.Expression]):
         assert len(arguments) == 1
-        print(arguments[0].value)
-        return arguments[0]
+        value = runner.run(arguments[0], env)
+        print(value.value)
+        return value
 
     def _length(runner: Runner, env: Environment, arguments: List[terms.Expression]):
         assert len(arguments) == 1
@@ -534,17 +986,81 @@ def make_default_environment(update=None):
             )
         return terms.Value(len(array.value))
 
-    def _make_math_unary(f):
-        def _func(runner, env, arguments):
-            assert len(arguments) == 1
-            number = runner.run(arguments[0], env)
+    def _memo(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        function = runner.run(arguments[0], env)
+        size = runner.run(arguments[1], env)
+        if not isinstance(function, terms.Function):
+            raise RuntimeError(
+                f"Expected a function but found '{type(function)}'.",
+                function.position,
+            )
+        if type(size.value) is not int or size.value < 1:
+            raise RuntimeError(
+                f"Expected a positive cache size but found '{size.value}'.",
+                size.position,
+            )
+        definition = function.definition
+        return terms.Function(
+            terms.FunctionDefinition(
+                definition.parameters,
+                Memo(function, size.value),
+                builtin=True,
+                position=definition.position,
+            ),
+            env,
+        )
+
+    def _memo_info(
+        runner: Runner, env: Environment, arguments: List[terms.Expression]
+    ):
+        assert len(arguments) == 1
+        function = runner.run(arguments[0], env)
+        memo = None
+        if isinstance(function, terms.Function):
+            memo = function.definition.body
+        if not isinstance(memo, Memo):
+            raise RuntimeError("Expected a function made by 'memo'.", function.position)
+        return _make_namespace(
+            {
+                "hits": memo.hits,
+                "misses": memo.misses,
+                "evictions": memo.evictions,
+                "size": len(memo.cache),
+            }
+        )
+
+    def _make_math_unary(f, result: types.Type = types.Float):
+        def _apply(number):
             assert isinstance(number, terms.Value) and isinstance(
                 number.value, (int, float)
             ), "Expected number."
             return terms.Value(f(number.value))
 
+        def _func(runner, env, arguments):
+            assert len(arguments) == 1
+            number = runner.run(arguments[0], env)
+            # Arrays of numbers are mapped over, see `numeric.apply`.
+            if isinstance(number, numeric.NumericArray):
+                result = numeric.apply(f, number)
+                if result is not None:
+                    return result
+            if isinstance(number, terms.Array):
+                return numeric.pack([_apply(item) for item in number.value])
+            return _apply(number)
+
+        # For calls the type checker proved to pass a number.
+        def _unchecked(runner, env, arguments):
+            return terms.Value(f(arguments[0].value))
+
         return terms.FunctionDefinition(
-            [terms.Parameter("x", None)], _func, builtin=True
+            [terms.Parameter("x", None)],
+            _func,
+            builtin=True,
+            typ=types.Function([types.Number], result),
+            unchecked=terms.FunctionDefinition(
+                [terms.Parameter("x", None)], _unchecked, builtin=True
+            ),
         )
 
     builtins = {
@@ -554,8 +1070,8 @@ def make_default_environment(update=None):
             "length": terms.FunctionDefinition(
                 [terms.Parameter("array", None)], _length, builtin=True
             ),
-            "ceil": _make_math_unary(math.ceil),
-            "floor": _make_math_unary(math.floor),
+            "ceil": _make_math_unary(math.ceil, types.Int),
+            "floor": _make_math_unary(math.floor, types.Int),
             "sin": _make_math_unary(math.sin),
             "cos": _make_math_unary(math.cos),
             "tan": _make_math_unary(math.tan),
@@ -563,16 +1079,131 @@ def make_default_environment(update=None):
             "cosh": _make_math_unary(math.cosh),
             "tanh": _make_math_unary(math.tanh),
             "ln": _make_math_unary(math.log),
+            "memo": terms.FunctionDefinition(
+                [terms.Parameter("function", None), terms.Parameter("size", None)],
+                _memo,
+                builtin=True,
+            ),
+            "memo_info": terms.FunctionDefinition(
+                [terms.Parameter("function", None)], _memo_info, builtin=True
+            ),
             "nslib": _make_nslib(),
         }
+    builtins.update(_make_collections())
     if update:
         builtins.update(update)
 
-    env = Environment(None)
+    env = Environment(None, lazy=lazy)
     env.add_symbol("builtins", _make_namespace(builtins))
     return env
 
 
+def _make_collections() -> Dict[str, terms.FunctionDefinition]:
+    """
+    The combinators of the prelude, as loops in Python that only call back
+    into the runner for the function passed to them.
+    """
+
+    def _array(runner, env: Environment, argument) -> terms.Array:
+        array = runner.run(argument, env)
+        if not isinstance(array, terms.Array):
+            raise RuntimeError(
+                f"Expected array but found '{type(array)}': {array}.",
+                array.position,
+            )
+        return array
+
+    def _function(runner, env: Environment, argument) -> terms.Function:
+        function = runner.run(argument, env)
+        if not isinstance(function, terms.Function):
+            raise RuntimeError(
+                f"Expected a function but found '{type(function)}'.",
+                function.position,
+            )
+        return function
+
+    def _map(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        array = _array(runner, env, arguments[0])
+        f = _function(runner, env, arguments[1])
+        call = runner.call
+        return numeric.pack([call(f, [x], env) for x in array.value])
+
+    def _map2(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        array = _array(runner, env, arguments[0])
+        f = _function(runner, env, arguments[1])
+        call = runner.call
+        return numeric.pack(
+            [call(f, [x.value[0], x.value[1]], env) for x in array.value]
+        )
+
+    def _where(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        array = _array(runner, env, arguments[0])
+        predicate = _function(runner, env, arguments[1])
+        result = []
+        for x in array.value:
+            test = runner.call(predicate, [x], env)
+            if test.value is True:
+                result.append(x)
+            elif test.value is not False:
+                raise Exception(f"Expected a bool, not a '{type(test)}'.")
+        return numeric.pack(result)
+
+    def _each(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        r = runner.run(arguments[0], env)
+        f = _function(runner, env, arguments[1])
+        start = r.lookup("start")
+        stop = r.lookup("stop")
+        step = r.lookup("step")
+        result = []
+        while (start < stop).value:
+            result.append(runner.call(f, [start], env))
+            start = start + step
+        return numeric.pack(result)
+
+    def _zip(runner: Runner, env: Environment, arguments: List[terms.Expression]):
+        assert len(arguments) == 2
+        lhs = _array(runner, env, arguments[0])
+        rhs = _array(runner, env, arguments[1])
+        return terms.Array(
+            [
+                terms.Array([x, y], normalized=True)
+                for x, y in zip(lhs.value, rhs.value)
+            ],
+            normalized=True,
+        )
+
+    def _enumerate(
+        runner: Runner, env: Environment, arguments: List[terms.Expression]
+    ):
+        assert len(arguments) == 1
+        array = _array(runner, env, arguments[0])
+        return terms.Array(
+            [
+                terms.Array([terms.Value(i), x], normalized=True)
+                for i, x in enumerate(array.value)
+            ],
+            normalized=True,
+        )
+
+    def _definition(body, *parameters):
+        return terms.FunctionDefinition(
+            [terms.Parameter(p, None) for p in parameters], body, builtin=True
+        )
+
+    return {
+        "map": _definition(_map, "array", "f"),
+        "map2": _definition(_map2, "array", "f"),
+        "where": _definition(_where, "array", "predicate"),
+        "each": _definition(_each, "r", "f"),
+        "zip": _definition(_zip, "lhs", "rhs"),
+        "enumerate": _definition(_enumerate, "array"),
+    }
+
+
 # Helper functions for creating builtins.
 def _make_value(v):
     if isinstance(v, (str, int, float, bool)):
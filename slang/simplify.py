@@ -0,0 +1,363 @@
+"""
+The simplification stage: rewrites a program into one that is no more complex
+and evaluates to the same value.
+
+- Calls of small known functions are inlined, see `inline.py`.
+- Operations on constants are evaluated, e.g. `7 * 7` becomes `49`.
+- `let` bindings of constants are substituted into the code after them and
+  dropped once nothing refers to them anymore.
+- `if` expressions with a constant test are replaced by the branch taken.
+- Indexing a constant array with a constant index is evaluated.
+- Array literals of constants become normalized arrays (`NumericArray`s if
+  they hold enough ints or floats, see `numeric.py`), which the runners
+  return as is instead of building them again on every evaluation.
+
+Anything that would fail at runtime (e.g. `1 / 0`) is left in place, so the
+error is still reported when the program runs.  So are operations whose result
+would be larger than `MAX_FOLDED_SIZE` (e.g. `"ab" * 300000000`), which may be
+in a branch that never runs.
+"""
+from typing import Dict, Optional, Tuple
+
+from . import resolve, inline, numeric
+from .syntax import terms
+from .runtime import evaluate_binary_expression, evaluate_unary_expression
+
+# The constants bound to names, `None` for names bound to something else.
+Constants = Dict[str, Optional[terms.Value]]
+
+# The largest result (in characters of strings, items of arrays and bits of
+# ints) operations on constants are evaluated into.
+MAX_FOLDED_SIZE = 1 << 16
+
+
+def is_constant(term) -> bool:
+    if isinstance(term, terms.Array):
+        return term.normalized
+    return type(term) is terms.Value
+
+
+def _constant(value, position) -> Optional[terms.Value]:
+    if isinstance(value, numeric.NumericArray):
+        return numeric.NumericArray(value.data, position=position)
+    if isinstance(value, terms.Array):
+        if all(is_constant(item) for item in value.value):
+            return numeric.pack(list(value.value), position=position)
+        return None
+    if type(value) is terms.Value:
+        return terms.Value(value.value, position=position)
+    return None
+
+
+def _size(value) -> int:
+    if type(value) is int:
+        return value.bit_length()
+    if type(value) is str:
+        return len(value)
+    return 1
+
+
+def _folded_size(op: str, lhs, rhs) -> int:
+    """
+    A bound of the size of `lhs op rhs` (see `MAX_FOLDED_SIZE`), found without
+    evaluating it, which for `^` and repetition may take very long.
+    """
+    lhs_is_array = isinstance(lhs, terms.Array)
+    rhs_is_array = isinstance(rhs, terms.Array)
+    if op[0] == ".":
+        if lhs_is_array and rhs_is_array:
+            pairs = zip(lhs.value, rhs.value)
+        elif lhs_is_array:
+            pairs = ((item, rhs) for item in lhs.value)
+        elif rhs_is_array:
+            pairs = ((lhs, item) for item in rhs.value)
+        else:
+            return 1
+        size = 1
+        for x, y in pairs:
+            nested = isinstance(x, terms.Array) or isinstance(y, terms.Array)
+            size += _folded_size(op if nested else op[1:], x, y)
+            if size > MAX_FOLDED_SIZE:
+                break
+        return size
+    if lhs_is_array or rhs_is_array:
+        if lhs_is_array and rhs_is_array:
+            return len(lhs.value) + len(rhs.value)
+        return 1
+    a, b = lhs.value, rhs.value
+    if op == "^" and type(a) is int and type(b) is int and b > 0:
+        return 1 if -1 <= a <= 1 else a.bit_length() * b
+    if op == "*":
+        if type(a) is str and type(b) is int:
+            return len(a) * max(b, 0)
+        if type(a) is int and type(b) is str:
+            return max(a, 0) * len(b)
+    return _size(a) + _size(b)
+
+
+def _refers_to(term, name: str) -> bool:
+    """
+    Whether `name` occurs in `term`, ignoring that it may be shadowed.
+    """
+    if isinstance(term, terms.Variable):
+        return term.name == name
+    if isinstance(term, terms.Import):
+        return False
+    if isinstance(term, terms.Array):
+        return any(_refers_to(item, name) for item in term.value)
+    if isinstance(term, terms.Block):
+        return any(_refers_to(s, name) for s in term.statements) or _refers_to(
+            term.expression, name
+        )
+    if isinstance(term, terms.Call):
+        return _refers_to(term.expression, name) or any(
+            _refers_to(arg, name) for arg in term.arguments
+        )
+    if isinstance(term, terms.Namespace):
+        return any(_refers_to(d.value, name) for d in term.definitions)
+    if isinstance(term, terms.FunctionDefinition):
+        return not term.is_builtin and _refers_to(term.body, name)
+    if isinstance(term, terms.Assignment):
+        return _refers_to(term.expression, name)
+    if isinstance(term, terms.IfThenElse):
+        return (
+            _refers_to(term.test, name)
+            or _refers_to(term.true, name)
+            or _refers_to(term.false, name)
+        )
+    if isinstance(term, (terms.BinaryOperation, terms.Index)):
+        return _refers_to(term.lhs, name) or _refers_to(term.rhs, name)
+    if isinstance(term, terms.UnaryOperation):
+        return _refers_to(term.expression, name)
+    if isinstance(term, terms.Lookup):
+        return _refers_to(term.expression, name)
+    return False
+
+
+class Simplifier:
+    def __init__(self):
+        self.imports: Dict[int, terms.Expression] = {}
+        # The normalized arrays of the array literals of values, by literal.
+        self.normalized: Dict[int, Tuple[terms.Array, terms.Array]] = {}
+
+    def simplify(self, term, constants: Constants):
+        return getattr(self, f"simplify_{type(term).__name__}")(term, constants)
+
+    def simplify_Block(self, block, constants):
+        # Every name of the block hides the names of the enclosing scopes
+        # until its value is known.
+        inner = dict(constants)
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                inner[statement.name] = None
+            elif isinstance(statement, terms.Import):
+                definitions = resolve.exports(statement.program, statement.path.value)
+                if definitions is None:
+                    # Any name may be imported.
+                    inner = {}
+                    break
+                for d in definitions:
+                    inner[d.name] = None
+
+        statements = []
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                expression = self.simplify(statement.expression, inner)
+                if is_constant(expression):
+                    inner[statement.name] = expression
+                statements.append(
+                    terms.Assignment(
+                        statement.name, expression, position=statement.position
+                    )
+                )
+            else:
+                statements.append(self.simplify(statement, inner))
+        expression = self.simplify(block.expression, inner)
+
+        # Constants nothing refers to anymore are not needed.
+        kept = []
+        for statement in statements:
+            if (
+                isinstance(statement, terms.Assignment)
+                and is_constant(statement.expression)
+                and not any(
+                    _refers_to(other, statement.name)
+                    for other in statements + [expression]
+                    if other is not statement
+                )
+            ):
+                continue
+            kept.append(statement)
+
+        if not kept:
+            return expression
+        return terms.Block(kept, expression, position=block.position)
+
+    def simplify_Bang(self, bang, constants):
+        return bang
+
+    def simplify_Import(self, statement, constants):
+        # Imported programs do not see the constants of the importer.
+        program = self.imports.get(id(statement.program))
+        if program is None:
+            program = self.simplify(statement.program, {})
+            self.imports[id(statement.program)] = program
+        return terms.Import(statement.path, program, position=statement.position)
+
+    def simplify_Assignment(self, statement, constants):
+        return terms.Assignment(
+            statement.name,
+            self.simplify(statement.expression, constants),
+            position=statement.position,
+        )
+
+    def simplify_IfThenElse(self, expr, constants):
+        test = self.simplify(expr.test, constants)
+        if is_constant(test) and isinstance(test.value, bool):
+            branch = expr.true if test.value else expr.false
+            return self.simplify(branch, constants)
+        return terms.IfThenElse(
+            test,
+            self.simplify(expr.true, constants),
+            self.simplify(expr.false, constants),
+            position=expr.position,
+        )
+
+    def simplify_FunctionDefinition(self, definition, constants):
+        if definition.is_builtin:
+            return definition
+        inner = dict(constants)
+        for p in definition.parameters:
+            inner[p.name] = None
+        inner["this"] = None
+        return terms.FunctionDefinition(
+            definition.parameters,
+            self.simplify(definition.body, inner),
+            builtin=False,
+            position=definition.position,
+        )
+
+    def simplify_Function(self, function, constants):
+        return function
+
+    def simplify_Call(self, call, constants):
+        return terms.Call(
+            self.simplify(call.expression, constants),
+            [self.simplify(arg, constants) for arg in call.arguments],
+            position=call.position,
+        )
+
+    def simplify_BinaryOperation(self, expr, constants):
+        lhs = self.simplify(expr.lhs, constants)
+        rhs = self.simplify(expr.rhs, constants)
+        if (
+            is_constant(lhs)
+            and is_constant(rhs)
+            and _folded_size(expr.op, lhs, rhs) <= MAX_FOLDED_SIZE
+        ):
+            try:
+                value = evaluate_binary_expression(expr.op, lhs, rhs)
+            except Exception:
+                value = None
+            value = _constant(value, expr.position)
+            if value is not None:
+                return value
+        if lhs is expr.lhs and rhs is expr.rhs:
+            return expr
+        return terms.BinaryOperation(expr.op, lhs, rhs, position=expr.position)
+
+    def simplify_UnaryOperation(self, expr, constants):
+        expression = self.simplify(expr.expression, constants)
+        if is_constant(expression):
+            try:
+                value = evaluate_unary_expression(expr.op, expression)
+            except Exception:
+                value = None
+            value = _constant(value, expr.position)
+            if value is not None:
+                return value
+        if expression is expr.expression:
+            return expr
+        return terms.UnaryOperation(expr.op, expression, position=expr.position)
+
+    def simplify_Index(self, index, constants):
+        lhs = self.simplify(index.lhs, constants)
+        rhs = self.simplify(index.rhs, constants)
+        if (
+            isinstance(lhs, terms.Array)
+            and lhs.normalized
+            and is_constant(rhs)
+            and type(rhs.value) is int
+            and -len(lhs.value) <= rhs.value < len(lhs.value)
+        ):
+            return lhs.value[rhs.value]
+        return terms.Index(lhs, rhs, position=index.position)
+
+    def simplify_Lookup(self, lookup, constants):
+        return terms.Lookup(
+            self.simplify(lookup.expression, constants),
+            lookup.var,
+            position=lookup.position,
+        )
+
+    def simplify_Variable(self, var, constants):
+        value = constants.get(var.name)
+        if value is None:
+            return var
+        return value
+
+    def simplify_Bound(self, bound, constants):
+        return bound
+
+    def simplify_Namespace(self, ns, constants):
+        inner = dict(constants)
+        for d in ns.definitions:
+            inner[d.name] = None
+        definitions = []
+        for d in ns.definitions:
+            value = self.simplify(d.value, inner)
+            if is_constant(value):
+                inner[d.name] = value
+            definitions.append(
+                terms.NamespaceDefinition(d.name, value, position=d.position)
+            )
+        return terms.Namespace(definitions, position=ns.position)
+
+    def simplify_Array(self, array, constants):
+        if array.normalized:
+            return array
+        # Literals of values (shared ones too, see `syntax/hashcons.py`)
+        # become the same normalized array wherever they occur.
+        normalized = self.normalized.get(id(array))
+        if normalized is not None:
+            return normalized[1]
+        items = [self.simplify(item, constants) for item in array.value]
+        if all(is_constant(item) for item in items):
+            result = numeric.pack(items, position=array.position)
+        else:
+            result = terms.Array(items, position=array.position, normalized=False)
+        values = all(type(item) is terms.Value for item in array.value)
+        if result.normalized and values:
+            self.normalized[id(array)] = (array, result)
+        return result
+
+    simplify_NumericArray = simplify_Array
+
+    def simplify_Value(self, value, constants):
+        return value
+
+
+def simplify(
+    program: terms.Expression,
+    threshold: int = inline.DEFAULT_THRESHOLD,
+    lazy: bool = False,
+) -> terms.Expression:
+    """
+    Returns the simplified `program`.  `program` itself is not changed.
+    threshold: the size up to which functions are inlined first (see `inline.py`), 0 to not inline
+    lazy: whether the program passes arguments by need; inlining binds the
+        arguments with `let`, which evaluates them, so it is skipped then
+    """
+    if threshold and not lazy:
+        program, _ = inline.inline(program, threshold)
+    return Simplifier().simplify(program, {})
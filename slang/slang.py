@@ -9,10 +9,16 @@ from . import runtime
 
 
 def main():
-    parser = make_cli_parser()
-    args = parser.parse_args()
+    if sys.argv[1:2] == ["compile"]:
+        parser = make_compile_cli_parser()
+        args = parser.parse_args(sys.argv[2:])
+        action = compile_python
+    else:
+        parser = make_cli_parser()
+        args = parser.parse_args()
+        action = compile_slang
     try:
-        compile_slang(args)
+        action(args)
     except runtime.ParseError as e:
         print("Compilation error.", file=sys.stderr)
         e.print()
@@ -25,7 +31,7 @@ def make_environment():
 
 def compile_slang(args):
     scope = make_environment()
-    result = runtime.run_file(args.in_path, scope)
+    result = runtime.run_file(args.in_path, scope, cache=args.cache)
     if not result:
         sys.exit(-1)
 
@@ -34,6 +40,36 @@ def compile_slang(args):
     sys.stdout.flush()
 
 
+def compile_python(args):
+    from . import codegen
+
+    out_path = args.out_path
+    if not out_path:
+        stem = os.path.splitext(os.path.basename(args.in_path))[0]
+        out_path = f"{stem}_slang.py"
+    try:
+        codegen.compile_file(args.in_path, out_path)
+    except codegen.CodegenError as e:
+        print(f"Compilation error: {e}", file=sys.stderr)
+        sys.exit(-1)
+
+
+def make_compile_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog="slang compile", usage="%(prog)s [options] in_path"
+    )
+    parser.add_argument(
+        "in_path", type=str, help="The path to the slang program to translate."
+    )
+    parser.add_argument(
+        "-o",
+        dest="out_path",
+        type=str,
+        help="Path to write the Python module to (default: <name>_slang.py).",
+    )
+    return parser
+
+
 def make_cli_parser():
     parser = argparse.ArgumentParser(prog="slang", usage="%(prog)s [options]")
     parser.add_argument(
@@ -41,6 +77,11 @@ def make_cli_parser():
     )
 
     parser.add_argument("out_path", nargs="?", type=str, help="Path to write result.")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the parsed program in __slangcache__ next to in_path.",
+    )
     return parser
 
 
@@ -1,15 +1,82 @@
+import re
+from bisect import bisect_right
+from typing import List, Optional
+
+
+class Lines:
+    """
+    Turns offsets into the source of a program into (0 based) line numbers.
+    The offsets the lines start at are only collected the first time a line
+    is asked for, which usually means an error is about to be printed.
+    """
+
+    __slots__ = ("source", "starts")
+
+    def __init__(self, source: str):
+        self.source: Optional[str] = source
+        self.starts: Optional[List[int]] = None
+
+    def line(self, offset: int) -> int:
+        if self.starts is None:
+            starts = [0]
+            starts.extend(m.end() for m in re.finditer("\n", self.source))
+            self.starts = starts
+            # The source is not needed anymore.
+            self.source = None
+        return bisect_right(self.starts, offset) - 1
+
+
 class Position:
-    def __init__(self, rule, start_line, end_line, start_position, end_position):
+    """
+    The offsets of a node in the source.  The lines are either given or looked
+    up in `lines` when they are first used.
+    """
+
+    __slots__ = (
+        "rule",
+        "start_position",
+        "end_position",
+        "lines",
+        "_start_line",
+        "_end_line",
+    )
+
+    def __init__(
+        self,
+        rule,
+        start_line,
+        end_line,
+        start_position,
+        end_position,
+        lines: Optional[Lines] = None,
+    ):
         self.rule = rule
-        self.end_line = end_line
-        self.start_line = start_line
-        self.end_position = end_position
+        self._start_line = start_line
+        self._end_line = end_line
         self.start_position = start_position
+        self.end_position = end_position
+        self.lines = lines
 
     @classmethod
     def from_parseinfo(cls, info):
         return cls(info.rule, info.line, info.endline, info.pos, info.endpos)
 
+    @classmethod
+    def from_offsets(cls, rule, start: int, end: int, lines: Lines) -> "Position":
+        return cls(rule, None, None, start, end, lines)
+
+    @property
+    def start_line(self):
+        if self._start_line is None and self.lines is not None:
+            self._start_line = self.lines.line(self.start_position)
+        return self._start_line
+
+    @property
+    def end_line(self):
+        if self._end_line is None and self.lines is not None:
+            self._end_line = self.lines.line(self.end_position)
+        return self._end_line
+
     def __repr__(self):
         return (
             f"Position({self.rule}, "
@@ -0,0 +1,219 @@
+"""
+A persistent map, the index of the names of a `terms.Namespace`.
+
+The map is a hash array mapped trie: every node covers 5 bits of the hash of
+the keys and keeps only the entries that are there, found through a 32 bit
+bitmap.  Maps are never changed after they are created, so `set` and
+`delete` copy the O(log32 n) nodes on the path to the key and share all the
+others with the map they started from.  Looking a key up follows that same
+path.
+"""
+from typing import Any, Iterator, Optional, Tuple
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+_MISSING = object()
+
+
+def _count(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+class _Collision:
+    """
+    The entries of the keys whose hashes are all the same.
+    """
+
+    __slots__ = ("hash", "entries")
+
+    def __init__(self, hash: int, entries: Tuple[Tuple[Any, Any], ...]):
+        self.hash = hash
+        self.entries = entries
+
+    def get(self, hash: int, key, shift: int):
+        for k, v in self.entries:
+            if k == key:
+                return v
+        return _MISSING
+
+    def set(self, hash: int, key, value, shift: int):
+        if hash != self.hash:
+            # Pushes the collision one level down, next to the new entry.
+            node = _Node(1 << ((self.hash >> shift) & MASK), (self,))
+            return node.set(hash, key, value, shift)
+        entries = tuple((k, v) for k, v in self.entries if k != key)
+        return _Collision(hash, entries + ((key, value),))
+
+    def delete(self, hash: int, key, shift: int):
+        entries = tuple((k, v) for k, v in self.entries if k != key)
+        if len(entries) == len(self.entries):
+            return self
+        if len(entries) == 1:
+            return _Entry(hash, entries[0][0], entries[0][1])
+        return _Collision(hash, entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+class _Entry:
+    __slots__ = ("hash", "key", "value")
+
+    def __init__(self, hash: int, key, value):
+        self.hash = hash
+        self.key = key
+        self.value = value
+
+
+class _Node:
+    __slots__ = ("bitmap", "children")
+
+    def __init__(self, bitmap: int, children: tuple):
+        """
+        children: one `_Entry`, `_Node` or `_Collision` per bit set in `bitmap`
+        """
+        self.bitmap = bitmap
+        self.children = children
+
+    def get(self, hash: int, key, shift: int):
+        node = self
+        while True:
+            bit = 1 << ((hash >> shift) & MASK)
+            if not node.bitmap & bit:
+                return _MISSING
+            child = node.children[_count(node.bitmap & (bit - 1))]
+            if type(child) is _Entry:
+                if child.key is key or child.key == key:
+                    return child.value
+                return _MISSING
+            if type(child) is _Collision:
+                return child.get(hash, key, shift)
+            node = child
+            shift += BITS
+
+    def set(self, hash: int, key, value, shift: int) -> "_Node":
+        bit = 1 << ((hash >> shift) & MASK)
+        index = _count(self.bitmap & (bit - 1))
+        children = self.children
+        if not self.bitmap & bit:
+            entry = _Entry(hash, key, value)
+            return _Node(
+                self.bitmap | bit, children[:index] + (entry,) + children[index:]
+            )
+        child = children[index]
+        if type(child) is _Entry:
+            if child.key == key:
+                new = _Entry(hash, key, value)
+            elif child.hash == hash:
+                new = _Collision(hash, ((child.key, child.value), (key, value)))
+            else:
+                node = _Node(1 << ((child.hash >> (shift + BITS)) & MASK), (child,))
+                new = node.set(hash, key, value, shift + BITS)
+        else:
+            new = child.set(hash, key, value, shift + BITS)
+        return _Node(self.bitmap, children[:index] + (new,) + children[index + 1 :])
+
+    def delete(self, hash: int, key, shift: int) -> Optional["_Node"]:
+        """
+        The node without `key`, `None` if it would be empty.
+        """
+        bit = 1 << ((hash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        index = _count(self.bitmap & (bit - 1))
+        child = self.children[index]
+        if type(child) is _Entry:
+            if child.key != key:
+                return self
+            new = None
+        else:
+            new = child.delete(hash, key, shift + BITS)
+            if new is child:
+                return self
+            if type(new) is _Node and len(new.children) == 1:
+                # A node of a single entry is replaced by the entry.
+                only = new.children[0]
+                if type(only) is not _Node:
+                    new = only
+        if new is None:
+            if self.bitmap == bit:
+                return None
+            children = self.children[:index] + self.children[index + 1 :]
+            return _Node(self.bitmap & ~bit, children)
+        children = self.children[:index] + (new,) + self.children[index + 1 :]
+        return _Node(self.bitmap, children)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        for child in self.children:
+            if type(child) is _Entry:
+                yield child.key, child.value
+            else:
+                yield from child
+
+
+class Map:
+    __slots__ = ("root", "size")
+
+    def __init__(self, items=()):
+        self.root: Optional[_Node] = None
+        self.size = 0
+        if items:
+            result = self
+            for key, value in items:
+                result = result.set(key, value)
+            self.root = result.root
+            self.size = result.size
+
+    @classmethod
+    def _from_root(cls, root: Optional[_Node], size: int) -> "Map":
+        result = cls.__new__(cls)
+        result.root = root
+        result.size = size
+        return result
+
+    def get(self, key, default=None):
+        if self.root is None:
+            return default
+        value = self.root.get(hash(key), key, 0)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key) -> bool:
+        return self.root is not None and (
+            self.root.get(hash(key), key, 0) is not _MISSING
+        )
+
+    def __getitem__(self, key):
+        value = _MISSING if self.root is None else self.root.get(hash(key), key, 0)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def set(self, key, value) -> "Map":
+        """
+        A map with `key` bound to `value` and otherwise the same entries.
+        """
+        size = self.size if key in self else self.size + 1
+        if self.root is None:
+            root = _Node(0, ()).set(hash(key), key, value, 0)
+        else:
+            root = self.root.set(hash(key), key, value, 0)
+        return Map._from_root(root, size)
+
+    def delete(self, key) -> "Map":
+        """
+        A map without `key`, `self` if it does not have it.
+        """
+        if key not in self:
+            return self
+        return Map._from_root(self.root.delete(hash(key), key, 0), self.size - 1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        if self.root is not None:
+            yield from self.root
+
+    def __iter__(self) -> Iterator[Any]:
+        return (key for key, _ in self.items())
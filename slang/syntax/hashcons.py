@@ -0,0 +1,84 @@
+"""
+Hash-consing: building structurally equal immutable terms only once.
+
+A `HashCons` table hands out the same object for every literal, constant
+array, variable and operation it is asked for again, so a program that
+repeats them (tables of data, generated tests, the same lambda body over and
+over) holds one copy of each.  The children of a shared term are shared
+themselves, so a term is keyed by the ids of its children: looking it up is
+O(1) however large it is, and equal shared terms are the same object.
+
+Terms are never changed after they are built (the resolver and the
+simplifier build new ones), which is what makes sharing them safe.  A shared
+term keeps the position of the first place it was built for, so
+`parse_string(..., share=True)` only shares the terms of programs parsed
+without positions, where errors can not point at the wrong occurrence.
+
+Only the parsers build terms through a table.  Values built while the program
+runs are not shared, apart from the booleans and small ints `terms.box`
+hands out.
+"""
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from . import terms, Position
+
+
+class HashCons:
+    def __init__(self):
+        self.terms: Dict[tuple, terms.Expression] = {}
+        # The ids of the terms in `terms`, which keeps them alive.
+        self.shared: Set[int] = set()
+        # How often a term was shared instead of built.
+        self.hits = 0
+
+    def is_shared(self, term) -> bool:
+        return id(term) in self.shared
+
+    def _get(self, key: tuple, make: Callable[[], terms.Expression]):
+        term = self.terms.get(key)
+        if term is None:
+            term = make()
+            self.terms[key] = term
+            self.shared.add(id(term))
+        else:
+            self.hits += 1
+        return term
+
+    def value(self, value: Any, position: Optional[Position] = None) -> terms.Value:
+        kind = type(value)
+        # Keeps `0.0` and `-0.0` apart, which are equal as keys.
+        key = ("value", kind, value.hex() if kind is float else value)
+        return self._get(key, lambda: terms.Value(value, position=position))
+
+    def array(
+        self, items: List[terms.Expression], position: Optional[Position] = None
+    ) -> terms.Array:
+        """
+        An array literal, shared if its items are shared constants.
+        """
+        for item in items:
+            if not isinstance(item, terms.Value) or not self.is_shared(item):
+                return terms.Array(items, position=position)
+        key = ("array",) + tuple(id(item) for item in items)
+        return self._get(key, lambda: terms.Array(items, position=position))
+
+    def variable(self, name: str, position: Optional[Position] = None):
+        return self._get(
+            ("variable", name), lambda: terms.Variable(name, position=position)
+        )
+
+    def unary(self, op: str, expression, position: Optional[Position] = None):
+        if not self.is_shared(expression):
+            return terms.UnaryOperation(op, expression, position=position)
+        return self._get(
+            ("unary", op, id(expression)),
+            lambda: terms.UnaryOperation(op, expression, position=position),
+        )
+
+    def binary(self, op: str, lhs, rhs, position: Optional[Position] = None):
+        if not self.is_shared(lhs) or not self.is_shared(rhs):
+            return terms.BinaryOperation(op, lhs, rhs, position=position)
+        return self._get(
+            ("binary", op, id(lhs), id(rhs)),
+            lambda: terms.BinaryOperation(op, lhs, rhs, position=position),
+        )
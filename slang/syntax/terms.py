@@ -1,9 +1,13 @@
 # pyre-strict
 import types as pytypes
 import logging
-from typing import Any, Dict, List, Optional
+import operator
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import Position
+from .vector import Vector
+from .hamt import Map
 
 DEFAULT = object()
 
@@ -20,12 +24,15 @@ class Environment:
         self,
         parent: Optional["Environment"] = None,
         symbols: Optional[Dict[str, "Expression"]] = None,
+        lazy: bool = False,
     ):
         self.parent = parent
         self.symbols = symbols if symbols else {}
+        # Whether programs run in this environment pass arguments by need.
+        self.lazy = lazy
 
     def push(self) -> "Environment":
-        return Environment(self)
+        return Environment(self, lazy=self.lazy)
 
     def keys(self) -> List[str]:
         return list(self.symbols.keys()) + (self.parent.keys() if self.parent else [])
@@ -54,7 +61,59 @@ class Environment:
         return env
 
 
+class Frame:
+    """
+    The values of the variables of one scope, in the slots the resolver assigned
+    to them (see `resolve.py`).  The outermost frame hangs off the `Environment`
+    the program runs in, which still holds its globals by name.
+    """
+
+    __slots__ = ("parent", "slots")
+
+    def __init__(self, parent, slots: List[Optional["Expression"]]):
+        self.parent = parent
+        self.slots = slots
+
+    def find_symbol(self, name: str, default: Any = DEFAULT) -> "Expression":
+        return self.get_environment().find_symbol(name, default)
+
+    def get_environment(self) -> Environment:
+        env = self.parent
+        while isinstance(env, Frame):
+            env = env.parent
+        return env
+
+    def get_root(self) -> Environment:
+        return self.get_environment().get_root()
+
+
+def capture(definition: "FunctionDefinition", env) -> Any:
+    """
+    The environment a function value created from `definition` in `env` keeps.
+    """
+    captures = definition.captures
+    if captures is None:
+        return env
+    if definition.linked:
+        parent = env
+    elif isinstance(env, Frame):
+        parent = env.get_environment()
+    else:
+        parent = env
+    if not captures and not definition.linked:
+        return parent
+    values = []
+    for depth, index in captures:
+        frame = env
+        for _ in range(depth):
+            frame = frame.parent
+        values.append(frame.slots[index])
+    return Frame(parent, values)
+
+
 class Node:
+    __slots__ = ("position",)
+
     def __init__(self, position: Optional[Position]):
         self.position = position
 
@@ -63,16 +122,22 @@ class Node:
 
 
 class Statement(Node):
+    __slots__ = ()
+
     def is_value(self):
         return False
 
 
 class Expression(Node):
+    __slots__ = ()
+
     def is_value(self):
         return False
 
 
 class Bang(Statement):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expression, position: Optional[Position] = None):
         assert expression is not None
         super().__init__(position)
@@ -80,50 +145,106 @@ class Bang(Statement):
 
 
 class Import(Statement):
-    def __init__(self, path, program, position=None):
+    __slots__ = ("path", "program", "slots")
+
+    def __init__(self, path, program, position=None, slots=None):
+        """
+        slots: the `(name, index)` pairs the imported names are stored in, set by the resolver
+        """
         assert path is not None
         assert program is not None
         super().__init__(position)
         self.path = path
         self.program = program
+        self.slots = slots
 
 
 class Assignment(Statement):
-    def __init__(self, name, expression, position=None):
+    __slots__ = ("name", "expression", "index")
+
+    def __init__(self, name, expression, position=None, index=None):
+        """
+        index: the slot the value is stored in, set by the resolver
+        """
         assert name is not None, f"Name: {name}"
         assert expression is not None, f"Name - Expression: {name} - {expression}"
         super().__init__(position)
         self.name = name
         self.expression = expression
+        self.index = index
 
 
 class Block(Expression):
+    __slots__ = ("expression", "statements", "size")
+
     def __init__(
         self,
         statements: List[Statement],
         expression: Expression,
         position: Optional[Position] = None,
+        size: int = 0,
     ):
+        """
+        size: the number of slots of the frame of the block, set by the resolver
+        """
         super().__init__(position)
         self.expression = expression
         self.statements = statements
+        self.size = size
 
 
 class This(Expression):
-    pass
+    __slots__ = ()
+
+
+def _identity(value):
+    return value
+
+
+# The Python functions of the operators that work on two values.  The other
+# operators are left to `runtime.evaluate_binary_expression`.
+binary_operators = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": operator.pow,
+    "%": operator.mod,
+    "==": operator.eq,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+unary_operators = {
+    "+": _identity,
+    "-": operator.neg,
+}
 
 
 class UnaryOperation(Expression):
+    __slots__ = ("op", "expression", "function")
+
     def __init__(self, op, expression, position=None):
+        """
+        function: the Python function of `op`, `None` if there is none
+        """
         assert op is not None
         assert expression is not None
         super().__init__(position)
         self.op = op
         self.expression = expression
+        self.function = unary_operators.get(op)
 
 
 class BinaryOperation(Expression):
+    __slots__ = ("op", "lhs", "rhs", "function")
+
     def __init__(self, op, lhs, rhs, position=None):
+        """
+        function: the Python function of `op`, `None` if there is none
+        """
         assert op is not None
         assert lhs is not None
         assert rhs is not None
@@ -131,18 +252,43 @@ class BinaryOperation(Expression):
         self.op = op
         self.lhs = lhs
         self.rhs = rhs
+        self.function = binary_operators.get(op)
+
+
+class NumericOperation(BinaryOperation):
+    """
+    An operation the type checker proved to only see ints and floats (see
+    `typecheck.py`), so `function` can be applied to the Python numbers in
+    the operands instead of the `Value`s.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, op, lhs, rhs, position=None):
+        assert op in binary_operators
+        super().__init__(op, lhs, rhs, position)
 
 
 class Bound(Expression):
-    def __init__(self, name, index, position=None):
+    """
+    A variable resolved to the slot `index` of the frame `depth` frames up.
+    """
+
+    __slots__ = ("name", "depth", "index")
+
+    def __init__(self, name, depth, index, position=None):
         assert name is not None
+        assert depth is not None
         assert index is not None
         super().__init__(position)
         self.name = name
+        self.depth = depth
         self.index = index
 
 
 class Variable(Expression):
+    __slots__ = ("name",)
+
     def __init__(self, name, position=None):
         assert name is not None
         super().__init__(position)
@@ -150,6 +296,8 @@ class Variable(Expression):
 
 
 class IfThenElse(Expression):
+    __slots__ = ("test", "true", "false")
+
     def __init__(self, test, true, false, position: Optional[Position] = None):
         assert test is not None
         assert true is not None
@@ -160,7 +308,17 @@ class IfThenElse(Expression):
         self.false = false
 
 
+class TypedIfThenElse(IfThenElse):
+    """
+    A conditional whose test the type checker proved to be a bool.
+    """
+
+    __slots__ = ()
+
+
 class Parameter:
+    __slots__ = ("typ", "name", "position")
+
     def __init__(self, name, typ, position=None):
         assert name is not None
         self.typ = typ
@@ -172,17 +330,43 @@ class Parameter:
 
 
 class FunctionDefinition(Expression):
+    __slots__ = (
+        "body",
+        "is_builtin",
+        "parameters",
+        "captures",
+        "linked",
+        "typ",
+        "unchecked",
+    )
+
     def __init__(
         self,
         parameters: List[Parameter],
         body: Expression,
         builtin: bool,
         position: Optional[Position] = None,
+        captures: Optional[List[Tuple[int, int]]] = None,
+        linked: bool = False,
+        typ=None,
+        unchecked: Optional["FunctionDefinition"] = None,
     ):
+        """
+        captures: the `(depth, slot)` of the values the function value keeps, set by the resolver.
+            `None` keeps the whole environment the function is defined in.
+        linked: whether the function value also keeps the frame it is defined in
+        typ: the `types.Function` of a builtin, if it is known
+        unchecked: a builtin that does the same without checking its arguments,
+            for calls whose arguments are proven to be of the types in `typ`
+        """
         super().__init__(position)
         self.body = body
         self.is_builtin = builtin
         self.parameters = parameters
+        self.captures = captures
+        self.linked = linked
+        self.typ = typ
+        self.unchecked = unchecked
 
     def __eq__(self, other):
         return (
@@ -199,26 +383,31 @@ class FunctionDefinition(Expression):
 
 
 class Function(Expression):
+    __slots__ = ("definition", "environment")
+
     def __init__(self, definition: FunctionDefinition, environment: Environment):
         super().__init__(definition.position)
         self.definition = definition
         self.environment = environment
 
     def __eq__(self, other):
+        # The same definition in the same environment.
         return (
-            type(self) == type(other)
-            and self.definition == other.definition
-            and self.body == other.body
+            isinstance(other, Function)
+            and self.definition is other.definition
+            and self.environment is other.environment
         )
 
     def __hash__(self):
-        return hash(tuple(p.name for p in self.parameters))
+        return hash((id(self.definition), id(self.environment)))
 
     def is_value(self):
         return True
 
 
 class Call(Expression):
+    __slots__ = ("arguments", "expression")
+
     def __init__(
         self, expression: Expression, arguments: List[Expression], position=None
     ):
@@ -227,6 +416,27 @@ class Call(Expression):
         self.expression = expression
 
 
+class UncheckedCall(Call):
+    """
+    A call the type checker proved to always call the builtin `definition`
+    with arguments of the types it takes, which calls `definition.unchecked`
+    instead.  `expression` is kept for the engines that make a plain call.
+    """
+
+    __slots__ = ("definition",)
+
+    def __init__(
+        self,
+        expression: Expression,
+        arguments: List[Expression],
+        definition: FunctionDefinition,
+        position=None,
+    ):
+        assert definition.unchecked is not None
+        super().__init__(expression, arguments, position=position)
+        self.definition = definition
+
+
 # class Chain(Expression):
 #     def __init__(self, function: Function, argument: Expression, position=None):
 #         super().__init__(position)
@@ -235,13 +445,24 @@ class Call(Expression):
 
 
 class Lookup(Expression):
+    """
+    `shape` and `slot` remember where the name was in the last record looked
+    in (see `Namespace.lookup_at`).
+    """
+
+    __slots__ = ("var", "expression", "shape", "slot")
+
     def __init__(self, expression: Expression, var: Variable, position=None):
         super().__init__(position)
         self.var = var
         self.expression = expression
+        self.shape: Optional["Shape"] = None
+        self.slot: Optional[int] = None
 
 
 class NamespaceDefinition(Expression):
+    __slots__ = ("name", "value")
+
     def __init__(self, name: str, value, position: Optional[Position] = None):
         assert name is not None
         assert value is not None
@@ -250,46 +471,205 @@ class NamespaceDefinition(Expression):
         self.value = value
 
 
+class Shape:
+    """
+    The layout of a record: the names of its fields, and the slot of each.
+    Shapes are interned, so all the namespaces built from literals with the
+    same names have the same shape.
+    """
+
+    __slots__ = ("names", "slots", "__weakref__")
+
+    _shapes: "weakref.WeakValueDictionary[Tuple[str, ...], Shape]" = (
+        weakref.WeakValueDictionary()
+    )
+
+    def __init__(self, names: Tuple[str, ...]):
+        self.names = names
+        # A name that is defined twice is found in its last slot.
+        self.slots: Dict[str, int] = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def of(cls, names: Tuple[str, ...]) -> "Shape":
+        shape = cls._shapes.get(names)
+        if shape is None:
+            shape = cls(names)
+            cls._shapes[names] = shape
+        return shape
+
+    def __reduce__(self):
+        return (Shape.of, (self.names,))
+
+
 class Namespace(Expression):
+    """
+    The definitions are kept in order, and for namespaces with more than
+    `SMALL` of them a persistent map (see `hamt.py`) finds the definition of a
+    name.  `remove` and `combine` share that map and the order (a `Vector`)
+    with the namespaces they start from, and only build the list of
+    definitions when something asks for it.
+
+    A namespace literal evaluates to a record: its `Shape` and the values in
+    the order of its definitions.  Names are found through the slots of the
+    shape, and the definitions are only built if something asks for them.
+    """
+
+    __slots__ = ("_definitions", "_order", "_index", "_shape", "_values")
+
+    # Namespaces up to this size are searched without building the map.
+    SMALL = 8
+
     def __init__(
         self,
         definitions: List[NamespaceDefinition],
         position: Optional[Position] = None,
     ):
         super().__init__(position)
-        self.definitions = definitions
+        self._definitions = definitions
+        self._order = None
+        self._index = None
+        self._shape: Optional[Shape] = None
+        self._values: Optional[List[Expression]] = None
+
+    @classmethod
+    def _derived(cls, order: Vector, index: Map) -> "Namespace":
+        """
+        The namespace of the definitions in `order` that are still the ones
+        `index` has for their names.
+        """
+        ns = cls.__new__(cls)
+        Node.__init__(ns, None)
+        ns._definitions = None
+        ns._order = order
+        ns._index = index
+        ns._shape = None
+        ns._values = None
+        return ns
+
+    @classmethod
+    def record(cls, shape: Shape, values: List[Expression]) -> "Namespace":
+        """
+        values: one per name of `shape`, the list is not copied
+        """
+        ns = cls.__new__(cls)
+        Node.__init__(ns, None)
+        ns._definitions = None
+        ns._order = None
+        ns._index = None
+        ns._shape = shape
+        ns._values = values
+        return ns
+
+    @property
+    def shape(self) -> Shape:
+        if self._shape is None:
+            self._shape = Shape.of(tuple(d.name for d in self.definitions))
+        return self._shape
+
+    @property
+    def definitions(self) -> List[NamespaceDefinition]:
+        if self._definitions is None and self._values is not None:
+            self._definitions = [
+                NamespaceDefinition(name, value)
+                for name, value in zip(self._shape.names, self._values)
+            ]
+        elif self._definitions is None:
+            definitions = []
+            seen = set()
+            for d in self._order:
+                if d.name not in seen and self._index.get(d.name) is d:
+                    seen.add(d.name)
+                    definitions.append(d)
+            self._definitions = definitions
+            # Drops the definitions that were replaced or removed.
+            self._order = Vector(definitions)
+        return self._definitions
+
+    def index(self) -> Map:
+        if self._index is None:
+            index = Map()
+            for d in self.definitions:
+                index = index.set(d.name, d)
+            self._index = index
+        return self._index
+
+    def order(self) -> Vector:
+        if self._order is None:
+            self._order = Vector(self.definitions)
+        return self._order
 
     def is_value(self):
         return True
 
     def has(self, name):
-        for d in self.definitions:
-            if d.name == name:
-                return True
-        return False
+        if self._values is not None:
+            return name in self._shape.slots
+        if self._index is None and len(self._definitions) <= self.SMALL:
+            for d in self._definitions:
+                if d.name == name:
+                    return True
+            return False
+        return name in self.index()
 
     def remove(self, name):
-        definitions = [d for d in self.definitions if d.name != name]
-        return Namespace(definitions)
+        index = self.index()
+        if name not in index:
+            return Namespace._derived(self.order(), index)
+        return Namespace._derived(self.order(), index.delete(name))
 
     def combine(self, other):
-        other_names = [d.name for d in other.definitions]
-        definitions = other.definitions + [
-            d for d in self.definitions if d.name not in other_names
-        ]
-        return Namespace(definitions)
+        index = self.index()
+        other_index = other.index()
+        # Adds the entries of the smaller map to the larger one.
+        if len(other_index) >= len(index):
+            for name, d in index.items():
+                if name not in other_index:
+                    other_index = other_index.set(name, d)
+            index = other_index
+        else:
+            for name, d in other_index.items():
+                index = index.set(name, d)
+        ns = Namespace._derived(other.order() + self.order(), index)
+        if len(ns._order) > 2 * len(index):
+            # Too many of the definitions are replaced, this drops them.
+            ns.definitions
+        return ns
 
     def lookup(self, name):
-        for d in reversed(self.definitions):
-            if d.name == name:
+        if self._values is not None:
+            slot = self._shape.slots.get(name)
+            if slot is not None:
+                return self._values[slot]
+        elif self._index is None and len(self._definitions) <= self.SMALL:
+            for d in reversed(self._definitions):
+                if d.name == name:
+                    return d.value
+        else:
+            d = self.index().get(name)
+            if d is not None:
                 return d.value
         raise Exception(f"The namespace does not define a symbol named '{name}'.")
 
+    def lookup_at(self, lookup: Lookup):
+        """
+        `lookup(lookup.var.name)`, which only checks the shape of a record
+        when it is the one `lookup` looked in the last time.
+        """
+        if self._values is not None:
+            if lookup.shape is not self._shape:
+                lookup.shape = self._shape
+                lookup.slot = self._shape.slots.get(lookup.var.name)
+            if lookup.slot is not None:
+                return self._values[lookup.slot]
+        return self.lookup(lookup.var.name)
+
     def for_json(self):
         return {d.name: d.value.for_json() for d in self.definitions}
 
 
 class Index(Expression):
+    __slots__ = ("lhs", "rhs")
+
     def __init__(self, lhs, rhs, position=None):
         assert lhs is not None
         assert rhs is not None
@@ -299,6 +679,8 @@ class Index(Expression):
 
 
 class Value(Expression):
+    __slots__ = ("value",)
+
     def __init__(self, value, position: Optional[Position] = None):
         assert value is not None
         if isinstance(value, Node):
@@ -310,70 +692,117 @@ class Value(Expression):
         return True
 
     def __neg__(self):
-        return Value(-self.value)
+        return box(-self.value)
 
     def __hash__(self):
         return hash(self.value)
 
     def __eq__(self, other):
-        return Value(self.value == other.value)
+        return box(self.value == other.value)
 
     def __ne__(self, other):
-        return Value(self.value != other.value)
+        return box(self.value != other.value)
 
     def __lt__(self, other):
-        return Value(self.value < other.value)
+        return box(self.value < other.value)
 
     def __le__(self, other):
-        return Value(self.value <= other.value)
+        return box(self.value <= other.value)
 
     def __gt__(self, other):
-        return Value(self.value > other.value)
+        return box(self.value > other.value)
 
     def __ge__(self, other):
-        return Value(self.value >= other.value)
+        return box(self.value >= other.value)
 
     def __add__(self, other):
-        return Value(self.value + other.value)
+        return box(self.value + other.value)
 
     def __sub__(self, other):
-        return Value(self.value - other.value)
+        return box(self.value - other.value)
 
     def __mul__(self, other):
-        return Value(self.value * other.value)
+        return box(self.value * other.value)
 
     def __pow__(self, other):
-        return Value(self.value ** other.value)
+        return box(self.value ** other.value)
 
     def __mod__(self, other):
-        return Value(self.value % other.value)
+        return box(self.value % other.value)
 
     def __truediv__(self, other):
-        return Value(self.value / other.value)
+        return box(self.value / other.value)
 
     def for_json(self):
         return self.value
 
 
+# The range of the ints `box` shares values for.
+SMALL_INT_MIN = -256
+SMALL_INT_MAX = 1024
+
+TRUE = Value(True)
+FALSE = Value(False)
+_small_ints = [Value(i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX)]
+
+
+def box(value) -> Value:
+    """
+    A `Value` of `value` without a position.  The values of booleans and small
+    ints are shared, so arithmetic and comparisons mostly allocate nothing.
+    """
+    kind = type(value)
+    if kind is bool:
+        return TRUE if value else FALSE
+    if kind is int and SMALL_INT_MIN <= value < SMALL_INT_MAX:
+        return _small_ints[value - SMALL_INT_MIN]
+    return Value(value)
+
+
 class Array(Value):
-    def __init__(self, value, position=None):
+    __slots__ = ("normalized", "_hash")
+
+    def __init__(self, value, position=None, normalized: bool = False):
+        """
+        value: the items, a list is turned into a `Vector`
+        normalized: whether all items are already values, see `simplify.py`
+        """
         assert value is not None
+        if not isinstance(value, Vector):
+            assert isinstance(value, list)
+            value = Vector(value)
         super().__init__(value, position=position)
-        assert isinstance(value, list)
+        self.normalized = normalized
+        self._hash = None
 
     def __add__(self, other):
         if not isinstance(other, Array):
             raise Exception(
                 f"Concatenation not defined between array and '{type(other)}'."
             )
-        return Array(self.value + other.value)
+        return Array(
+            self.value + other.value,
+            normalized=self.normalized and other.normalized,
+        )
 
     def for_json(self):
         return [v.for_json() for v in self.value]
 
     def __eq__(self, other):
+        # Shared arrays (see `hashcons.py`) are equal without looking at the items.
+        if self is other:
+            return True
         return from_value(self) == from_value(other)
 
+    def __hash__(self):
+        if self._hash is not None:
+            return self._hash
+        result = hash(structural_key(self))
+        # The items of normalized arrays do not change anymore.
+        if self.normalized:
+            self._hash = result
+        return result
+
     def __str__(self):
         return str(from_value(self))
 
@@ -386,3 +815,26 @@ def from_value(value: Expression):
     elif isinstance(value, Value):
         return value.value
     raise ValueError(f"Not supported: {type(value)}")
+
+
+def structural_key(value: Expression) -> Any:
+    """
+    A hashable key for the normalized `value`, which is the same for values
+    with the same structure.  `Value.__eq__` returns a `Value`, so values
+    themselves can not be used as keys of a `dict`.
+
+    Values of different Python types get different keys (`1` and `1.0` do
+    not), functions are only the same as themselves.
+    """
+    if isinstance(value, Array):
+        return ("array", tuple(structural_key(item) for item in value.value))
+    if isinstance(value, Namespace):
+        return (
+            "namespace",
+            tuple((d.name, structural_key(d.value)) for d in value.definitions),
+        )
+    if isinstance(value, Function):
+        return ("function", value)
+    if isinstance(value, Value):
+        return (type(value.value), value.value)
+    raise ValueError(f"Not supported: {type(value)}")
@@ -1,4 +1,4 @@
-from typing import List, Callable
+from typing import Callable, Dict, FrozenSet, Iterable, List, Tuple
 
 
 class Type:
@@ -23,12 +23,18 @@ class Array(Type):
     def __init__(self, element_type):
         assert element_type is not None
         self.element_type = element_type
+        self._hash = 2 * hash(element_type)
 
     def __eq__(self, other):
-        return isinstance(other, Array) and self.element_type == other.element_type
+        return (
+            self is other
+            or isinstance(other, Array)
+            and self._hash == other._hash
+            and self.element_type == other.element_type
+        )
 
     def __hash__(self):
-        return 2 * hash(self.element_type)
+        return self._hash
 
     def __str__(self):
         return f"Array<{self.element_type}>"
@@ -50,29 +56,77 @@ class Function(Type):
         )
 
     def __hash__(self):
-        return hash(self.parameters) + hash(self.ret)
+        return hash(tuple(self.parameters)) + hash(self.ret)
 
     def __str__(self):
         parameters = ", ".join([str(p) for p in self.parameters])
         return f"Function<{parameters}, {self.ret}>"
 
 
+class Known(Type):
+    """
+    The value of one term of a program: a function definition, a namespace
+    literal or a builtin.  Calls and lookups on it are followed into the term.
+    """
+
+    def __init__(self, term):
+        self.term = term
+
+    def __eq__(self, other):
+        return isinstance(other, Known) and self.term is other.term
+
+    def __hash__(self):
+        return id(self.term)
+
+    def __str__(self):
+        return f"Known<{type(self.term).__name__}>"
+
+    def __repr__(self):
+        return str(self)
+
+
 class Union(Type):
-    def __init__(self, lhs: Type, rhs: Type):
-        self.lhs = lhs
-        self.rhs = rhs
+    """
+    A flat set of at least two types, none of them a union: `Union(a, Union(b, c))`
+    and `Union(c, b, a)` are the same type.  Use `Universe.make_union` to join
+    types that may be `Void`, `Any` or the same.
+    """
+
+    def __init__(self, *types: Type):
+        members = set()
+        for t in types:
+            if isinstance(t, Union):
+                members.update(t.types)
+            else:
+                members.add(t)
+        assert len(members) > 1
+        self.types: FrozenSet[Type] = frozenset(members)
+        self._hash = hash(self.types)
+        self._ordered = None
+
+    @property
+    def ordered(self) -> Tuple[Type, ...]:
+        """
+        The members sorted by name, so that printing a union does not depend on
+        how it was built.
+        """
+        if self._ordered is None:
+            self._ordered = tuple(sorted(self.types, key=str))
+        return self._ordered
 
     def __eq__(self, other):
-        return isinstance(other, Union) and (
-            (self.lhs == other.lhs and self.rhs == other.rhs)
-            or (self.lhs == other.rhs and self.rhs == other.lhs)
+        return (
+            self is other
+            or isinstance(other, Union)
+            and self._hash == other._hash
+            and self.types == other.types
         )
 
     def __hash__(self):
-        return hash(self.lhs) + hash(self.rhs)
+        return self._hash
 
     def __str__(self):
-        return f"({self.lhs} | {self.rhs})"
+        return "(" + " | ".join(str(t) for t in self.ordered) + ")"
 
     def __repr__(self):
         return str(self)
@@ -92,6 +146,11 @@ class Universe:
         self.basic_coercions = {}
         self.add_coercion(Int, Float, float)
         self.add_coercion(Bool, Int, int)
+        self.subtypes: Dict[Tuple[Type, Type], bool] = {}
+        # The joins made so far, and one instance of every union they made, so
+        # that equal unions are mostly the same object and compare quickly.
+        self.unions: Dict[Tuple[Type, Type], Type] = {}
+        self.interned: Dict[Type, Type] = {}
 
     def add_basic_type(self, t: Type):
         assert t != Any
@@ -114,11 +173,39 @@ class Universe:
             return lhs
         if lhs == Any or rhs == Any:
             return Any
-        if self.is_subtype(lhs, rhs):
-            return rhs
-        if self.is_subtype(rhs, lhs):
-            return lhs
-        return Union(lhs, rhs)
+        key = (lhs, rhs)
+        result = self.unions.get(key)
+        if result is None:
+            if self.is_subtype(lhs, rhs):
+                result = rhs
+            elif self.is_subtype(rhs, lhs):
+                result = lhs
+            else:
+                # Flattens the unions on either side.
+                union = Union(lhs, rhs)
+                result = self.interned.setdefault(union, union)
+            self.unions[key] = result
+        return result
+
+    def union_of(self, types: Iterable[Type]) -> Type:
+        """
+        The union of all of `types` at once, which is quicker than joining them
+        one by one when there are many different ones.
+        """
+        members = set()
+        for t in types:
+            if t == Any:
+                return Any
+            if isinstance(t, Union):
+                members.update(t.types)
+            elif t != Void:
+                members.add(t)
+        if not members:
+            return Void
+        if len(members) == 1:
+            return next(iter(members))
+        union = Union(*members)
+        return self.interned.setdefault(union, union)
 
     # def try_coerce(self, value, dst):
     #     coercion = self.try_coercion(value.typ, dst)
@@ -142,10 +229,18 @@ class Universe:
     def is_subtype(self, lhs, rhs):
         if lhs == rhs:
             return True
+        key = (lhs, rhs)
+        result = self.subtypes.get(key)
+        if result is None:
+            result = self._is_subtype(lhs, rhs)
+            self.subtypes[key] = result
+        return result
+
+    def _is_subtype(self, lhs, rhs):
         if isinstance(lhs, Union):
-            return self.is_subtype(lhs.lhs, rhs) and self.is_subtype(lhs.rhs, rhs)
+            return all(self.is_subtype(t, rhs) for t in lhs.types)
         if isinstance(rhs, Union):
-            return self.is_subtype(lhs, rhs.lhs) or self.is_subtype(lhs, rhs.rhs)
+            return lhs in rhs.types or any(self.is_subtype(lhs, t) for t in rhs.types)
         return False
 
 
@@ -156,6 +251,8 @@ Float = BasicType("Float")
 Bool = BasicType("Bool")
 String = BasicType("String")
 
+Number = Union(Int, Float)
+
 EmptyArray = Array(Void)
 
 
@@ -0,0 +1,150 @@
+"""
+A persistent sequence, the items of a `terms.Array`.
+
+The items are kept in chunks of up to `CHUNK` items at the leaves of a
+balanced (AVL) binary tree, whose nodes know the number of items below them.
+Vectors are never changed after they are created, so concatenating two of
+them joins their trees and shares every node but the O(log n) ones along the
+seam.  Building an array one `result + [item]` at a time is O(n log n)
+instead of O(n^2), indexing is O(log n) and the length is stored.
+"""
+import operator
+from typing import Any, Iterable, Iterator, List, Sequence
+
+CHUNK = 32
+
+
+class _Leaf:
+    __slots__ = ("items", "size")
+    height = 0
+
+    def __init__(self, items: tuple):
+        self.items = items
+        self.size = len(items)
+
+
+class _Node:
+    __slots__ = ("left", "right", "size", "height")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.size = left.size + right.size
+        self.height = max(left.height, right.height) + 1
+
+
+def _balance(left, right):
+    """
+    A node of `left` and `right`, whose heights differ by at most 2, rotated
+    so that the heights of its children differ by at most 1.
+    """
+    if left.height > right.height + 1:
+        if left.left.height >= left.right.height:
+            return _Node(left.left, _Node(left.right, right))
+        middle = left.right
+        return _Node(_Node(left.left, middle.left), _Node(middle.right, right))
+    if right.height > left.height + 1:
+        if right.right.height >= right.left.height:
+            return _Node(_Node(left, right.left), right.right)
+        middle = right.left
+        return _Node(_Node(left, middle.left), _Node(middle.right, right.right))
+    return _Node(left, right)
+
+
+def _join(left, right):
+    if left.height == 0 and right.height == 0:
+        if left.size + right.size <= CHUNK:
+            return _Leaf(left.items + right.items)
+        return _Node(left, right)
+    # Goes down to the seam if the trees differ in height, or to merge a
+    # leaf that is not full with the one next to it.
+    if left.height > right.height + 1 or (right.height == 0 and right.size < CHUNK):
+        return _balance(left.left, _join(left.right, right))
+    if right.height > left.height + 1 or (left.height == 0 and left.size < CHUNK):
+        return _balance(_join(left, right.left), right.right)
+    return _Node(left, right)
+
+
+def _build(leaves: List[_Leaf], start: int, stop: int):
+    if stop - start == 1:
+        return leaves[start]
+    middle = (start + stop) // 2
+    return _Node(_build(leaves, start, middle), _build(leaves, middle, stop))
+
+
+class Vector(Sequence):
+    __slots__ = ("root",)
+
+    def __init__(self, items: Iterable[Any] = ()):
+        if isinstance(items, Vector):
+            self.root = items.root
+            return
+        items = tuple(items)
+        if not items:
+            self.root = None
+        elif len(items) <= CHUNK:
+            self.root = _Leaf(items)
+        else:
+            leaves = [_Leaf(items[i : i + CHUNK]) for i in range(0, len(items), CHUNK)]
+            self.root = _build(leaves, 0, len(leaves))
+
+    @classmethod
+    def _from_root(cls, root) -> "Vector":
+        vector = cls.__new__(cls)
+        vector.root = root
+        return vector
+
+    def __len__(self) -> int:
+        return self.root.size if self.root else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Vector(list(self)[index])
+        node = self.root
+        if node is None:
+            raise IndexError("Vector index out of range.")
+        if node.height == 0:
+            return node.items[index]
+        index = operator.index(index)
+        if index < 0:
+            index += node.size
+        if not 0 <= index < node.size:
+            raise IndexError("Vector index out of range.")
+        while node.height:
+            if index < node.left.size:
+                node = node.left
+            else:
+                index -= node.left.size
+                node = node.right
+        return node.items[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.height:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                yield from node.items
+
+    def __add__(self, other) -> "Vector":
+        if not isinstance(other, Vector):
+            other = Vector(other)
+        if self.root is None:
+            return other
+        if other.root is None:
+            return self
+        return Vector._from_root(_join(self.root, other.root))
+
+    def __eq__(self, other):
+        if isinstance(other, (Vector, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Vector({list(self)!r})"
@@ -0,0 +1,658 @@
+"""
+Infers the types of a resolved program, and specializes it for them.
+
+The checker follows the values through the frames the resolver assigned (see
+`resolve.py`): a slot of a block, namespace or call frame has the union of
+the types of all the values ever stored in it.  Function definitions,
+namespace literals and builtins are typed as themselves (`types.Known`), so
+calls and lookups on them are followed into them, and the parameters of a
+function have the types of the arguments of all its calls.  Functions that
+get to code the checker does not see (builtins, or anything of type `Any`)
+may be called with anything, so their parameters are `Any`.  Types only
+grow, and the program is judged again until they stop changing.
+
+`specialize` replaces the operations on numbers, the conditionals on bools
+and the calls of builtins with arguments of the types they take by the terms
+the engines have fast paths for.  Programs with type errors are left as they
+are, and run as before.
+
+The checker remembers the type of every term that reads no slot and reports
+no error, such as literals and arrays of them, and judges it only once.
+`check` types a whole program.
+"""
+from typing import Dict, Iterator, List, Optional
+
+from .syntax import terms, types
+from .syntax.terms import Environment
+from .resolve import resolve
+from .runtime import (
+    ErrorId,
+    ErrorMessage,
+    ParseError,
+    binary_operator_type_map,
+    make_default_environment,
+)
+
+# Programs whose types still change after this many passes are not specialized.
+MAX_PASSES = 32
+# Deeper arrays are typed as `Any`, so recursion can not nest them forever.
+MAX_ARRAY_DEPTH = 8
+
+
+class Cell:
+    """
+    The type of the values of one slot.
+    """
+
+    __slots__ = ("type",)
+
+    def __init__(self):
+        self.type: types.Type = types.Void
+
+
+class TypeFrame:
+    """
+    The cells of the slots of a `terms.Frame`.
+    """
+
+    __slots__ = ("parent", "cells")
+
+    def __init__(self, parent: Optional["TypeFrame"], cells: List[Cell]):
+        self.parent = parent
+        self.cells = cells
+
+
+def members(typ: types.Type) -> Iterator[types.Type]:
+    """
+    The types in the union `typ`, none for `Void`.
+    """
+    if isinstance(typ, types.Union):
+        for member in typ.types:
+            if member != types.Void:
+                yield member
+    elif typ != types.Void:
+        yield typ
+
+
+def _depth(typ: types.Type) -> int:
+    if isinstance(typ, types.Array):
+        return 1 + _depth(typ.element_type)
+    if isinstance(typ, types.Union):
+        return max(_depth(member) for member in typ.types)
+    return 0
+
+
+class TypeChecker:
+    def __init__(self, universe: types.Universe, env: Environment):
+        self.universe = universe
+        self.env = env
+        # The frames of blocks and namespace literals and the call frames of
+        # functions, by the id of the term.
+        self.frames: Dict[int, TypeFrame] = {}
+        # The types functions return, by the id of the definition.
+        self.results: Dict[int, Cell] = {}
+        # The functions and namespaces code the checker does not see can get to.
+        self.escaped: Dict[int, terms.Expression] = {}
+        # The type of every term, from the last pass.
+        self.types: Dict[int, types.Type] = {}
+        # The types of the terms whose type can not change, see `judge`.
+        self.closed: Dict[int, types.Type] = {}
+        self.errors: List[ErrorMessage] = []
+        self.changed = False
+        # Counts the reads and writes of cells, which make a term not closed.
+        self.reads = 0
+
+    def error(self, message: str, position) -> None:
+        self.errors.append(ErrorMessage(ErrorId.TypeMismatch, message, position))
+
+    def infer(self, program) -> bool:
+        """
+        Judges `program` until its types stop changing, returns whether they
+        did within `MAX_PASSES`.  The errors are those of the last pass.
+        """
+        for _ in range(MAX_PASSES):
+            self.changed = False
+            self.errors = []
+            self.types = dict(self.closed)
+            self.judge(program, None)
+            for term in list(self.escaped.values()):
+                self.escape_contents(term)
+            if not self.changed:
+                return True
+        return False
+
+    def judge(self, term, frame: Optional[TypeFrame]) -> types.Type:
+        key = id(term)
+        typ = self.closed.get(key)
+        if typ is not None:
+            return typ
+        reads, errors = self.reads, len(self.errors)
+        typ = getattr(self, f"judge_{type(term).__name__}")(term, frame)
+        if self.reads == reads and len(self.errors) == errors:
+            # Neither reads a cell nor reports an error, so later passes and
+            # other uses of the term would judge it the same.
+            self.closed[key] = typ
+        # Terms shared by the parser are judged in every place they are used.
+        previous = self.types.get(key)
+        self.types[key] = typ if previous is None else self.join(previous, typ)
+        return typ
+
+    def join(self, lhs: types.Type, rhs: types.Type) -> types.Type:
+        if lhs == types.Any or rhs == types.Any:
+            # What is joined into `Any` is not followed anymore.
+            self.escape(lhs)
+            self.escape(rhs)
+            return types.Any
+        return self.universe.make_union(lhs, rhs)
+
+    def join_all(self, typs: List[types.Type]) -> types.Type:
+        if types.Any in typs:
+            for typ in typs:
+                self.escape(typ)
+            return types.Any
+        return self.universe.union_of(typs)
+
+    def assign(self, cell: Cell, typ: types.Type) -> None:
+        self.reads += 1
+        new = self.join(cell.type, typ)
+        if new != cell.type:
+            cell.type = new
+            self.changed = True
+
+    def array(self, element: types.Type) -> types.Type:
+        if _depth(element) >= MAX_ARRAY_DEPTH:
+            self.escape(element)
+            return types.Any
+        return types.Array(element)
+
+    def escape(self, typ: types.Type) -> None:
+        for member in members(typ):
+            if isinstance(member, types.Array):
+                self.escape(member.element_type)
+            elif (
+                isinstance(member, types.Known) and id(member.term) not in self.escaped
+            ):
+                term = member.term
+                self.escaped[id(term)] = term
+                call = self.frames.get(id(term))
+                if isinstance(term, terms.FunctionDefinition) and call is not None:
+                    for cell in call.cells[: len(term.parameters)]:
+                        self.assign(cell, types.Any)
+                self.escape_contents(term)
+
+    def escape_contents(self, term) -> None:
+        """
+        Lets escape what unknown code gets from an escaped `term`.
+        """
+        if isinstance(term, terms.FunctionDefinition):
+            if id(term) in self.results:
+                self.escape(self.results[id(term)].type)
+        elif id(term) in self.frames:
+            for cell in self.frames[id(term)].cells:
+                self.escape(cell.type)
+
+    def frame(self, term, parent: Optional[TypeFrame], size: int) -> TypeFrame:
+        self.reads += 1
+        frame = self.frames.get(id(term))
+        if frame is None:
+            frame = TypeFrame(parent, [Cell() for _ in range(size)])
+            self.frames[id(term)] = frame
+        return frame
+
+    def value_type(self, value) -> types.Type:
+        """
+        The type of a value that is already computed.
+        """
+        if type(value) is terms.Value:
+            kind = type(value.value)
+            if kind is bool:
+                return types.Bool
+            if kind is int:
+                return types.Int
+            if kind is float:
+                return types.Float
+            if kind is str:
+                return types.String
+            return types.Any
+        if isinstance(value, terms.Array) and value.normalized:
+            data = getattr(value, "data", None)
+            if data is not None:
+                # A `numeric.NumericArray`.
+                return types.Array(types.Int if data.dtype.kind == "i" else types.Float)
+            return self.array(self.join_all([self.value_type(i) for i in value.value]))
+        if isinstance(value, (terms.Namespace, terms.FunctionDefinition)):
+            return types.Known(value)
+        return types.Any
+
+    def lookup(self, ns: types.Type, name: str, position) -> types.Type:
+        result = types.Void
+        for member in members(ns):
+            if member == types.Any:
+                typ = types.Any
+            elif isinstance(member, types.Known) and isinstance(
+                member.term, terms.Namespace
+            ):
+                typ = self._lookup(member.term, name, position)
+            else:
+                self.error(f"Can not look up '{name}' in a '{member}'.", position)
+                typ = types.Any
+            result = self.join(result, typ)
+        return result
+
+    def _lookup(self, ns: terms.Namespace, name: str, position) -> types.Type:
+        frame = self.frames.get(id(ns))
+        if frame is None:
+            # A namespace the program gets from the environment.
+            if not ns.has(name):
+                self.error(f"The namespace does not define '{name}'.", position)
+                return types.Any
+            return self.value_type(ns.lookup(name))
+        self.reads += 1
+        slot = ns.shape.slots.get(name)
+        if slot is None:
+            self.error(f"The namespace does not define '{name}'.", position)
+            return types.Any
+        return frame.cells[slot].type
+
+    def judge_Value(self, value, frame):
+        return self.value_type(value)
+
+    judge_NumericArray = judge_Value
+
+    def judge_Array(self, array, frame):
+        if array.normalized:
+            return self.value_type(array)
+        return self.array(self.join_all([self.judge(i, frame) for i in array.value]))
+
+    judge_NumericArray = judge_Array
+
+    def judge_Function(self, function, frame):
+        return types.Any
+
+    def judge_Variable(self, var, frame):
+        # Only globals are left as variables by the resolver.
+        return self.value_type(self.env.find_symbol(var.name, None))
+
+    def judge_Bound(self, bound, frame):
+        self.reads += 1
+        for _ in range(bound.depth):
+            frame = frame.parent
+        return frame.cells[bound.index].type
+
+    def judge_Block(self, block, frame):
+        if not block.statements:
+            return self.judge(block.expression, frame)
+        new = self.frame(block, frame, block.size)
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                value = self.judge(statement.expression, new)
+                self.assign(new.cells[statement.index], value)
+            elif isinstance(statement, terms.Import):
+                ns = self.judge(statement.program, None)
+                for name, index in statement.slots:
+                    value = self.lookup(ns, name, statement.position)
+                    self.assign(new.cells[index], value)
+            else:
+                self.judge(statement, new)
+        return self.judge(block.expression, new)
+
+    def judge_Import(self, expr, frame):
+        # Imported programs only see the globals.
+        return self.judge(expr.program, None)
+
+    def judge_Bang(self, bang, frame):
+        self.judge(bang.expression, frame)
+        return types.Void
+
+    def judge_Namespace(self, ns, frame):
+        new = self.frame(ns, frame, len(ns.definitions))
+        for index, definition in enumerate(ns.definitions):
+            self.assign(new.cells[index], self.judge(definition.value, new))
+        return types.Known(ns)
+
+    def judge_FunctionDefinition(self, definition, frame):
+        if definition.is_builtin:
+            return types.Known(definition)
+        self.reads += 1
+        call = self.frames.get(id(definition))
+        if call is None:
+            # Mirrors `terms.capture`.
+            if definition.captures is None:
+                parent = frame
+            else:
+                cells = []
+                for depth, index in definition.captures:
+                    source = frame
+                    for _ in range(depth):
+                        source = source.parent
+                    cells.append(source.cells[index])
+                parent = TypeFrame(frame if definition.linked else None, cells)
+            # The parameters, followed by `this`.
+            cells = [Cell() for _ in definition.parameters] + [Cell()]
+            cells[-1].type = types.Known(definition)
+            call = TypeFrame(parent, cells)
+            self.frames[id(definition)] = call
+            self.results[id(definition)] = Cell()
+        self.assign(self.results[id(definition)], self.judge(definition.body, call))
+        return types.Known(definition)
+
+    def judge_Call(self, call, frame):
+        callee = self.judge(call.expression, frame)
+        arguments = [self.judge(arg, frame) for arg in call.arguments]
+        result = types.Void
+        for member in members(callee):
+            result = self.join(result, self.apply(member, arguments, call.position))
+        return result
+
+    def apply(self, callee: types.Type, arguments: List[types.Type], position):
+        if callee == types.Any:
+            for argument in arguments:
+                self.escape(argument)
+            return types.Any
+        if not isinstance(callee, types.Known) or not isinstance(
+            callee.term, terms.FunctionDefinition
+        ):
+            self.error(f"Expected a function, not a '{callee}'.", position)
+            return types.Any
+        definition = callee.term
+        if len(definition.parameters) != len(arguments):
+            self.error(
+                f"The function takes {len(definition.parameters)} arguments, not {len(arguments)}.",
+                position,
+            )
+            return types.Any
+        call = self.frames.get(id(definition))
+        if call is None:
+            # A builtin, or a function the program did not define.
+            if types.Void in arguments:
+                return types.Void
+            signature = definition.typ
+            if signature is not None and all(
+                self.universe.is_subtype(argument, parameter)
+                for argument, parameter in zip(arguments, signature.parameters)
+            ):
+                return signature.ret
+            for argument in arguments:
+                self.escape(argument)
+            return types.Any
+        self.reads += 1
+        for cell, argument in zip(call.cells, arguments):
+            self.assign(cell, argument)
+        return self.results[id(definition)].type
+
+    def judge_IfThenElse(self, expr, frame):
+        test = self.judge(expr.test, frame)
+        for member in members(test):
+            if member != types.Bool and member != types.Any:
+                self.error(f"Expected a bool, not a '{member}'.", expr.position)
+        true = self.judge(expr.true, frame)
+        false = self.judge(expr.false, frame)
+        return self.join(true, false)
+
+    def judge_BinaryOperation(self, expr, frame):
+        lhs = self.judge(expr.lhs, frame)
+        rhs = self.judge(expr.rhs, frame)
+        result = types.Void
+        for left in members(lhs):
+            for right in members(rhs):
+                typ = self.operation(expr.op, left, right, expr.position)
+                result = self.join(result, typ)
+        return result
+
+    def operation(self, op: str, lhs: types.Type, rhs: types.Type, position):
+        if lhs == types.Any or rhs == types.Any or op not in terms.binary_operators:
+            # The elementwise operators, among others.
+            return types.Any
+        basic = self.universe.basic_types
+        if lhs in basic and rhs in basic:
+            typ = binary_operator_type_map.get((op, lhs, rhs))
+            if typ is not None:
+                return typ
+        elif (
+            op == "+" and isinstance(lhs, types.Array) and isinstance(rhs, types.Array)
+        ):
+            return self.array(self.join(lhs.element_type, rhs.element_type))
+        elif op == "==":
+            return types.Any
+        self.error(
+            f"The operator '{op}' is not defined on '{lhs}' and '{rhs}'.", position
+        )
+        return types.Any
+
+    def judge_UnaryOperation(self, expr, frame):
+        operand = self.judge(expr.expression, frame)
+        if expr.op not in ("+", "-"):
+            return types.Any
+        for member in members(operand):
+            if member not in (types.Int, types.Float, types.Any):
+                self.error(
+                    f"The operator '{expr.op}' is not defined on '{member}'.",
+                    expr.position,
+                )
+                return types.Any
+        return operand
+
+    def judge_Index(self, index, frame):
+        lhs = self.judge(index.lhs, frame)
+        rhs = self.judge(index.rhs, frame)
+        for member in members(rhs):
+            if member != types.Int and member != types.Any:
+                self.error(f"Can not index with a '{member}'.", index.position)
+        result = types.Void
+        for member in members(lhs):
+            if isinstance(member, types.Array):
+                result = self.join(result, member.element_type)
+            else:
+                if member != types.Any:
+                    self.error(f"Can not index a '{member}'.", index.position)
+                result = self.join(result, types.Any)
+        return result
+
+    def judge_Lookup(self, lookup, frame):
+        ns = self.judge(lookup.expression, frame)
+        return self.lookup(ns, lookup.var.name, lookup.position)
+
+
+def _pure(term) -> bool:
+    """
+    Whether evaluating `term` can be left out without changing the program.
+    """
+    if isinstance(term, (terms.Bound, terms.Variable)):
+        return True
+    return isinstance(term, terms.Lookup) and _pure(term.expression)
+
+
+class Specializer:
+    """
+    Rebuilds the terms that have fast paths for their types, and the terms
+    around them.  Terms with nothing to change are kept as they are.
+    """
+
+    def __init__(self, checker: TypeChecker):
+        self.types = checker.types
+        self.universe = checker.universe
+        self.imports: Dict[int, terms.Expression] = {}
+
+    def typ(self, term) -> types.Type:
+        return self.types.get(id(term), types.Void)
+
+    def proves(self, term, typ: types.Type) -> bool:
+        actual = self.typ(term)
+        return actual != types.Void and self.universe.is_subtype(actual, typ)
+
+    def specialize(self, term):
+        method = getattr(self, f"specialize_{type(term).__name__}", None)
+        return term if method is None else method(term)
+
+    def specialize_Block(self, block):
+        statements = []
+        for statement in block.statements:
+            if isinstance(statement, terms.Assignment):
+                expression = self.specialize(statement.expression)
+                if expression is not statement.expression:
+                    statement = terms.Assignment(
+                        statement.name,
+                        expression,
+                        position=statement.position,
+                        index=statement.index,
+                    )
+            elif isinstance(statement, terms.Import):
+                statement = self.specialize_Import(statement)
+            else:
+                statement = self.specialize(statement)
+            statements.append(statement)
+        expression = self.specialize(block.expression)
+        if expression is block.expression and all(
+            new is old for new, old in zip(statements, block.statements)
+        ):
+            return block
+        return terms.Block(
+            statements, expression, position=block.position, size=block.size
+        )
+
+    def specialize_Import(self, statement):
+        # Imports of the same file share the program.
+        program = self.imports.get(id(statement.program))
+        if program is None:
+            program = self.specialize(statement.program)
+            self.imports[id(statement.program)] = program
+        if program is statement.program:
+            return statement
+        return terms.Import(
+            statement.path, program, position=statement.position, slots=statement.slots
+        )
+
+    def specialize_Bang(self, bang):
+        expression = self.specialize(bang.expression)
+        if expression is bang.expression:
+            return bang
+        return terms.Bang(expression, position=bang.position)
+
+    def specialize_Namespace(self, ns):
+        definitions = []
+        for d in ns.definitions:
+            value = self.specialize(d.value)
+            if value is not d.value:
+                d = terms.NamespaceDefinition(d.name, value, position=d.position)
+            definitions.append(d)
+        if all(new is old for new, old in zip(definitions, ns.definitions)):
+            return ns
+        return terms.Namespace(definitions, position=ns.position)
+
+    def specialize_FunctionDefinition(self, definition):
+        if definition.is_builtin:
+            return definition
+        body = self.specialize(definition.body)
+        if body is definition.body:
+            return definition
+        return terms.FunctionDefinition(
+            definition.parameters,
+            body,
+            builtin=False,
+            position=definition.position,
+            captures=definition.captures,
+            linked=definition.linked,
+        )
+
+    def specialize_Call(self, call):
+        expression = self.specialize(call.expression)
+        arguments = [self.specialize(arg) for arg in call.arguments]
+        callee = self.typ(call.expression)
+        if (
+            isinstance(callee, types.Known)
+            and isinstance(callee.term, terms.FunctionDefinition)
+            and callee.term.unchecked is not None
+            and _pure(call.expression)
+            and len(arguments) == len(callee.term.typ.parameters)
+            and all(
+                self.proves(arg, parameter)
+                for arg, parameter in zip(call.arguments, callee.term.typ.parameters)
+            )
+        ):
+            return terms.UncheckedCall(
+                expression, arguments, callee.term, position=call.position
+            )
+        if expression is call.expression and all(
+            new is old for new, old in zip(arguments, call.arguments)
+        ):
+            return call
+        return terms.Call(expression, arguments, position=call.position)
+
+    def specialize_IfThenElse(self, expr):
+        test = self.specialize(expr.test)
+        true = self.specialize(expr.true)
+        false = self.specialize(expr.false)
+        if self.proves(expr.test, types.Bool):
+            return terms.TypedIfThenElse(test, true, false, position=expr.position)
+        if test is expr.test and true is expr.true and false is expr.false:
+            return expr
+        return terms.IfThenElse(test, true, false, position=expr.position)
+
+    def specialize_BinaryOperation(self, expr):
+        lhs = self.specialize(expr.lhs)
+        rhs = self.specialize(expr.rhs)
+        if (
+            expr.function is not None
+            and self.proves(expr.lhs, types.Number)
+            and self.proves(expr.rhs, types.Number)
+        ):
+            return terms.NumericOperation(expr.op, lhs, rhs, position=expr.position)
+        if lhs is expr.lhs and rhs is expr.rhs:
+            return expr
+        return terms.BinaryOperation(expr.op, lhs, rhs, position=expr.position)
+
+    def specialize_UnaryOperation(self, expr):
+        expression = self.specialize(expr.expression)
+        if expression is expr.expression:
+            return expr
+        return terms.UnaryOperation(expr.op, expression, position=expr.position)
+
+    def specialize_Index(self, index):
+        lhs = self.specialize(index.lhs)
+        rhs = self.specialize(index.rhs)
+        if lhs is index.lhs and rhs is index.rhs:
+            return index
+        return terms.Index(lhs, rhs, position=index.position)
+
+    def specialize_Lookup(self, lookup):
+        expression = self.specialize(lookup.expression)
+        if expression is lookup.expression:
+            return lookup
+        return terms.Lookup(expression, lookup.var, position=lookup.position)
+
+    def specialize_Array(self, array):
+        if array.normalized:
+            return array
+        items = [self.specialize(item) for item in array.value]
+        if all(new is old for new, old in zip(items, array.value)):
+            return array
+        return terms.Array(items, position=array.position)
+
+    specialize_NumericArray = specialize_Array
+
+
+def specialize(program, env: Environment) -> terms.Expression:
+    """
+    The resolved `program` with the fast paths its types allow, or `program`
+    itself if it does not type check.
+    """
+    checker = TypeChecker(types.Universe(), env)
+    if not checker.infer(program) or checker.errors:
+        return program
+    return Specializer(checker).specialize(program)
+
+
+def check(program, env: Optional[Environment] = None) -> types.Type:
+    """
+    The type of the parsed `program`, `Any` if its types do not settle within
+    `MAX_PASSES`.  Raises a `ParseError` listing the unbound names or the type
+    errors.
+    """
+    env = make_default_environment() if env is None else env
+    checker = TypeChecker(types.Universe(), env)
+    program = resolve(program, env)
+    if not checker.infer(program):
+        return types.Any
+    if checker.errors:
+        raise ParseError(checker.errors)
+    return checker.types[id(program)]
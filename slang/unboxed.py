@@ -0,0 +1,126 @@
+"""
+The tree walking `Runner`, without the `terms.Value` around primitives.
+
+Ints, floats, bools and strings flow through the evaluation as plain Python
+objects, so arithmetic and comparisons are a single call of the operator and
+allocate nothing.  They are only wrapped into `Value`s where they leave the
+evaluation: for builtins, inside arrays and namespaces, and in the result
+returned by `run`.  Values coming in from there are unwrapped again.
+"""
+from typing import Any, List
+
+from .syntax import terms
+from .syntax.terms import Environment
+from . import numeric
+from .runtime import Runner, TailCall, evaluate_binary_expression
+
+PRIMITIVES = frozenset((int, float, bool, str))
+
+
+def wrap(value):
+    """
+    `value` as a term, wrapping primitives into (mostly shared) `Value`s.
+    """
+    if type(value) in PRIMITIVES:
+        return terms.box(value)
+    return value
+
+
+def unwrap(term):
+    """
+    The primitive in `term`, if it is a `Value` of one, `term` otherwise.
+    """
+    if type(term) is terms.Value and type(term.value) in PRIMITIVES:
+        return term.value
+    return term
+
+
+class UnboxedRunner(Runner):
+    """
+    Has the same interface as `Runner`: `run` and `call` take and return terms.
+    """
+
+    def run(self, program, env: Environment):
+        return wrap(self.evaluate(program, env))
+
+    def evaluate(self, program, env: Environment):
+        program = self.walk(program, env)
+        while type(program) not in PRIMITIVES and not program.is_value():
+            if isinstance(program, TailCall):
+                env = program.env
+                program = program.expression
+            program = self.walk(program, env)
+        # Arrays handed in by builtins may still hold expressions.
+        if isinstance(program, terms.Array) and not program.normalized:
+            program = self.walk(program, env)
+        return program
+
+    def call(self, function: terms.Function, arguments: List[Any], env: Environment):
+        definition = function.definition
+        if definition.is_builtin:
+            return wrap(self.apply_builtin(definition, list(arguments), env))
+        # The parameters, followed by `this`.
+        values = [unwrap(argument) for argument in arguments]
+        frame = terms.Frame(function.environment, values + [function])
+        return wrap(self.evaluate(definition.body, frame))
+
+    def apply_builtin(self, definition, arguments: List[Any], env: Environment):
+        arguments = [wrap(argument) for argument in arguments]
+        return self.evaluate(definition.body(self, env, arguments), env)
+
+    def bind_imports(self, statement, ns: terms.Namespace, frame: terms.Frame):
+        for name, index in statement.slots:
+            frame.slots[index] = unwrap(ns.lookup(name))
+
+    def walk_Value(self, value, env: Environment):
+        if type(value) is terms.Value and type(value.value) in PRIMITIVES:
+            return value.value
+        return value
+
+    def walk_int(self, value, env: Environment):
+        return value
+
+    walk_float = walk_str = walk_int
+
+    def walk_IfThenElse(self, expr, env: Environment):
+        test = self.evaluate(expr.test, env)
+        if test is True:
+            return TailCall(expr.true, env)
+        elif test is False:
+            return TailCall(expr.false, env)
+        raise Exception(f"Expected a bool, not a '{type(test)}'.")
+
+    def walk_TypedIfThenElse(self, expr, env: Environment):
+        if self.evaluate(expr.test, env):
+            return TailCall(expr.true, env)
+        return TailCall(expr.false, env)
+
+    def walk_Array(self, array, env: Environment):
+        if array.normalized:
+            return array
+        items = [wrap(self.evaluate(item, env)) for item in array.value]
+        return numeric.pack(items, position=array.position)
+
+    def walk_Namespace(self, ns, env: Environment):
+        new = terms.Frame(env, [None] * len(ns.definitions))
+        for index, definition in enumerate(ns.definitions):
+            new.slots[index] = self.evaluate(definition.value, new)
+        return terms.Namespace.record(ns.shape, [wrap(value) for value in new.slots])
+
+    def walk_BinaryOperation(self, expr, env: Environment):
+        lhs = self.evaluate(expr.lhs, env)
+        rhs = self.evaluate(expr.rhs, env)
+        if expr.function is None:
+            return unwrap(evaluate_binary_expression(expr.op, wrap(lhs), wrap(rhs)))
+        return expr.function(lhs, rhs)
+
+    def walk_NumericOperation(self, expr, env: Environment):
+        return expr.function(self.evaluate(expr.lhs, env), self.evaluate(expr.rhs, env))
+
+    def walk_Index(self, index, env: Environment):
+        lhs = self.evaluate(index.lhs, env)
+        rhs = self.evaluate(index.rhs, env)
+        value = lhs.value[rhs]
+        if isinstance(lhs, terms.Array) and lhs.normalized:
+            return unwrap(value)
+        return self.evaluate(value, env)
@@ -0,0 +1,168 @@
+import os
+import sys
+import tempfile
+import subprocess
+from unittest import TestCase, mock, skipUnless
+
+from slang import astcache
+from slang.runtime import make_default_environment, run_file, run_program
+
+env = make_default_environment()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the program in argv[1] and prints its value, and whether tatsu was needed.
+LOAD = """
+import sys
+from slang import astcache
+from slang.runtime import make_default_environment, run_program
+env = make_default_environment()
+program = astcache.load_file(sys.argv[1], env)
+print(run_program(program, env).for_json(), "tatsu" in sys.modules)
+"""
+
+
+def _write(path, source):
+    with open(path, "w") as f:
+        f.write(source)
+
+
+def _run(path):
+    return run_program(astcache.load_file(path, env), env).for_json()
+
+
+def _entries(directory):
+    return sorted(os.listdir(os.path.join(directory, astcache.DIRECTORY)))
+
+
+class TestAstCache(TestCase):
+    def test_load_file_uses_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "let x = 6; x * 7")
+            self.assertEqual(_run(path), 42)
+            [entry] = _entries(directory)
+            self.assertTrue(entry.startswith("program.slang."))
+            entry = os.path.join(directory, astcache.DIRECTORY, entry)
+            written = os.stat(entry).st_mtime_ns
+
+            self.assertEqual(_run(path), 42)
+            self.assertEqual(os.stat(entry).st_mtime_ns, written)
+
+            _write(path, "let x = 6; x * 8 + 1")
+            self.assertEqual(_run(path), 49)
+            self.assertEqual(len(_entries(directory)), 1)
+
+    def test_imports_invalidate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.slang")
+            _write(library, "namespace { twice = function(x) x * 2; }")
+            path = os.path.join(directory, "program.slang")
+            _write(path, f'import "{library}"; twice(21)')
+            self.assertEqual(_run(path), 42)
+            _write(library, "namespace { twice = function(x) x + x + 1; }")
+            self.assertEqual(_run(path), 43)
+
+    def test_options_have_entries_of_their_own(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "[1, 2] + [1, 2]")
+            with_positions = astcache.load_file(path, env)
+            without = astcache.load_file(path, env, positions=False, threshold=0)
+            self.assertIsNotNone(with_positions.position)
+            self.assertIsNone(without.position)
+            self.assertEqual(len(_entries(directory)), 2)
+
+    def test_broken_entries_are_replaced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "let x = 6; x * 7")
+            options = (True, False, 0, False)
+            entry = astcache.cache_path(path, options)
+            for data in (b"", b"garbage", astcache.MAGIC + b"garbage"):
+                os.makedirs(os.path.dirname(entry), exist_ok=True)
+                with open(entry, "wb") as f:
+                    f.write(data)
+                self.assertEqual(
+                    run_program(astcache.load_file(path, env, threshold=0), env).value,
+                    42,
+                )
+                header = astcache._header(options, astcache.digest("let x = 6; x * 7"))
+                astcache.load(entry, header)
+            with self.assertRaises(ValueError):
+                astcache.load(entry, header[:-1] + ("0" * 64,))
+
+    @skipUnless(hasattr(os, "getuid"), "needs the owners of files")
+    def test_entries_of_others_are_not_loaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "let x = 6; x * 7")
+            options = (True, False, 0, False)
+            entry = astcache.cache_path(path, options)
+            header = astcache._header(options, astcache.digest("let x = 6; x * 7"))
+            astcache.load_file(path, env, threshold=0)
+            astcache.load(entry, header)
+
+            os.chmod(entry, 0o666)
+            with self.assertRaises(ValueError):
+                astcache.load(entry, header)
+            os.chmod(entry, 0o600)
+            with mock.patch.object(os, "getuid", lambda: os.stat(entry).st_uid + 1):
+                with self.assertRaises(ValueError):
+                    astcache.load(entry, header)
+                self.assertEqual(
+                    run_program(astcache.load_file(path, env, threshold=0), env).value,
+                    42,
+                )
+
+    def test_cold_start_does_not_parse(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(
+                path,
+                'import "prelude.slang"; let square = function(x) x * x; '
+                "range(0, 4, 1).each(square)",
+            )
+            self.assertEqual(_run(path), [0, 1, 4, 9])
+            output = subprocess.run(
+                [sys.executable, "-c", LOAD, path],
+                cwd=ROOT,
+                env=dict(os.environ, PYTHONPATH=ROOT),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            self.assertEqual(output.split(), ["[0,", "1,", "4,", "9]", "False"])
+
+    def test_concurrent_writers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "let f = function(x) x * 2; [f(1), f(2)]")
+            processes = [
+                subprocess.Popen(
+                    [sys.executable, "-c", LOAD, path],
+                    cwd=ROOT,
+                    env=dict(os.environ, PYTHONPATH=ROOT),
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                for _ in range(4)
+            ]
+            for process in processes:
+                output, _ = process.communicate()
+                self.assertEqual(process.returncode, 0)
+                self.assertTrue(output.startswith("[2, 4]"))
+            # Only the entry, no temporary files.
+            self.assertEqual(len(_entries(directory)), 1)
+            self.assertEqual(_run(path), [2, 4])
+
+    def test_run_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            _write(path, "let x = 6; x * 7")
+            self.assertEqual(run_file(path, env).value, 42)
+            self.assertFalse(
+                os.path.exists(os.path.join(directory, astcache.DIRECTORY))
+            )
+            self.assertEqual(run_file(path, env, cache=True).value, 42)
+            self.assertEqual(len(_entries(directory)), 1)
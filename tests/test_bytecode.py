@@ -0,0 +1,83 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from tests import test_slang
+from slang import bytecode
+from slang.resolve import resolve
+from slang.runtime import make_default_environment, parse_string, run_file
+
+env = make_default_environment()
+
+
+class TestBytecodeEngine(test_slang.TestSlang):
+    engine = "bytecode"
+
+    def test_matches_runner(self):
+        for path in ("examples/factorial.slang", "test.slang"):
+            self.assertEqual(
+                run_file(path, env, engine="bytecode").for_json(),
+                run_file(path, env).for_json(),
+            )
+
+    def test_tail_calls_run_in_constant_stack(self):
+        program = parse_string(
+            """
+            let loop = function(n, acc) if n == 0 then acc else this(n - 1, acc + n);
+            loop(5000, 0)
+            """,
+            env,
+        )
+        code = bytecode.compile_program(resolve(program, env))
+        self.assertEqual(bytecode.VirtualMachine().execute(code, env).value, 12502500)
+
+    def test_code_is_compiled_once(self):
+        vm = bytecode.VirtualMachine()
+        program = resolve(parse_string("let f = function(x) x + 1; f", env), env)
+        definition = program.statements[0].expression
+        self.assertIs(vm._body(definition), vm._body(definition))
+        term = resolve(parse_string("[1, 2][0] + 1", env), env)
+        with mock.patch.object(
+            bytecode, "compile_program", wraps=bytecode.compile_program
+        ) as compile_program:
+            for _ in range(3):
+                self.assertEqual(vm.run(term, env).value, 2)
+        self.assertEqual(compile_program.call_count, 1)
+
+
+class TestSerialization(TestCase):
+    def test_round_trip(self):
+        program = parse_string(
+            'import "prelude.slang"; zip([1.5, 2], ["a", true]).map(function(x) x[1])',
+            env,
+        )
+        code, dependencies = bytecode.loads(
+            bytecode.dumps(
+                bytecode.compile_program(resolve(program, env)), [("x", 1, 2)]
+            )
+        )
+        self.assertEqual(dependencies, (("x", 1, 2),))
+        result = bytecode.VirtualMachine().execute(code, env)
+        self.assertEqual(result.for_json(), ["a", True])
+
+    def test_rejects_other_versions(self):
+        data = bytecode.dumps(bytecode.compile_program(parse_string("1", env)))
+        with self.assertRaises(ValueError):
+            bytecode.loads(data.replace(bytecode.MAGIC, b"SLANGX", 1))
+
+    def test_load_file_uses_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.slang")
+            with open(path, "w") as f:
+                f.write("let x = 6; x * 7")
+            code = bytecode.load_file(path, env)
+            self.assertTrue(os.path.exists(path + "c"))
+            self.assertEqual(bytecode.VirtualMachine().execute(code, env).value, 42)
+
+            cached = bytecode.load_file(path, env)
+            self.assertEqual(cached.instructions, code.instructions)
+
+            with open(path, "w") as f:
+                f.write("let x = 6; x * 8 + 1")
+            code = bytecode.load_file(path, env)
+            self.assertEqual(bytecode.VirtualMachine().execute(code, env).value, 49)
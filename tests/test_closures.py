@@ -0,0 +1,26 @@
+from tests import test_slang
+from slang.runtime import make_default_environment, run_file, run_string
+
+env = make_default_environment()
+
+
+class TestClosureEngine(test_slang.TestSlang):
+    engine = "closure"
+
+    def test_matches_runner(self):
+        for path in ("examples/factorial.slang", "test.slang"):
+            self.assertEqual(
+                run_file(path, env, engine="closure").for_json(),
+                run_file(path, env).for_json(),
+            )
+
+    def test_recursive_sum(self):
+        result = run_string(
+            """
+        let f = function(x) if x == 0 then 0 else x + this(x - 1);
+        [f(3), f(4)]
+        """,
+            env,
+            engine="closure",
+        )
+        self.assertEqual(result.for_json(), [6, 10])
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import importlib.util
+from unittest import TestCase, mock
+
+from slang import codegen
+from slang.slang import main
+from slang.runtime import make_default_environment, parse_string, run_file
+
+env = make_default_environment()
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location("generated", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run(source):
+    namespace = {}
+    exec(codegen.generate(parse_string(source, env)), namespace)
+    return namespace["run"]()
+
+
+class TestCodegen(TestCase):
+    def test_programs_match_run_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in ("examples/factorial.slang", "test.slang"):
+                out_path = os.path.join(directory, "module.py")
+                codegen.compile_file(path, out_path)
+                self.assertEqual(
+                    _load(out_path).run().for_json(), run_file(path, env).for_json()
+                )
+
+    def test_closures_and_this(self):
+        result = _run(
+            """
+        let g = function(x) {
+            let f = this;
+            function() if x <= 0 then x else f(x-1)()
+        };
+        [g(-1)(), g(0)(), g(1)(), builtins::nslib::has(namespace { a = 1; }, "a")]
+        """
+        )
+        self.assertEqual(result.for_json(), [-1, 0, 0, True])
+
+    def test_blocks_in_branches_keep_evaluation_order(self):
+        result = _run(
+            """
+        let f = function(x) [x, if x < 2 then { let y = x * 10; y + 1 } else { let z = 0; z }];
+        [f(1), f(3)]
+        """
+        )
+        self.assertEqual(result.for_json(), [[1, 11], [3, 0]])
+
+    def test_unknown_names_are_rejected(self):
+        with self.assertRaises(codegen.CodegenError):
+            codegen.generate(parse_string("let x = 1; y", env))
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as directory:
+            out_path = os.path.join(directory, "factorial_slang.py")
+            argv = ["slang", "compile", "examples/factorial.slang", "-o", out_path]
+            with mock.patch.object(sys, "argv", argv):
+                main()
+            self.assertEqual(_load(out_path).run().value, 5040)
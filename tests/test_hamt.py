@@ -0,0 +1,101 @@
+import random
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.syntax.hamt import Map
+
+
+class Colliding:
+    """
+    A key whose hash is the same as that of other keys.
+    """
+
+    def __init__(self, name, hash):
+        self.name = name
+        self.hash = hash
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and self.name == other.name
+
+
+class TestMap(TestCase):
+    def test_against_dict(self):
+        rng = random.Random(0)
+        expected = {}
+        result = Map()
+        for step in range(5000):
+            key = rng.randrange(1000) * (-1) ** step
+            if rng.random() < 0.3:
+                expected.pop(key, None)
+                result = result.delete(key)
+            else:
+                expected[key] = step
+                result = result.set(key, step)
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(dict(result.items()), expected)
+        for key in range(-1000, 1000):
+            self.assertEqual(result.get(key), expected.get(key))
+            self.assertEqual(key in result, key in expected)
+
+    def test_persistence(self):
+        first = Map((str(i), i) for i in range(100))
+        second = first.set("0", "zero").delete("1")
+        self.assertEqual(first["0"], 0)
+        self.assertEqual(first["1"], 1)
+        self.assertEqual(second["0"], "zero")
+        self.assertNotIn("1", second)
+        self.assertEqual((len(first), len(second)), (100, 99))
+        with self.assertRaises(KeyError):
+            second["1"]
+
+    def test_collisions(self):
+        keys = [Colliding(i, 7) for i in range(3)] + [Colliding(3, 7 + 32)]
+        result = Map((key, key.name) for key in keys)
+        self.assertEqual([result[key] for key in keys], [0, 1, 2, 3])
+        result = result.delete(keys[0]).delete(keys[1])
+        self.assertEqual(sorted(result.items(), key=lambda item: item[1])[0][1], 2)
+        self.assertEqual(len(result), 2)
+        self.assertNotIn(keys[0], result)
+        self.assertEqual(result[keys[3]], 3)
+
+
+def _namespace(pairs):
+    return terms.Namespace(
+        [terms.NamespaceDefinition(name, terms.Value(value)) for name, value in pairs]
+    )
+
+
+class TestNamespace(TestCase):
+    def test_large_namespaces(self):
+        ns = _namespace((f"key{i}", i) for i in range(2000))
+        other = _namespace([("key5", "five"), ("extra", 1), ("extra", 2)])
+        combined = ns.combine(other)
+        self.assertEqual(combined.lookup("key5").value, "five")
+        self.assertEqual(combined.lookup("key1999").value, 1999)
+        self.assertEqual(combined.lookup("extra").value, 2)
+        removed = combined.remove("key7")
+        self.assertFalse(removed.has("key7"))
+        self.assertTrue(combined.has("key7"))
+        self.assertEqual(
+            list(removed.for_json())[:4], ["key5", "extra", "key0", "key1"]
+        )
+        self.assertEqual(len(removed.definitions), 2000)
+
+    def test_same_as_lists(self):
+        small = _namespace([("a", 1), ("b", 2), ("a", 3)])
+        self.assertEqual(small.lookup("a").value, 3)
+        self.assertEqual(small.combine(small).for_json(), {"a": 3, "b": 2})
+        self.assertEqual(small.remove("a").for_json(), {"b": 2})
+        self.assertEqual(small.remove("c").for_json(), {"a": 3, "b": 2})
+        with self.assertRaises(Exception):
+            small.remove("a").lookup("a")
+
+    def test_repeated_combines(self):
+        ns = _namespace((f"key{i}", i) for i in range(100))
+        for i in range(1000):
+            ns = ns.combine(_namespace([("key0", i)]))
+        self.assertEqual(ns.lookup("key0").value, 999)
+        self.assertEqual(len(ns.definitions), 100)
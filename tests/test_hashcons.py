@@ -0,0 +1,100 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.syntax.hashcons import HashCons
+from slang.resolve import resolve
+from slang.simplify import simplify
+from slang.runtime import make_default_environment, parse_string, run_program
+
+env = make_default_environment()
+
+
+class TestHashCons(TestCase):
+    def test_equal_terms_are_shared(self):
+        table = HashCons()
+        one = table.value(1)
+        self.assertIs(table.value(1), one)
+        self.assertIsNot(table.value(1.0), one)
+        self.assertIsNot(table.value(True), one)
+        self.assertIsNot(table.value(-0.0), table.value(0.0))
+        self.assertIs(table.array([one, one]), table.array([one, one]))
+        x = table.variable("x")
+        self.assertIs(table.binary("+", x, one), table.binary("+", x, one))
+        self.assertIsNot(table.binary("+", x, one), table.binary("-", x, one))
+        self.assertIs(table.unary("-", x), table.unary("-", x))
+        self.assertEqual(table.hits, 5)
+
+    def test_only_shared_children_are_shared(self):
+        table = HashCons()
+        one = terms.Value(1)
+        self.assertIsNot(table.array([one]), table.array([one]))
+        call = terms.Call(table.variable("f"), [])
+        self.assertIsNot(table.binary("+", call, call), table.binary("+", call, call))
+
+    def test_parsing(self):
+        program = parse_string(
+            'let f = function(x) [x * 2, [1, "a"], x * 2]; [[1, "a"], f(1)]',
+            env,
+            positions=False,
+            share=True,
+        )
+        items = program.statements[0].expression.body.value
+        self.assertIs(items[0], items[2])
+        self.assertIs(items[1], program.expression.value[0])
+        unshared = parse_string("[1, 1]", env).expression
+        self.assertIsNot(unshared.value[0], unshared.value[1])
+
+    def test_terms_with_positions_are_not_shared(self):
+        for parser in ("tatsu", "pratt"):
+            with self.subTest(parser=parser):
+                program = parse_string("[x + 1, x + 1]", env, share=True, parser=parser)
+                lhs, rhs = program.expression.value
+                self.assertIsNot(lhs, rhs)
+                self.assertLess(
+                    lhs.position.start_position, rhs.position.start_position
+                )
+
+    def test_imports_are_parsed_for_each_option(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.slang")
+            with open(library, "w") as fd:
+                fd.write("namespace { xs = [x + 1, x + 1]; }")
+            source = f'import "{library}"; 1'
+            for share in (False, True, False):
+                with self.subTest(share=share):
+                    program = parse_string(source, env, positions=False, share=share)
+                    imported = program.statements[0].program
+                    lhs, rhs = imported.expression.definitions[0].value.value
+                    self.assertEqual(lhs is rhs, share)
+
+    def test_sharing_survives_resolving_and_simplifying(self):
+        program = parse_string(
+            "let f = function(y) [[1, 2], [1, 2], y, -y]; f",
+            env,
+            positions=False,
+            share=True,
+        )
+        program = resolve(simplify(program, threshold=0), env)
+        items = program.statements[0].expression.body.value
+        self.assertIs(items[0], items[1])
+        self.assertTrue(items[0].normalized)
+
+    def test_same_results(self):
+        source = """
+        let f = function(x) if x < 2 then [x, x * 2] else f(x - 1) + f(x - 2);
+        [f(5), [1, 2] + [1, 2], -1.5, "s" + "s"]
+        """
+        expected = run_program(parse_string(source, env), env).for_json()
+        program = parse_string(source, env, positions=False, share=True)
+        for engine in ("runner", "unboxed", "closure", "bytecode"):
+            self.assertEqual(
+                run_program(program, env, engine=engine).for_json(), expected
+            )
+
+    def test_array_hash_is_cached(self):
+        array = terms.Array([terms.Value(1)], normalized=True)
+        self.assertEqual(hash(array), hash(terms.structural_key(array)))
+        self.assertEqual(array._hash, hash(array))
+        self.assertTrue(array == array)
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.inline import inline
+from slang.runtime import make_default_environment, parse_string, run_program
+
+env = make_default_environment()
+
+
+def _inline(string, **kwargs):
+    program = parse_string(string, env)
+    inlined, report = inline(program, **kwargs)
+    expected = run_program(program, env).for_json()
+    assert run_program(inlined, env).for_json() == expected
+    return inlined, report
+
+
+class TestInline(TestCase):
+    def test_inlines_small_functions(self):
+        program, report = _inline("let f = function(x) x + 1; f(2)")
+        self.assertEqual([entry.name for entry in report], ["f"])
+        self.assertIsInstance(program.expression, terms.BinaryOperation)
+
+    def test_imported_functions(self):
+        _, report = _inline('import "prelude.slang"; math::max(1, 2)')
+        self.assertIn("max", [entry.name for entry in report])
+
+    def test_threshold(self):
+        _, report = _inline("let f = function(x) x + 1; f(2)", threshold=2)
+        self.assertEqual(report, [])
+
+    def test_recursive_functions_are_kept(self):
+        for string in (
+            "let f = function(n) if n == 0 then 0 else f(n - 1); f(3)",
+            "let f = function(n) if n == 0 then 0 else this(n - 1); f(3)",
+        ):
+            _, report = _inline(string)
+            self.assertEqual(report, [])
+
+    def test_no_capture(self):
+        # `a` in `f` is not the parameter `a` of `g`.
+        _, report = _inline(
+            "let a = 1; let f = function(x) x + a; let g = function(a) f(a); g(5)"
+        )
+        self.assertEqual([entry.name for entry in report], ["g"])
+
+        # The arguments are not captured by the bindings of the inlined body.
+        _inline(
+            "let f = function(x, y) { let z = x * y; z + x }; let z = 3; f(z, z + 1)"
+        )
+        _inline("let f = function(x) namespace { x = x; y = x; }; let y = 5; f(y)::y")
+        _inline("let f = function(x) function(y) x + y; let y = 10; f(y)(1)")
+
+    def test_arguments_are_evaluated_once(self):
+        program, _ = _inline(
+            "let g = function(x) x * 2; let f = function(x) x + x; f(g(3))",
+            threshold=3,
+        )
+        self.assertIsInstance(program.expression, terms.Block)
+        self.assertEqual(len(program.expression.statements), 1)
@@ -0,0 +1,78 @@
+import io
+import sys
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.resolve import resolve
+from slang.runtime import (
+    make_default_environment,
+    parse_string,
+    run_string,
+    strict_parameters,
+)
+
+
+def _first(runner, env, arguments):
+    return runner.run(arguments[0], env)
+
+
+first = terms.FunctionDefinition(
+    [terms.Parameter("a", None), terms.Parameter("b", None)], _first, builtin=True
+)
+env = make_default_environment({"first": first}, lazy=True)
+
+
+class TestLazy(TestCase):
+    def test_unused_arguments_are_not_evaluated(self):
+        program = "let first = function(a, b) a; first(1, 1 / 0)"
+        self.assertEqual(run_string(program, env).value, 1)
+        with self.assertRaises(ZeroDivisionError):
+            run_string(program, make_default_environment())
+        self.assertEqual(run_string("builtins::first(2, 1 / 0)", env).value, 2)
+
+    def test_arguments_are_evaluated_once(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            result = run_string(
+                "let twice = function(x) x + x; twice(builtins::echo(21))", env
+            )
+        self.assertEqual(result.value, 42)
+        self.assertEqual(output.getvalue(), "21\n")
+
+    def test_accumulators_are_strict(self):
+        program = """
+        let loop = function(n, acc) {
+            if n == 0
+                then acc
+                else { let m = n - 1; this(m, acc + n) }
+        };
+        loop(5000, 0)
+        """
+        self.assertGreater(5000, sys.getrecursionlimit() // 4)
+        self.assertEqual(run_string(program, env).value, 12502500)
+
+        definition = resolve(parse_string(program, env), env).statements[0].expression
+        self.assertEqual(strict_parameters(definition), {0, 1})
+
+    def test_strict_parameters(self):
+        program = """
+        let f = function(test, a, b, f) if test then a + f(b) else a;
+        f
+        """
+        definition = resolve(parse_string(program, env), env).statements[0].expression
+        self.assertEqual(strict_parameters(definition), {0, 1})
+
+    def test_prelude(self):
+        program = """
+        import "prelude.slang";
+        [1, 2, 3, 4].map(function(x) x * 2).where(function(x) x > 2).zip([7, 8, 9])
+        """
+        self.assertEqual(
+            run_string(program, env).for_json(),
+            run_string(program, make_default_environment()).for_json(),
+        )
+
+    def test_only_the_runner_is_lazy(self):
+        with self.assertRaises(ValueError):
+            run_string("1", env, engine="closure")
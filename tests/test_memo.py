@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.runtime import make_default_environment, run_string
+
+env = make_default_environment()
+
+FIB = """
+let fib = builtins::memo(function(n) if n < 2 then n else fib(n - 1) + fib(n - 2), 100);
+[fib(60), builtins::memo_info(fib)]
+"""
+
+
+class TestMemo(TestCase):
+    def test_recursive_calls_are_remembered(self):
+        for engine in ("runner", "closure", "bytecode"):
+            result = run_string(FIB, env, engine=engine).for_json()
+            self.assertEqual(result[0], 1548008755920)
+            self.assertEqual(
+                result[1], {"hits": 58, "misses": 61, "evictions": 0, "size": 61}
+            )
+
+    def test_least_recently_used_are_evicted(self):
+        program = """
+        let f = builtins::memo(function(a) builtins::length(a), 2);
+        [f([1, 2]), f([1, 2]), f([1, [2]]), f([3]), f([1, 2]), builtins::memo_info(f)]
+        """
+        result = run_string(program, env).for_json()
+        self.assertEqual(result[:5], [2, 2, 2, 1, 2])
+        self.assertEqual(result[5], {"hits": 1, "misses": 4, "evictions": 2, "size": 2})
+
+    def test_lazy_environments(self):
+        lazy = make_default_environment(lazy=True)
+        self.assertEqual(run_string(FIB, lazy).for_json()[0], 1548008755920)
+
+
+class TestStructuralKey(TestCase):
+    def test_keys(self):
+        key = terms.structural_key
+        self.assertEqual(
+            key(terms.Array([terms.Value(1), terms.Array([terms.Value("a")])])),
+            key(terms.Array([terms.Value(1), terms.Array([terms.Value("a")])])),
+        )
+        self.assertNotEqual(key(terms.Value(1)), key(terms.Value(1.0)))
+        self.assertNotEqual(key(terms.Value(1)), key(terms.Value(True)))
+        ns = run_string("namespace { a = 1; b = [2]; }", env)
+        self.assertEqual(key(ns), key(run_string("namespace { a = 1; b = [2]; }", env)))
+
+    def test_functions(self):
+        f = run_string("function(x) x", env)
+        self.assertEqual(f, f)
+        self.assertEqual(hash(f), hash(f))
+        self.assertNotEqual(f, run_string("function(x) x", env))
@@ -0,0 +1,111 @@
+import math
+from unittest import TestCase, mock, skipUnless
+
+from slang import numeric
+from slang.syntax import terms
+from slang.simplify import simplify
+from slang.runtime import make_default_environment, parse_string, run_string
+
+env = make_default_environment()
+
+PROGRAM = """
+import "prelude.slang";
+let xs = range(0, 100, 1).each(function(i) i);
+let ys = builtins::sin(xs);
+[
+    xs[99], xs[-1], length(xs),
+    builtins::floor(ys)[3], ys[1],
+    xs.where(function(x) x > 97),
+    (xs + xs)[150], (xs + [1.5])[100]
+]
+"""
+
+
+@skipUnless(numeric.numpy, "numpy is not installed")
+class TestNumeric(TestCase):
+    def test_numeric_arrays(self):
+        for engine in ("runner", "closure", "bytecode"):
+            result = run_string(PROGRAM, env, engine=engine).for_json()
+            self.assertEqual(result[:4], [99, 99, 100, 0])
+            self.assertAlmostEqual(result[4], 0.8414709848078965)
+            self.assertEqual(result[5:], [[98, 99], 50, 1.5])
+
+    def test_packing(self):
+        ints = [terms.Value(i) for i in range(numeric.MIN_SIZE)]
+        self.assertIsInstance(numeric.pack(ints), numeric.NumericArray)
+        self.assertNotIsInstance(numeric.pack(ints[:-1]), numeric.NumericArray)
+        for other in (terms.Value(1.5), terms.Value(True), terms.Value(2**70)):
+            self.assertNotIsInstance(numeric.pack(ints + [other]), numeric.NumericArray)
+        array = numeric.pack(ints)
+        self.assertEqual(array.for_json(), list(range(numeric.MIN_SIZE)))
+        self.assertEqual(numeric.unpack(array).for_json(), array.for_json())
+        self.assertEqual(array.value[True].value, 1)
+        self.assertEqual(type(array.value[0].value), int)
+
+    def test_math_errors(self):
+        with self.assertRaises(ValueError):
+            run_string(
+                'import "prelude.slang"; builtins::ln(range(0, 100, 1).each(function(i) i))',
+                env,
+            )
+
+    def test_math_does_not_depend_on_length(self):
+        values = [i / 10 - 3 for i in range(numeric.MIN_SIZE)]
+        for name, f in (("tanh", math.tanh), ("sin", math.sin), ("floor", math.floor)):
+            for size in (numeric.MIN_SIZE - 1, numeric.MIN_SIZE):
+                with self.subTest(name=name, size=size):
+                    result = run_string(
+                        f"builtins::{name}({values[:size]})", env, simplify=False
+                    ).for_json()
+                    self.assertEqual(result, [f(x) for x in values[:size]])
+
+    def test_literals(self):
+        literal = list(range(numeric.MIN_SIZE))
+        program = simplify(parse_string(f"let xs = {literal}; [xs, xs .* 2]", env))
+        for array in program.value:
+            self.assertIsInstance(array, numeric.NumericArray)
+        with mock.patch.object(
+            numeric, "vectorized", wraps=numeric.vectorized
+        ) as vectorized:
+            for engine in ("runner", "closure", "bytecode"):
+                result = run_string(f"{literal} .* 2", env, engine=engine)
+                self.assertIsInstance(result, numeric.NumericArray)
+                self.assertEqual(result.for_json(), [x * 2 for x in literal])
+                result = run_string(
+                    f"{literal} .* 2", env, engine=engine, simplify=False
+                )
+                self.assertIsInstance(result, numeric.NumericArray)
+            # Folded when simplifying, computed when running unsimplified.
+            self.assertEqual(vectorized.call_count, 6)
+
+    def test_elementwise(self):
+        xs = numeric.pack([terms.Value(i) for i in range(100)])
+        fs = numeric.pack([terms.Value(i / 4) for i in range(100)])
+        product = numeric.vectorized("*", xs, xs)
+        self.assertIsInstance(product, numeric.NumericArray)
+        self.assertEqual(product.value[99].value, 9801)
+        self.assertEqual(
+            numeric.vectorized(">=", fs, terms.Value(24.5)).for_json()[98], True
+        )
+        # Where numpy would not give the result Python gives.
+        self.assertIsNone(numeric.vectorized("/", xs, terms.Value(0)))
+        self.assertIsNone(numeric.vectorized("*", xs, terms.Value(2**62)))
+        self.assertIsNone(
+            numeric.vectorized("+", xs, numeric.pack(list(xs.value)[1:] * 2))
+        )
+        result = run_string(
+            'import "prelude.slang"; let xs = range(0, 100, 1).each(function(i) i); xs .* 4611686018427387904',
+            env,
+        )
+        self.assertEqual(result.value[99].value, 99 * 2**62)
+
+
+class TestWithoutNumpy(TestCase):
+    def test_plain_arrays(self):
+        with mock.patch.object(numeric, "numpy", None):
+            xs = run_string(
+                'import "prelude.slang"; range(0, 100, 1).each(function(i) i)', env
+            )
+            self.assertNotIsInstance(xs, numeric.NumericArray)
+            result = run_string(PROGRAM, env)
+            self.assertEqual(result.for_json()[:4], [99, 99, 100, 0])
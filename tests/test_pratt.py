@@ -0,0 +1,182 @@
+import os
+import ast
+import glob
+import tempfile
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.runtime import (
+    ErrorId,
+    make_default_environment,
+    parse_file,
+    parse_string,
+    ParseError,
+    run_program,
+)
+
+env = make_default_environment()
+
+FILES = sorted(glob.glob("examples/*.slang")) + ["prelude.slang", "test.slang"]
+
+ERRORS = [
+    "",
+    "{ }",
+    "let x = 1",
+    "let x = 1;  ",
+    "let x = 1\nx",
+    "!x !y; 1",
+    "let a = 1 let b = 2 let c = 3; c",
+    "let f = function(x) { let y = x * 2 y }; f(1)",
+    "(function(x, y) { })(0, 1)",
+    "[{}](1)",
+    "[{}][0]",
+    "namespace { a = {}; }::a",
+    "f(1,)",
+    "{ let x = 1 }",
+    "let = 1;",
+    "x.f",
+]
+
+
+def _programs():
+    """
+    The string constants in the tests, the programs among them.
+    """
+    sources = set()
+    for path in sorted(glob.glob("tests/test_*.py")):
+        with open(path) as fd:
+            tree = ast.parse(fd.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                sources.add(node.value)
+    return sorted(sources)
+
+
+def _dump(term):
+    """
+    The structure of `term` with the positions of its terms, imported programs
+    left out.
+    """
+    if isinstance(term, (list, tuple, terms.Vector)):
+        return [_dump(item) for item in term]
+    if not isinstance(term, (terms.Node, terms.Parameter)):
+        return term
+    position = getattr(term, "position", None)
+    if position is not None:
+        position = (
+            position.rule,
+            position.start_line,
+            position.end_line,
+            position.start_position,
+            position.end_position,
+        )
+    fields = []
+    for cls in type(term).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "position" and name != "program" and not name.startswith("_"):
+                fields.append((name, _dump(getattr(term, name, None))))
+    if isinstance(term, terms.Namespace):
+        fields.append(("definitions", _dump(term.definitions)))
+    return (type(term).__name__, position, fields)
+
+
+def _errors(error: ParseError):
+    return [
+        (
+            e.error_id,
+            e.message,
+            e.position_info.rule,
+            e.position_info.start_position,
+            e.position_info.end_position,
+        )
+        for e in error.errors
+    ]
+
+
+class TestConformance(TestCase):
+    def assertSameParse(self, parse):
+        try:
+            expected = _dump(parse("tatsu"))
+        except ParseError as e:
+            with self.assertRaises(ParseError) as raised:
+                parse("pratt")
+            self.assertEqual(_errors(raised.exception), _errors(e))
+            return
+        except Exception:
+            # Where tatsu fails without reporting errors.
+            with self.assertRaises(ParseError) as raised:
+                parse("pratt")
+            self.assertEqual(
+                [e.error_id for e in raised.exception.errors], [ErrorId.InvalidSyntax]
+            )
+            return
+        self.assertEqual(_dump(parse("pratt")), expected)
+
+    def test_programs(self):
+        for source in _programs():
+            with self.subTest(source=source):
+                self.assertSameParse(
+                    lambda parser: parse_string(source, env, parser=parser)
+                )
+
+    def test_files(self):
+        for path in FILES:
+            with self.subTest(path=path):
+                self.assertSameParse(
+                    lambda parser: parse_file(path, env, parser=parser)
+                )
+
+    def test_errors(self):
+        for source in ERRORS:
+            with self.subTest(source=source):
+                self.assertSameParse(
+                    lambda parser: parse_string(source, env, parser=parser)
+                )
+        with self.assertRaises(ParseError) as raised:
+            parse_string("let a = 1 let b = 2 let c = 3; c", env, parser="pratt")
+        self.assertEqual(
+            [
+                (e.error_id, e.position_info.start_position)
+                for e in raised.exception.errors
+            ],
+            [(ErrorId.MissingSemi, 19), (ErrorId.MissingSemi, 9)],
+        )
+
+    def test_options(self):
+        with open("test.slang") as fd:
+            source = fd.read()
+        for options in (
+            dict(positions=False),
+            dict(share=True),
+            dict(positions=False, share=True),
+        ):
+            with self.subTest(**options):
+                self.assertSameParse(
+                    lambda parser: parse_string(source, env, parser=parser, **options)
+                )
+        program = parse_string(
+            "[[1, 2], x + 1, [1, 2], x + 1]",
+            env,
+            positions=False,
+            share=True,
+            parser="pratt",
+        )
+        items = program.expression.value
+        self.assertIs(items[0], items[2])
+        self.assertIs(items[1], items[3])
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            parse_string("1", env, parser="yacc")
+
+    def test_imports_see_edited_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.slang")
+            program = f'import "{library}"; twice(21)'
+            for parser in ("tatsu", "pratt"):
+                with self.subTest(parser=parser):
+                    for body, value in (("x * 2", 42), ("x + x + 1", 43)):
+                        with open(library, "w") as fd:
+                            fd.write(f"namespace {{ twice = function(x) {body}; }}")
+                        parsed = parse_string(program, env, parser=parser)
+                        self.assertEqual(run_program(parsed, env).value, value)
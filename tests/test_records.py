@@ -0,0 +1,67 @@
+import pickle
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.runtime import make_default_environment, parse_string, run_program
+
+env = make_default_environment()
+
+ENGINES = ("runner", "unboxed", "closure", "bytecode")
+
+PROGRAM = """
+let point = function(x, y) namespace { x = x; y = y; norm = x * x + y * y; };
+let other = function(y, x) namespace { y = y; x = x; };
+let points = [point(1, 2), point(3, 4), other(5, 6)];
+[points[0]::x, points[1]::norm, points[2]::x, other(7, 8)::y]
+"""
+
+
+class TestRecords(TestCase):
+    def test_literals_share_a_shape(self):
+        program = parse_string(
+            "let p = function(a) namespace { a = a; b = a + 1; }; [p(1), p(2)]", env
+        )
+        for engine in ENGINES:
+            first, second = run_program(program, env, engine=engine).value
+            self.assertIs(first.shape, second.shape, engine)
+            self.assertEqual(first.shape.names, ("a", "b"))
+            self.assertEqual(second.for_json(), {"a": 2, "b": 3})
+
+    def test_lookups(self):
+        program = parse_string(PROGRAM, env)
+        for engine in ENGINES:
+            result = run_program(program, env, engine=engine)
+            self.assertEqual(result.for_json(), [1, 25, 6, 7], engine)
+
+    def test_lookup_cache(self):
+        shape = terms.Shape.of(("a", "b"))
+        lookup = terms.Lookup(None, terms.Variable("b"))
+        first = terms.Namespace.record(shape, [terms.Value(1), terms.Value(2)])
+        self.assertEqual(first.lookup_at(lookup).value, 2)
+        self.assertIs(lookup.shape, shape)
+        self.assertEqual(lookup.slot, 1)
+        other = terms.Namespace.record(terms.Shape.of(("b",)), [terms.Value(3)])
+        self.assertEqual(other.lookup_at(lookup).value, 3)
+        self.assertEqual(lookup.slot, 0)
+        missing = terms.Lookup(None, terms.Variable("c"))
+        with self.assertRaises(Exception):
+            first.lookup_at(missing)
+        listed = terms.Namespace([terms.NamespaceDefinition("b", terms.Value(4))])
+        self.assertEqual(listed.lookup_at(lookup).value, 4)
+
+    def test_same_as_namespaces(self):
+        shape = terms.Shape.of(("a", "b", "a"))
+        ns = terms.Namespace.record(shape, [terms.box(i) for i in (1, 2, 3)])
+        self.assertEqual(ns.lookup("a").value, 3)
+        self.assertTrue(ns.has("b"))
+        self.assertFalse(ns.has("c"))
+        self.assertEqual([d.name for d in ns.definitions], ["a", "b", "a"])
+        self.assertEqual(ns.for_json(), {"a": 3, "b": 2})
+        self.assertEqual(ns.remove("a").for_json(), {"b": 2})
+        self.assertEqual(ns.combine(ns.remove("b")).for_json(), {"a": 3, "b": 2})
+
+    def test_shapes_are_interned(self):
+        shape = terms.Shape.of(("start", "stop"))
+        self.assertIs(terms.Shape.of(("start", "stop")), shape)
+        self.assertIs(pickle.loads(pickle.dumps(shape)), shape)
+        self.assertEqual(shape.slots, {"start": 0, "stop": 1})
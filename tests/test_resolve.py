@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.resolve import resolve
+from slang.runtime import (
+    ErrorId,
+    ParseError,
+    RuntimeError,
+    make_default_environment,
+    parse_string,
+    run_string,
+)
+
+env = make_default_environment()
+
+
+def _resolve(string):
+    return resolve(parse_string(string, env), env)
+
+
+class TestResolve(TestCase):
+    def test_variables_become_slots(self):
+        program = _resolve(
+            "let a = 1; let f = function(x) { let y = x; a + y + x }; f(2)"
+        )
+        self.assertEqual(program.size, 2)
+        body = program.statements[1].expression.body
+        self.assertEqual(body.size, 1)
+        a_plus_y = body.expression.lhs
+        self.assertEqual((a_plus_y.lhs.depth, a_plus_y.lhs.index), (2, 0))
+        self.assertEqual((a_plus_y.rhs.depth, a_plus_y.rhs.index), (0, 0))
+        self.assertEqual((body.expression.rhs.depth, body.expression.rhs.index), (1, 0))
+
+    def test_globals_stay_variables(self):
+        program = _resolve("builtins::floor(1.5)")
+        self.assertIsInstance(program.expression.expression.expression, terms.Variable)
+
+    def test_no_frame_without_statements(self):
+        program = _resolve("let f = function(x) { x + 1 }; f(1)")
+        body = program.statements[0].expression.body
+        self.assertEqual(body.expression.lhs.depth, 0)
+
+    def test_this(self):
+        program = _resolve("let f = function(x, y) this; f(1, 2)")
+        this = program.statements[0].expression.body
+        self.assertEqual((this.depth, this.index), (0, 2))
+
+    def test_errors(self):
+        with self.assertRaises(ParseError) as e:
+            _resolve("let f = function(x) x + z; f(1, 2) + builtins::floor(1, 2)")
+        self.assertEqual(
+            [error.error_id for error in e.exception.errors],
+            [ErrorId.UnboundName, ErrorId.WrongArity, ErrorId.WrongArity],
+        )
+
+        with self.assertRaises(ParseError) as e:
+            _resolve("let a = 1; let a = 2; a")
+        self.assertEqual(e.exception.errors[0].error_id, ErrorId.Redefinition)
+
+    def test_used_before_defined(self):
+        with self.assertRaises(RuntimeError):
+            run_string("let f = function() g; let x = f(); let g = 1; x", env)
+
+
+class TestCaptures(TestCase):
+    def test_functions_keep_only_what_they_use(self):
+        f = run_string(
+            "let big = [1, 2, 3]; let a = builtins::floor(4.5); let f = function(x) x + a; f",
+            env,
+        )
+        self.assertEqual([v.value for v in f.environment.slots], [4])
+
+    def test_recursion_by_name_uses_this(self):
+        f = run_string(
+            "let big = [1, 2, 3]; let f = function(n) if n == 0 then 0 else f(n - 1); f",
+            env,
+        )
+        self.assertIs(f.environment, env)
+
+    def test_forward_references(self):
+        program = """
+        let even = function(n) if n == 0 then true else odd(n - 1);
+        let odd = function(n) if n == 0 then false else even(n - 1);
+        [even(4), odd(4)]
+        """
+        for engine in ("runner", "closure", "bytecode"):
+            result = run_string(program, env, engine=engine)
+            self.assertEqual(result.for_json(), [True, False])
+        self.assertTrue(_resolve(program).statements[0].expression.linked)
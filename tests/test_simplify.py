@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from slang.syntax import terms
+from slang.simplify import simplify
+from slang.runtime import make_default_environment, parse_string, run_string
+
+env = make_default_environment()
+
+
+def _simplify(string, **kwargs):
+    return simplify(parse_string(string, env), **kwargs)
+
+
+class TestSimplify(TestCase):
+    def test_constant_bindings(self):
+        for string in ("let x = 7; x * x", "7 * 7", "49"):
+            program = _simplify(string)
+            self.assertIs(type(program), terms.Value)
+            self.assertEqual(program.value, 49)
+
+    def test_if_then_else(self):
+        program = _simplify('let debug = false; if debug then "yes" else "no"')
+        self.assertEqual(program.value, "no")
+
+    def test_arrays(self):
+        program = _simplify("let a = [1, [2, 3 * 4]]; a[1]")
+        self.assertTrue(program.normalized)
+        self.assertEqual(program.for_json(), [2, 12])
+        program = _simplify("let f = function(x) [x]; f", threshold=0)
+        self.assertFalse(program.statements[0].expression.body.normalized)
+
+    def test_shadowing(self):
+        program = _simplify("let x = 1; let f = function(x) x + 1; f(x)", threshold=0)
+        self.assertIsInstance(program.statements[1].expression.body.lhs, terms.Variable)
+        self.assertEqual(program.expression.arguments[0].value, 1)
+
+        program = _simplify("let f = function() x; let x = 1; f()")
+        self.assertEqual(len(program.statements), 2)
+
+    def test_errors_are_kept(self):
+        self.assertIsInstance(_simplify("1 / 0"), terms.BinaryOperation)
+        self.assertIsInstance(_simplify("if 1 then 2 else 3"), terms.IfThenElse)
+        self.assertIsInstance(_simplify("[1][1]"), terms.Index)
+
+    def test_large_results_are_not_folded(self):
+        for string in ('"ab" * 300000000', "3 ^ 100000000", "[2, 3] .^ 100000000"):
+            with self.subTest(string=string):
+                program = _simplify(f"let f = function(b) if b then {string} else 0; f")
+                body = program.statements[0].expression.body
+                self.assertIsInstance(body.true, terms.BinaryOperation)
+        string = 'let f = function(b) if b then "ab" * 300000000 else 0; f(false)'
+        self.assertEqual(run_string(string, env).value, 0)
+        self.assertEqual(_simplify('"ab" * 3').value, "ababab")
+        self.assertEqual(_simplify("2 ^ 10").value, 1024)
+
+    def test_can_be_disabled(self):
+        string = "let x = 3; let f = function(y) y * x; f(x + 1)"
+        self.assertEqual(run_string(string, env, simplify=False).value, 12)
+        self.assertEqual(run_string(string, env).value, 12)
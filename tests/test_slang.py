@@ -1,14 +1,24 @@
 import io
+import sys
+import math
+import inspect
+import pickle
+import operator
 import contextlib
+import subprocess
 from unittest import TestCase
 
 from slang.syntax import types, terms
 from slang.runtime import (
     run_file,
     run_string,
+    run_program,
     parse_string,
     make_default_environment,
     Environment,
+    Runner,
+    RuntimeError,
+    ParseError,
 )
 
 env = make_default_environment()
@@ -19,27 +29,35 @@ def _convert_array(array):
 
 
 class TestSlang(TestCase):
+    engine = "runner"
+
+    def run_string(self, string, env):
+        return run_string(string, env, engine=self.engine)
+
+    def run_file(self, path, env):
+        return run_file(path, env, engine=self.engine)
+
     def test_basic_arithmetic(self):
-        self.assertEqual(run_string("1", env).value, 1)
-        self.assertEqual(run_string("1 + 1", env).value, 2)
-        self.assertEqual(run_string("-1 + 1", env).value, 0)
-        self.assertEqual(run_string("1 - 1", env).value, 0)
-        self.assertEqual(run_string("1 + -1", env).value, 0)
-        self.assertEqual(run_string("1 / 2", env).value, 0.5)
-        self.assertEqual(run_string("0 / 2", env).value, 0)
-        self.assertEqual(run_string("2 * 3", env).value, 6)
+        self.assertEqual(self.run_string("1", env).value, 1)
+        self.assertEqual(self.run_string("1 + 1", env).value, 2)
+        self.assertEqual(self.run_string("-1 + 1", env).value, 0)
+        self.assertEqual(self.run_string("1 - 1", env).value, 0)
+        self.assertEqual(self.run_string("1 + -1", env).value, 0)
+        self.assertEqual(self.run_string("1 / 2", env).value, 0.5)
+        self.assertEqual(self.run_string("0 / 2", env).value, 0)
+        self.assertEqual(self.run_string("2 * 3", env).value, 6)
 
     def test_conditional(self):
-        assert run_string("true", env).value is True
-        assert run_string("false", env).value is False
-        self.assertEqual(run_string("if true then 7 else 3", env).value, 7)
-        self.assertEqual(run_string("if false then 7 else 3", env).value, 3)
+        assert self.run_string("true", env).value is True
+        assert self.run_string("false", env).value is False
+        self.assertEqual(self.run_string("if true then 7 else 3", env).value, 7)
+        self.assertEqual(self.run_string("if false then 7 else 3", env).value, 3)
 
     def test_function_abstraction_and_application(self):
-        self.assertEqual(run_string("(function(x) { x })(0)", env).value, 0)
-        self.assertEqual(run_string("(function(x, y) { x })(0, 1)", env).value, 0)
+        self.assertEqual(self.run_string("(function(x) { x })(0)", env).value, 0)
+        self.assertEqual(self.run_string("(function(x, y) { x })(0, 1)", env).value, 0)
         self.assertEqual(
-            run_string(
+            self.run_string(
                 """
         let y = 0;
         let f = function(x) { x };
@@ -55,7 +73,7 @@ class TestSlang(TestCase):
 
     def test_self_application(self):
         self.assertEqual(
-            run_string(
+            self.run_string(
                 """
             let g = function(x, y) {
                 let f = this;
@@ -65,11 +83,11 @@ class TestSlang(TestCase):
         """,
                 env,
             ).for_json(),
-            run_string("namespace { x = 3; y = 2; }", env).for_json(),
+            self.run_string("namespace { x = 3; y = 2; }", env).for_json(),
         )
         self.assertEqual(
             _convert_array(
-                run_string(
+                self.run_string(
                     """
            let g = function(x) {
                let f = this;
@@ -84,7 +102,7 @@ class TestSlang(TestCase):
         )
         self.assertEqual(
             _convert_array(
-                run_string(
+                self.run_string(
                     """
            let g = function(x) {
                let f = this;
@@ -101,7 +119,7 @@ class TestSlang(TestCase):
             [-1, 0, 0],
         )
         self.assertEqual(
-            run_string(
+            self.run_string(
                 """
         let f = function(x) {
            if x == 0
@@ -116,33 +134,33 @@ class TestSlang(TestCase):
         )
 
     def test_array_length(self):
-        assert run_string("builtins::length([])", env).value == 0
-        assert run_string("builtins::length([1, 2, 3])", env).value == 3
+        assert self.run_string("builtins::length([])", env).value == 0
+        assert self.run_string("builtins::length([1, 2, 3])", env).value == 3
 
     def test_nslib_has(self):
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(namespace{ qux = 0; foo = 1; bar = 2; }, "qux")',
                 env,
             ).value
             is True
         )
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(namespace{ qux = 0; foo = 1; bar = 2; }, "foo")',
                 env,
             ).value
             is True
         )
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(namespace{ qux = 0; foo = 1; bar = 2; }, "bar")',
                 env,
             ).value
             is True
         )
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(namespace{ qux = 0; foo = 1; bar = 2; }, "bin")',
                 env,
             ).value
@@ -151,14 +169,14 @@ class TestSlang(TestCase):
 
     def test_nslib_remove(self):
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(builtins::nslib::remove(namespace{ qux = 0; foo = 1; bar = 2; }, "qux"), "qux")',
                 env,
             ).value
             is False
         )
         assert (
-            run_string(
+            self.run_string(
                 'builtins::nslib::has(builtins::nslib::remove(namespace{ qux = 0; foo = 1; bar = 2; }, "qux"), "foo")',
                 env,
             ).value
@@ -167,21 +185,21 @@ class TestSlang(TestCase):
 
     def test_nslib_combine(self):
         assert (
-            run_string(
+            self.run_string(
                 "builtins::nslib::combine(namespace{ foo = 1; }, namespace{ bar = 2; })::bar",
                 env,
             ).value
             == 2
         )
         assert (
-            run_string(
+            self.run_string(
                 "builtins::nslib::combine(namespace{ foo = 1; }, namespace{ foo = 2; })::foo",
                 env,
             ).value
             == 2
         )
         assert (
-            run_string(
+            self.run_string(
                 "builtins::nslib::combine(namespace{ foo = 1; }, namespace{ bar = 2; })::foo",
                 env,
             ).value
@@ -191,22 +209,31 @@ class TestSlang(TestCase):
     def test_echo(self):
         f = io.StringIO()
         with contextlib.redirect_stdout(f):
-            self.assertEqual(run_string("builtins::echo(1)", env).value, 1)
+            self.assertEqual(self.run_string("builtins::echo(1)", env).value, 1)
         self.assertEqual(f.getvalue(), "1\n")
 
         f = io.StringIO()
         with contextlib.redirect_stdout(f):
-            assert run_string("builtins::echo(true)", env).value is True
+            assert self.run_string("builtins::echo(true)", env).value is True
         assert f.getvalue() == "True\n"
 
         f = io.StringIO()
         with contextlib.redirect_stdout(f):
             # We assume that the return value is correct.
-            run_string("builtins::echo((function(x) x)(2))", env)
+            self.run_string("builtins::echo((function(x) x)(2))", env)
         assert f.getvalue() == "2\n"
 
+    def test_signed_zeros(self):
+        result = self.run_string(
+            "let x = builtins::length([1]); "
+            "let y = if x == 1 then 0.0 else 2.0; "
+            "let z = if x == 1 then -0.0 else 3.0; [y, z]",
+            env,
+        ).for_json()
+        self.assertEqual([math.copysign(1.0, v) for v in result], [1.0, -1.0])
+
     def test_prelude(self):
-        for suit in run_file("test.slang", env).value:
+        for suit in self.run_file("test.slang", env).value:
             for test in suit.lookup("tests").value:
                 actual = terms.from_value(test.lookup("actual"))
                 expected = terms.from_value(test.lookup("expected"))
@@ -215,3 +242,161 @@ class TestSlang(TestCase):
                     print("actual:", actual)
                     print("expected:", expected)
                     assert False
+
+
+class TestTailCalls(TestCase):
+    def test_tail_calls_run_in_constant_stack(self):
+        loop = """
+        let loop = function(n, acc) {
+            if n == 0
+                then acc
+                else { let m = n - 1; this(m, acc + n) }
+        };
+        loop(5000, 0)
+        """
+        # The same recursion, not in tail position.
+        nested = (
+            "let sum = function(n) if n == 0 then 0 else n + this(n - 1); sum(5000)"
+        )
+        loop = parse_string(loop, env)
+        nested = parse_string(nested, env)
+        # Far fewer frames than the 5000 calls, which only a loop runs in.
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(len(inspect.stack()) + 200)
+        try:
+            self.assertEqual(run_program(loop, env, specialize=False).value, 12502500)
+            with self.assertRaises(RecursionError):
+                run_program(nested, env, specialize=False)
+        finally:
+            sys.setrecursionlimit(limit)
+
+
+class TestNormalForm(TestCase):
+    def test_arrays_built_at_runtime_are_normalized(self):
+        for engine in ("runner", "closure", "bytecode"):
+            array = run_string(
+                "let f = function(x) [x, [x]]; f(1) + f(2)", env, engine=engine
+            )
+            self.assertTrue(array.normalized)
+            self.assertTrue(array.value[1].normalized)
+
+    def test_normalized_values_are_not_walked_again(self):
+        array = run_string("let f = function(x) [x, [x]]; f(1)", env)
+        self.assertIs(Runner().run(array, env), array)
+        item = run_string("let f = function(x) [x, [x]]; let a = f(1); a[1]", env)
+        self.assertTrue(item.normalized)
+
+
+class TestCollections(TestCase):
+    def test_combinators(self):
+        program = """
+        import "prelude.slang";
+        let xs = range(0, 5, 2).each(function(i) i * 10);
+        [
+            xs,
+            xs.map(function(x) x + 1),
+            xs.enumerate().map2(function(i, x) i + x),
+            xs.where(function(x) x > 0),
+            xs.zip([1, 2]),
+            [].map(function(x) x)
+        ]
+        """
+        expected = [
+            [0, 20, 40],
+            [1, 21, 41],
+            [0, 21, 42],
+            [20, 40],
+            [[0, 1], [20, 2]],
+            [],
+        ]
+        for engine in ("runner", "closure", "bytecode"):
+            result = run_string(program, env, engine=engine)
+            self.assertEqual(result.for_json(), expected)
+
+    def test_large_arrays(self):
+        program = """
+        import "prelude.slang";
+        range(0, 20000, 1).each(function(i) i).map(function(x) x * 2)
+        """
+        self.assertGreater(20000, sys.getrecursionlimit())
+        for engine in ("runner", "closure"):
+            result = run_string(program, env, engine=engine)
+            self.assertEqual(result.value[19999].value, 39998)
+
+
+class TestElementwise(TestCase):
+    def test_operators(self):
+        program = """
+        [[1, 2, 3] .* 2, 10 .- [1, 2], [1, 5] .< [2, 2], [[1, 2], [3]] .+ 1, { let f = function(x) x; [1, 2].f() }]
+        """
+        expected = [[2, 4, 6], [9, 8], [True, False], [[2, 3], [4]], [1, 2]]
+        for engine in ("runner", "closure", "bytecode"):
+            for simplify in (True, False):
+                result = run_string(program, env, engine=engine, simplify=simplify)
+                self.assertEqual(result.for_json(), expected)
+
+    def test_errors(self):
+        for program in ("[1] .+ [1, 2]", "1 .+ 2"):
+            with self.assertRaises(RuntimeError):
+                run_string(program, env, simplify=False)
+
+
+class TestDispatch(TestCase):
+    def test_operators_are_resolved_when_parsed(self):
+        program = parse_string("-1 + 2 * 3", env)
+        self.assertIs(program.expression.function, operator.add)
+        self.assertIs(program.expression.lhs.function, operator.neg)
+        self.assertIs(program.expression.rhs.function, operator.mul)
+        one = terms.Value(1)
+        self.assertIsNone(terms.BinaryOperation(".+", one, one).function)
+        self.assertIsNone(terms.UnaryOperation("!", one).function)
+
+    def test_unknown_nodes(self):
+        with self.assertRaises(TypeError):
+            Runner().run(object(), env)
+
+    def test_running_without_tatsu(self):
+        program = parse_string(
+            "let f = function(x) { -x * 2 }; let n = namespace { a = f(1); }; f(-21) + n::a",
+            env,
+        )
+        script = """
+import sys, pickle
+from slang.runtime import run_program, make_default_environment
+env = make_default_environment()
+program = pickle.loads(sys.stdin.buffer.read())
+values = [run_program(program, env, engine=e).value for e in ("runner", "closure", "bytecode")]
+print(values, "tatsu" in sys.modules)
+"""
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            input=pickle.dumps(program),
+            capture_output=True,
+            check=True,
+        ).stdout
+        self.assertEqual(output.decode().strip(), "[40, 40, 40] False")
+
+
+class TestPositions(TestCase):
+    def test_lines_are_looked_up_lazily(self):
+        program = parse_string("let x = 1;\n\nlet y = [x,\n x];\ny", env)
+        array = program.statements[1].expression
+        self.assertIsNone(array.position.lines.starts)
+        self.assertEqual((array.position.start_line, array.position.end_line), (2, 3))
+        self.assertEqual(array.position.lines.starts, [0, 11, 12, 24, 29])
+        self.assertEqual(program.expression.position.start_line, 4)
+
+    def test_without_positions(self):
+        program = parse_string("let f = function(x) x + 1;\nf(1)", env, positions=False)
+        self.assertIsNone(program.position)
+        self.assertIsNone(program.statements[0].expression.body.position)
+        self.assertEqual(run_program(program, env).value, 2)
+        with self.assertRaises(ParseError) as context:
+            parse_string("let x = 1\nx", env, positions=False)
+        self.assertEqual(context.exception.errors[0].position_info.start_line, 0)
+
+    def test_terms_have_slots(self):
+        program = parse_string("let f = function(x) [x, -x]; f(1)", env)
+        self.assertFalse(hasattr(program, "__dict__"))
+        self.assertFalse(hasattr(program.position, "__dict__"))
+        self.assertFalse(hasattr(program.statements[0].expression, "__dict__"))
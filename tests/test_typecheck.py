@@ -0,0 +1,220 @@
+from unittest import TestCase, mock
+
+from slang.syntax import terms, types
+from slang.resolve import resolve
+from slang.runtime import (
+    ErrorId,
+    make_default_environment,
+    parse_file,
+    parse_string,
+    run_program,
+    ParseError,
+)
+from slang import typecheck
+from slang.typecheck import TypeChecker, check, specialize
+
+env = make_default_environment()
+
+ENGINES = ("runner", "unboxed", "closure", "bytecode")
+
+
+def _checked(source):
+    program = resolve(parse_string(source, env), env)
+    checker = TypeChecker(types.Universe(), env)
+    assert checker.infer(program)
+    return program, checker
+
+
+def _nodes(term, seen=None):
+    """
+    The terms in `term`, imported programs included.
+    """
+    seen = set() if seen is None else seen
+    if not isinstance(term, terms.Node) or id(term) in seen:
+        return
+    seen.add(id(term))
+    yield term
+    children = []
+    for cls in type(term).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "position":
+                children.append(getattr(term, name, None))
+    if isinstance(term, terms.Namespace):
+        children.extend(d.value for d in term.definitions)
+    if isinstance(term, terms.Array) and not term.normalized:
+        children.extend(term.value)
+    for child in children:
+        for item in child if isinstance(child, list) else [child]:
+            yield from _nodes(item, seen)
+
+
+def _kinds(term):
+    return {type(node).__name__ for node in _nodes(term)}
+
+
+class TestInference(TestCase):
+    def test_parameters_from_calls(self):
+        program, checker = _checked(
+            "let fib = function(n) if n < 2 then n else fib(n - 1) + fib(n - 2); fib(10)"
+        )
+        self.assertEqual(checker.types[id(program)], types.Int)
+        definition = program.statements[0].expression
+        self.assertEqual(checker.frames[id(definition)].cells[0].type, types.Int)
+        self.assertEqual(checker.errors, [])
+
+    def test_unions(self):
+        program, checker = _checked("let f = function(x) x * 2; [f(1), f(2.5)]")
+        self.assertEqual(
+            checker.types[id(program)], types.Array(types.Union(types.Int, types.Float))
+        )
+
+    def test_escaping_functions(self):
+        program, checker = _checked(
+            """
+            import "prelude.slang";
+            let square = function(x) x * x;
+            [square(2), range(0, 3, 1).each(square)]
+            """
+        )
+        square = program.statements[1].expression
+        self.assertEqual(checker.frames[id(square)].cells[0].type, types.Any)
+
+    def test_namespaces_and_builtins(self):
+        program, checker = _checked(
+            """
+            let ns = namespace { scale = function(x) x * 2.5; n = 3; };
+            builtins::floor(ns::scale(ns::n))
+            """
+        )
+        self.assertEqual(checker.types[id(program)], types.Int)
+
+    def test_type_errors(self):
+        program, checker = _checked(
+            'let f = function(x) if x then x + "a" else 1; f(1)'
+        )
+        self.assertEqual(
+            [e.error_id for e in checker.errors], [ErrorId.TypeMismatch] * 2
+        )
+        self.assertIs(specialize(program, env), program)
+
+    def test_nested_arrays_terminate(self):
+        program, checker = _checked(
+            "let f = function(x, n) if n == 0 then x else f([x], n - 1); f(1, 20)"
+        )
+        self.assertEqual(checker.errors, [])
+
+
+class TestUnions(TestCase):
+    def test_flat_and_unordered(self):
+        union = types.Union(types.Int, types.Union(types.String, types.Float))
+        self.assertEqual(union, types.Union(types.Float, types.String, types.Int))
+        self.assertEqual(union.types, {types.Int, types.Float, types.String})
+        self.assertEqual(str(union), "(Float | Int | String)")
+
+    def test_universe(self):
+        universe = types.Universe()
+        union = universe.make_union(types.Union(types.Int, types.Float), types.String)
+        self.assertIs(
+            universe.make_union(types.String, types.Union(types.Float, types.Int)),
+            union,
+        )
+        self.assertIs(universe.make_union(union, types.Int), union)
+        self.assertTrue(universe.is_subtype(types.Number, union))
+        self.assertFalse(universe.is_subtype(union, types.Number))
+        self.assertIn((types.Number, union), universe.subtypes)
+        self.assertIs(
+            universe.union_of([types.Void, types.Int, union, types.Float]), union
+        )
+        self.assertEqual(universe.union_of([types.Void]), types.Void)
+
+    def test_array_orders(self):
+        program, checker = _checked(
+            'let f = function(x) [[x, "a", 1.5], [1.5, x, "a"], ["a", 1.5, x]]; f(1)'
+        )
+        array = program.statements[0].expression.body
+        element = types.Union(types.Int, types.Float, types.String)
+        self.assertEqual(checker.types[id(array)], types.Array(types.Array(element)))
+
+
+class TestCheck(TestCase):
+    def test_type(self):
+        program = parse_string("let f = function(x) x * 2; [f(1), f(2.5)]", env)
+        self.assertEqual(check(program, env), types.Array(types.Number))
+        self.assertEqual(check(parse_string("1 < 2", env)), types.Bool)
+
+    def test_errors(self):
+        program = parse_string('let f = function(x) x + "a"; f(1)', env)
+        with self.assertRaises(ParseError):
+            check(program, env)
+
+    def test_closed_terms_judged_once(self):
+        program, checker = _checked('let f = function(x) [x, [1, "a"], 2.5 * 2]; f(1)')
+        array = program.statements[0].expression.body
+        literal, product = array.value[1], array.value[2]
+        self.assertEqual(checker.closed[id(product)], types.Float)
+        self.assertNotIn(id(array), checker.closed)
+        judged = []
+        judge = checker.judge_Array
+
+        def counting(term, frame):
+            judged.append(id(term))
+            return judge(term, frame)
+
+        checker.judge_Array = counting
+        self.assertTrue(checker.infer(program))
+        self.assertNotIn(id(literal), judged)
+        self.assertIn(id(array), judged)
+
+
+class TestSpecialization(TestCase):
+    def test_fast_paths(self):
+        program = resolve(
+            parse_string(
+                """
+                import "prelude.slang";
+                let f = function(x) if x < 1 then math::sin(x * 2.0) else x % 3;
+                [f(1), f(0.5)]
+                """,
+                env,
+            ),
+            env,
+        )
+        kinds = _kinds(specialize(program, env))
+        self.assertTrue(
+            {"NumericOperation", "TypedIfThenElse", "UncheckedCall"} <= kinds, kinds
+        )
+
+    def test_same_results(self):
+        sources = [
+            "let fib = function(n) if n < 2 then n else fib(n - 1) + fib(n - 2); fib(12)",
+            'import "prelude.slang"; [math::max(1, 2.5), math::floor(2.5), math::sin(1)]',
+            "let f = function(x) x * 2; [f(1), f(2.5), 7 / 2, 2 ^ 10, 1 == 1.0]",
+        ]
+        programs = [parse_string(source, env) for source in sources]
+        programs += [
+            parse_file(p, env) for p in ("examples/factorial.slang", "test.slang")
+        ]
+        for program in programs:
+            expected = run_program(program, env, specialize=False).for_json()
+            for engine in ENGINES:
+                result = run_program(program, env, engine=engine)
+                self.assertEqual(result.for_json(), expected, engine)
+
+    def test_programs_are_specialized_once(self):
+        program = parse_string("let f = function(x) x * 2; f(21)", env)
+        with mock.patch.object(
+            typecheck, "specialize", wraps=typecheck.specialize
+        ) as specialized:
+            for engine in ENGINES:
+                self.assertEqual(run_program(program, env, engine=engine).value, 42)
+            self.assertEqual(specialized.call_count, 1)
+            other = parse_string("let f = function(x) x * 2; f(21)", env)
+            self.assertEqual(run_program(other, env).value, 42)
+            self.assertEqual(specialized.call_count, 2)
+
+    def test_lazy(self):
+        lazy = make_default_environment(lazy=True)
+        program = parse_string(
+            "let f = function(x, y) if x > 0 then x * 2 else y; f(2, 1 / 0)", lazy
+        )
+        self.assertEqual(run_program(program, lazy).value, 4)
@@ -0,0 +1,64 @@
+from tests import test_slang
+from slang.syntax import terms
+from slang.unboxed import wrap, unwrap
+from slang.runtime import make_default_environment, parse_file, run_program, run_string
+
+env = make_default_environment()
+
+
+class TestUnboxedEngine(test_slang.TestSlang):
+    engine = "unboxed"
+
+    def test_matches_runner(self):
+        for path in ("examples/factorial.slang", "test.slang"):
+            program = parse_file(path, env)
+            self.assertEqual(
+                run_program(program, env, engine="unboxed").for_json(),
+                run_program(program, env).for_json(),
+            )
+
+    def test_results_are_values(self):
+        program = """
+        let f = function(x) x * 2 + 1;
+        let ns = namespace { a = f(1); b = "s"; };
+        [f(20), ns::a, ns::b, [1, 2.5][1], builtins::length([1, 2]) < 3, 1 .+ [1]]
+        """
+        result = run_string(program, env, engine="unboxed")
+        self.assertIsInstance(result, terms.Array)
+        self.assertTrue(all(isinstance(item, terms.Value) for item in result.value))
+        self.assertEqual(result.for_json(), [41, 3, "s", 2.5, True, [2]])
+        self.assertIs(run_string("1 < 2", env, engine="unboxed"), terms.TRUE)
+
+    def test_builtins_calling_functions(self):
+        program = """
+        import "prelude.slang";
+        range(0, 5, 1).each(function(x) x * x).where(function(x) x % 2 == 0)
+        """
+        result = run_string(program, env, engine="unboxed")
+        self.assertEqual(result.for_json(), [0, 4, 16])
+
+    def test_lazy(self):
+        lazy = make_default_environment(lazy=True)
+        program = "let first = function(a, b) a; first(1 + 1, 1 / 0)"
+        self.assertEqual(run_string(program, lazy, engine="unboxed").value, 2)
+
+
+class TestBoxing(test_slang.TestCase):
+    def test_shared_values(self):
+        self.assertIs(terms.box(True), terms.TRUE)
+        self.assertIs(terms.box(False), terms.FALSE)
+        self.assertIs(terms.box(7), terms.box(3 + 4))
+        self.assertIs(terms.Value(3) + terms.Value(4), terms.box(7))
+        self.assertIs(terms.Value(1) < terms.Value(2), terms.TRUE)
+        self.assertEqual(terms.box(1).value, 1)
+        self.assertIs(type(terms.box(1).value), int)
+        self.assertIsNot(terms.box(10**6), terms.box(10**6))
+        self.assertEqual(terms.box(1.0).value, 1.0)
+
+    def test_wrap(self):
+        self.assertIs(wrap(True), terms.TRUE)
+        self.assertEqual(wrap("s").value, "s")
+        array = terms.Array([terms.Value(1)])
+        self.assertIs(wrap(array), array)
+        self.assertIs(unwrap(array), array)
+        self.assertEqual(unwrap(terms.Value(2.5)), 2.5)
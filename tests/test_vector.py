@@ -0,0 +1,68 @@
+import random
+from unittest import TestCase
+
+from slang.syntax.vector import CHUNK, Vector
+
+
+def _check(node):
+    """
+    Returns the height of `node` after checking it is balanced.
+    """
+    if node.height == 0:
+        assert 0 < node.size <= CHUNK
+        return 0
+    left = _check(node.left)
+    right = _check(node.right)
+    assert abs(left - right) <= 1
+    assert node.size == node.left.size + node.right.size
+    assert node.height == max(left, right) + 1
+    return node.height
+
+
+class TestVector(TestCase):
+    def test_sequence(self):
+        items = list(range(1000))
+        vector = Vector(items)
+        self.assertEqual(len(vector), 1000)
+        self.assertEqual(list(vector), items)
+        self.assertEqual(vector[0], 0)
+        self.assertEqual(vector[-1], 999)
+        self.assertEqual(vector[True], 1)
+        self.assertEqual(vector[10:13], [10, 11, 12])
+        with self.assertRaises(IndexError):
+            vector[1000]
+        with self.assertRaises(IndexError):
+            Vector()[0]
+        with self.assertRaises(TypeError):
+            vector["a"]
+        _check(vector.root)
+
+    def test_append_one_at_a_time(self):
+        vector = Vector()
+        for i in range(5000):
+            vector = vector + [i]
+        self.assertEqual(list(vector), list(range(5000)))
+        self.assertLessEqual(_check(vector.root), 12)
+
+    def test_concatenation(self):
+        rng = random.Random(7)
+        pieces = [(Vector(range(n)), list(range(n))) for n in range(0, 200, 7)]
+        for _ in range(300):
+            (a, la), (b, lb) = rng.choice(pieces), rng.choice(pieces)
+            c = a + b
+            self.assertEqual(list(c), la + lb)
+            self.assertEqual(len(c), len(la) + len(lb))
+            if c.root:
+                _check(c.root)
+            pieces.append((c, la + lb))
+        # Concatenation does not change its operands.
+        self.assertEqual(list(pieces[3][0]), pieces[3][1])
+
+    def test_indexing(self):
+        rng = random.Random(3)
+        vector, items = Vector(), []
+        for n in range(100):
+            chunk = list(range(n, n + rng.randrange(40)))
+            vector, items = vector + chunk, items + chunk
+        for i in range(-len(items), len(items)):
+            self.assertEqual(vector[i], items[i])